@@ -0,0 +1,61 @@
+"""
+Gunicorn configuration of flasker app.
+
+Run: ``gunicorn -c gunicorn.conf.py``
+
+With ``preload_app`` the app is built once in the master process and workers share its memory
+(copy-on-write) instead of importing and building the app on their own. Connections must not be
+shared by forked processes, so pools created in the master are reset in ``post_fork`` hook.
+"""
+# pylint: disable=invalid-name
+
+import gc
+import os
+import multiprocessing
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return str(os.environ.get(name, default)).lower() in ('true', '1', 't')
+
+
+wsgi_app = os.environ.get('GUNICORN_WSGI_APP', 'webapp:create_app()')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Worker class: sync, gthread or gevent
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))  # gevent only
+
+# gevent monkey-patches the stdlib in the worker, the app imported earlier by the master would keep unpatched
+# sockets and locks, so it cannot be preloaded.
+preload_app = _env_flag('GUNICORN_PRELOAD_APP', True) and worker_class != 'gevent'
+
+# Workers are restarted after serving a random number of requests in <max_requests, max_requests + jitter>,
+# so memory leaks are bounded and workers do not restart all at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 2))
+
+# Heartbeat files in memory, docker overlay filesystem may block workers on fsync.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def when_ready(_):
+    """Moves objects created during preloading to permanent generation, so gc does not touch their pages."""
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, _):
+    """Drops connections inherited from the master process."""
+    app = getattr(server.app, 'callable', None)  # set only when app is preloaded
+    if app is None:
+        return
+    # pylint: disable=import-outside-toplevel
+    from webapp.app import reset_connections
+    # pylint: enable=import-outside-toplevel
+    reset_connections(app)
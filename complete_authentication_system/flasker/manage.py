@@ -1,30 +1,68 @@
+import os
+from pathlib import Path
 import click
-from flask.cli import FlaskGroup
-from flask_migrate import Migrate
+from flask import Flask
+from flask.cli import FlaskGroup, AppGroup
 
-from webapp import create_app, db, auth_models
+os.environ.setdefault('DB_ENGINE_PROFILE', 'cli')
 
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
 
-app = create_app()
-migrate = Migrate(app, db)
-cli = FlaskGroup(app)
+# The app and its dependencies (SQLAlchemy, Redis, Celery, Alembic) are imported only when a command runs,
+# so "--help" and commands which do not need them start fast. Check with "python -X importtime manage.py".
+# pylint: disable=import-outside-toplevel
+
+
+def create_cli_app() -> Flask:
+    """
+    Creates app for the command which is run.
+
+    :return: flasker app instance
+    """
+    from flask_migrate import Migrate
+    from webapp import create_app, db
+
+    app = create_app()
+    Migrate(app, db, directory=str(MIGRATIONS_DIR))
+    app.shell_context_processor(make_shell_context)
+    return app
+
+
+class LazyFlaskGroup(FlaskGroup):
+    """
+    Builds the app only when a command is run. FlaskGroup also builds it to list commands added by the app
+    (e.g. "db" of Flask-Migrate), which are still available but not listed in help.
+    """
+
+    def list_commands(self, ctx: click.Context) -> list:
+        self._load_plugin_commands()
+        return sorted(AppGroup.list_commands(self, ctx))
+
+
+cli = LazyFlaskGroup(create_app=create_cli_app, load_dotenv=False)  # create_app loads environment file
 
 
-@app.shell_context_processor
 def make_shell_context() -> dict:
-    return dict(app=app, db=db, User=auth_models.User, Role=auth_models.Role)
+    from webapp import db, auth_models
+    return dict(app=db.get_app(), db=db, User=auth_models.User, Role=auth_models.Role)
 
 
 @cli.command("create_db")
 def create_db():  # TODO: it should be build as default
+    from flask_migrate import stamp
+    from webapp import db, auth_models
+    from webapp.auth.stats import UserStats
     db.create_all()
     db.session.commit()
+    stamp(directory=str(MIGRATIONS_DIR))  # schema is up to date, next changes are applied by "db upgrade"
 
     auth_models.Role.save_all_to_db()
+    UserStats.reconcile()
 
 
 @cli.command("drop_db")
 def drop_db():
+    from webapp import db
     db.drop_all()
 
 
@@ -33,6 +71,7 @@ def drop_db():
 @click.argument('email')
 @click.argument('password')
 def create_user(username, email, password):
+    from webapp import auth_models
     if auth_models.User.find_by_username(username):
         print(f'User with username="{username}" already exists.')
         return
@@ -44,5 +83,41 @@ def create_user(username, email, password):
     user.save_to_db()
 
 
+@cli.command('backfill_emails')
+@click.option('--batch-size', default=1000, show_default=True, help='Number of users updated in one transaction.')
+def backfill_emails(batch_size):
+    """Fills in normalized emails of existing users (run once after adding email_normalized column)."""
+    from webapp import auth_models
+    updated = auth_models.User.backfill_normalized_emails(batch_size=batch_size)
+    print(f'Normalized emails of {updated} users.')
+
+
+@cli.command('reconcile_user_stats')
+@click.option('--background', is_flag=True, help='Run reconciliation in celery worker.')
+def reconcile_user_stats(background):
+    """Recomputes counters of users shown on admin dashboard."""
+    if background:
+        from webapp.auth.tasks import reconcile_user_stats as reconcile_user_stats_task
+        reconcile_user_stats_task.delay()
+        print('Reconciliation of user counters was scheduled.')
+        return
+    from webapp.auth.stats import UserStats
+    print(f'User counters: {UserStats.reconcile()}')
+
+
+@cli.command('build_password_index', with_appcontext=False)
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.argument('target', type=click.Path(dir_okay=False, writable=True))
+@click.option('--min-count', default=1, show_default=True, help='Skip passwords seen less times in breaches.')
+def build_password_index(source, target, min_count):
+    """Converts text dump of breached passwords SHA-1 hashes (ordered by hash) into index file."""
+    from webapp.auth.password_index import PasswordHashIndex
+    try:
+        written = PasswordHashIndex.build(source, target, min_count=min_count)
+    except ValueError as error:
+        raise click.ClickException(str(error)) from error
+    print(f'Index {target} with {written} hashes was built.')
+
+
 if __name__ == "__main__":
     cli()
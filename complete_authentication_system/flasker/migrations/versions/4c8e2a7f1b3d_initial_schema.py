@@ -0,0 +1,52 @@
+"""Initial schema: roles and users
+
+Revision ID: 4c8e2a7f1b3d
+Revises:
+Create Date: 2026-10-19 10:00:00.000000
+
+Databases created before migrations were added (by "manage.py create_db") already have this schema,
+mark them with "python manage.py db stamp 4c8e2a7f1b3d" before "python manage.py db upgrade".
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2a7f1b3d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'roles',
+        sa.Column('name', sa.String(length=64), nullable=True),
+        sa.Column('default', sa.Boolean(), nullable=True),
+        sa.Column('permissions', sa.Integer(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index('ix_roles_default', 'roles', ['default'], unique=False)
+    op.create_table(
+        'users',
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('password', sa.String(length=100), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('role_id', sa.Integer(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['role_id'], ['roles.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+
+
+def downgrade():
+    op.drop_table('users')
+    op.drop_index('ix_roles_default', table_name='roles')
+    op.drop_table('roles')
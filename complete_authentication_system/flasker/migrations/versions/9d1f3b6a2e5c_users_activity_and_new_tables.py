@@ -0,0 +1,104 @@
+"""Users: normalized email, activity, session generation, soft delete; audit, outbox, stats and exports tables
+
+Revision ID: 9d1f3b6a2e5c
+Revises: 4c8e2a7f1b3d
+Create Date: 2026-10-19 10:05:00.000000
+
+Normalized emails of existing users and their unique index are added by the next revision (b7e4c1d9a0f2).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d1f3b6a2e5c'
+down_revision = '4c8e2a7f1b3d'
+branch_labels = None
+depends_on = None
+
+users = sa.table(
+    'users',
+    sa.column('active', sa.Boolean),
+    sa.column('role_id', sa.Integer),
+)
+user_stats = sa.table('user_stats', sa.column('key', sa.String), sa.column('value', sa.BigInteger))
+
+
+def upgrade():
+    op.add_column('users', sa.Column('email_normalized', sa.String(length=100), nullable=True))
+    op.add_column('users', sa.Column('last_login_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('last_seen_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('session_generation', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_users_last_seen_at', 'users', ['last_seen_at'], unique=False)
+    op.create_index('ix_users_deleted_at', 'users', ['deleted_at'], unique=False,
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'), sqlite_where=sa.text('deleted_at IS NOT NULL'))
+
+    op.create_table(
+        'auth_events',
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('event', sa.String(length=32), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('user_agent', sa.String(length=255), nullable=True),
+        sa.Column('details', sa.String(length=255), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_auth_events_created', 'auth_events', ['created'], unique=False)
+    op.create_index('ix_auth_events_user_id_created', 'auth_events', ['user_id', 'created'], unique=False)
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('task', sa.String(length=255), nullable=False),
+        sa.Column('args', sa.JSON(), nullable=False),
+        sa.Column('kwargs', sa.JSON(), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('traceparent', sa.String(length=55), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'user_stats',
+        sa.Column('key', sa.String(length=32), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_table(
+        'data_exports',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('finished', sa.DateTime(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_data_exports_user_id', 'data_exports', ['user_id'], unique=False)
+    _count_users()
+
+
+def downgrade():
+    op.drop_index('ix_data_exports_user_id', table_name='data_exports')
+    op.drop_table('data_exports')
+    op.drop_table('user_stats')
+    op.drop_table('outbox')
+    op.drop_index('ix_auth_events_user_id_created', table_name='auth_events')
+    op.drop_index('ix_auth_events_created', table_name='auth_events')
+    op.drop_table('auth_events')
+    op.drop_index('ix_users_deleted_at', table_name='users')
+    op.drop_index('ix_users_last_seen_at', table_name='users')
+    with op.batch_alter_table('users') as batch:
+        for column in ('deleted_at', 'session_generation', 'last_seen_at', 'last_login_at', 'email_normalized'):
+            batch.drop_column(column)
+
+
+def _count_users():
+    # Same counters as UserStats.reconcile (webapp/auth/stats.py), existing users are not deleted.
+    counts = {'total': 0, 'active': 0, 'unconfirmed': 0}
+    rows = op.get_bind().execute(
+        sa.select(users.c.active, users.c.role_id, sa.func.count()).group_by(users.c.active, users.c.role_id)
+    )
+    for active, role_id, count in rows:
+        for key in ('total', 'active' if active else 'unconfirmed', f'role:{role_id}'):
+            counts[key] = counts.get(key, 0) + count
+    op.bulk_insert(user_stats, [{'key': key, 'value': value} for key, value in counts.items()])
@@ -0,0 +1,94 @@
+"""Users: backfill normalized emails and make them unique
+
+Revision ID: b7e4c1d9a0f2
+Revises: 9d1f3b6a2e5c
+Create Date: 2026-10-19 10:10:00.000000
+
+Normalized emails of existing users are filled in batches, each one committed separately, before the unique
+index is built (concurrently on PostgreSQL), so the users table is not locked for the whole backfill. Users
+whose emails differ only by case (or surrounding spaces) stop the migration before the index is built, they
+have to be merged or changed first. The revision can be run again after a failure: the backfill skips filled
+rows and an invalid index left by interrupted concurrent build is dropped.
+
+"""
+from alembic import op
+from alembic.util import CommandError
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c1d9a0f2'
+down_revision = '9d1f3b6a2e5c'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+INDEX_NAME = 'ix_users_email_normalized'
+
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('email', sa.String),
+    sa.column('email_normalized', sa.String),
+)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        _drop_invalid_index()
+        _backfill_normalized_emails()
+        _check_duplicate_emails()
+        op.create_index(INDEX_NAME, 'users', ['email_normalized'], unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index(INDEX_NAME, table_name='users')
+
+
+def _drop_invalid_index():
+    connection = op.get_bind()
+    if connection.dialect.name != 'postgresql':
+        return
+    invalid = connection.execute(sa.text(
+        'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+        'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+    ), {'name': INDEX_NAME}).first()
+    if invalid is not None:
+        op.drop_index(INDEX_NAME, table_name='users', postgresql_concurrently=True)
+
+
+def _backfill_normalized_emails():
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        ids = connection.execute(
+            sa.select(users.c.id).where(users.c.id > last_id, users.c.email_normalized.is_(None))
+            .order_by(users.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        connection.execute(users.update().where(users.c.id.in_(ids)).values(
+            email_normalized=sa.func.lower(sa.func.trim(users.c.email))
+        ))
+        last_id = ids[-1]
+
+
+def _check_duplicate_emails():
+    connection = op.get_bind()
+    duplicates = connection.execute(
+        sa.select(users.c.email_normalized).where(users.c.email_normalized.is_not(None))
+        .group_by(users.c.email_normalized).having(sa.func.count() > 1)
+    ).scalars().all()
+    if not duplicates:
+        return
+    ids = {}
+    rows = connection.execute(
+        sa.select(users.c.email_normalized, users.c.id).where(users.c.email_normalized.in_(duplicates))
+        .order_by(users.c.email_normalized, users.c.id)
+    )
+    for email, user_id in rows:
+        ids.setdefault(email, []).append(str(user_id))
+    conflicts = '; '.join(', '.join(user_ids) for user_ids in ids.values())
+    raise CommandError(
+        f'Emails of users differ only by case, merge or change them before upgrading (user ids: {conflicts}).'
+    )
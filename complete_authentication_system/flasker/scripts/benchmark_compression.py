@@ -0,0 +1,55 @@
+"""
+Measures CPU cost and bytes saved by compression of responses rendered from flasker templates.
+
+Usage: ``python scripts/benchmark_compression.py [--iterations 1000]``
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT_DIR = Path(__file__).parents[1]
+sys.path.append(str(PROJECT_ROOT_DIR))
+os.environ.setdefault('FLASK_ENV', 'testing')
+
+# pylint: disable=wrong-import-position
+from webapp import create_app
+from webapp.compression import COMPRESSORS, decompress
+# pylint: enable=wrong-import-position
+
+PAGES = ['/login', '/register', '/reset-password', '/static/main.css', '/static/auth/main.css']
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 11], 'zstd': [1, 3, 10]}
+
+
+def main() -> None:
+    """Prints compression ratio and time per response for every page, algorithm and level."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config['COMPRESS_ENABLED'] = False
+    client = app.test_client()
+
+    print(f'{"page":<24}{"algorithm":>10}{"level":>6}{"bytes":>8}{"compressed":>12}{"saved":>8}{"us/response":>13}')
+    for page in PAGES:
+        data = client.get(page).get_data()
+        for algorithm, levels in LEVELS.items():
+            if algorithm not in COMPRESSORS:
+                continue
+            for level in levels:
+                start = time.process_time()
+                for _ in range(args.iterations):
+                    compressor = COMPRESSORS[algorithm](level)
+                    compressed = compressor.compress(data) + compressor.flush()
+                elapsed = (time.process_time() - start) / args.iterations * 1_000_000
+                assert decompress(compressed, algorithm) == data
+                saved = 1 - len(compressed) / len(data)
+                print(f'{page:<24}{algorithm:>10}{level:>6}{len(data):>8}{len(compressed):>12}'
+                      f'{saved:>8.0%}{elapsed:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures time per call of User lookups: legacy ``Model.query`` API against pre-built statements and
+``session.get`` used by ``User.find_by_*`` methods. Uses in-memory sqlite, so the time is mostly Python
+overhead of building and compiling the query.
+
+Usage: ``python scripts/benchmark_user_lookups.py [--iterations 5000]``
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT_DIR = Path(__file__).parents[1]
+sys.path.append(str(PROJECT_ROOT_DIR))
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ['DATABASE_URI'] = 'sqlite://'
+
+# pylint: disable=wrong-import-position
+from webapp import create_app, db, auth_models
+# pylint: enable=wrong-import-position
+
+User = auth_models.User
+
+
+def measure(function, iterations: int) -> float:
+    """
+    Returns average time of function call.
+
+    :param function: measured function
+    :param iterations: number of calls
+    :return: time in microseconds
+    """
+    function()  # warm up compiled cache
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    """Prints time per lookup of every finder."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='john', email='John.Kennedy@gmail.com', password='-')
+        user.save_to_db()
+        lookups = {
+            'by id': (lambda: User.query.filter_by(id=user.id).first(), lambda: User.find_by_id(user.id)),
+            'by username': (lambda: User.query.filter_by(username='john').first(),
+                            lambda: User.find_by_username('john')),
+            'by email': (lambda: User.query.filter_by(email_normalized='john.kennedy@gmail.com').first(),
+                         lambda: User.find_by_email('john.kennedy@gmail.com')),
+        }
+        print(f'{"lookup":<14}{"Model.query [us]":>18}{"find_by_* [us]":>16}{"change":>9}')
+        for name, (legacy, current) in lookups.items():
+            legacy_time = measure(legacy, args.iterations)
+            current_time = measure(current, args.iterations)
+            change = (current_time - legacy_time) / legacy_time * 100
+            print(f'{name:<14}{legacy_time:>18.1f}{current_time:>16.1f}{change:>8.0f}%')
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
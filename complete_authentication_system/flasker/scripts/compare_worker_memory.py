@@ -0,0 +1,108 @@
+"""
+Compares memory used by gunicorn workers with and without preloaded app (Linux only).
+
+Usage: ``python scripts/compare_worker_memory.py [--workers 4] [--requests 50]``
+
+For every mode the script starts gunicorn with *gunicorn.conf.py*, sends a few requests to warm the workers up
+and reads /proc/<pid>/smaps_rollup of each worker. RSS counts shared pages in every process, PSS divides them
+between processes sharing them, so the sum of PSS is the real memory cost of the workers.
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+from pathlib import Path
+
+
+PROJECT_ROOT_DIR = Path(__file__).parents[1]
+
+
+def free_port() -> int:
+    """Returns free TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid: int) -> list:
+    """Returns pids of child processes."""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children', encoding='utf-8') as file:
+            return [int(child) for child in file.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def memory_usage(pid: int) -> dict:
+    """Returns memory usage (in kB) of process read from smaps_rollup."""
+    usage = {}
+    with open(f'/proc/{pid}/smaps_rollup', encoding='utf-8') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                usage[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': usage.get('Rss', 0),
+        'pss': usage.get('Pss', 0),
+        'private': usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0),
+    }
+
+
+def measure(preload: bool, workers: int, requests: int) -> list:
+    """Starts gunicorn and returns memory usage of its workers."""
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD_APP=str(preload), GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_MAX_REQUESTS='0')
+    env.setdefault('FLASK_ENV', 'testing')
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=PROJECT_ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while len(children(process.pid)) < workers or not ping(port):
+            if time.monotonic() > deadline or process.poll() is not None:
+                raise RuntimeError('Gunicorn did not start.')
+            time.sleep(0.2)
+        for _ in range(requests):
+            ping(port, '/login')
+        time.sleep(1)
+        return [memory_usage(pid) for pid in children(process.pid)]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def ping(port: int, path: str = '/login') -> bool:
+    """Sends GET request to the app."""
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5):
+            return True
+    except OSError:
+        return False
+
+
+def main() -> None:
+    """Prints memory usage of workers in both modes."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f'{"mode":<12}{"workers":>8}{"RSS/worker":>12}{"PSS/worker":>12}{"private/worker":>16}{"PSS total":>12}')
+    for preload in (False, True):
+        usage = measure(preload, args.workers, args.requests)
+        count = len(usage)
+        rss = sum(item['rss'] for item in usage)
+        pss = sum(item['pss'] for item in usage)
+        private = sum(item['private'] for item in usage)
+        mode = 'preload' if preload else 'no preload'
+        print(f'{mode:<12}{count:>8}{rss // count:>9} kB{pss // count:>9} kB{private // count:>13} kB{pss:>9} kB')
+
+
+if __name__ == '__main__':
+    main()
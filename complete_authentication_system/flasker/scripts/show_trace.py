@@ -0,0 +1,60 @@
+"""
+Prints timeline of a trace from spans written by the JSON lines exporter (``TRACING_EXPORTER=jsonl``).
+
+Usage: ``python scripts/show_trace.py logs/traces.jsonl [TRACE_ID]`` (the latest trace when id is not given)
+"""
+
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+
+def load_spans(path: str, trace_id: str = None) -> list:
+    """
+    Returns spans of the trace.
+
+    :param path: path to file with spans
+    :param trace_id: trace id, the latest trace if not given
+    :return: list of spans
+    """
+    with open(path, encoding='utf-8') as file:
+        spans = [json.loads(line) for line in file if line.strip()]
+    if not spans:
+        return []
+    if trace_id is None:
+        trace_id = max(spans, key=lambda span: span['start'])['trace_id']
+    return [span for span in spans if span['trace_id'] == trace_id]
+
+
+def main() -> None:
+    """Prints spans as a tree with start offset and duration of each span."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('trace_id', nargs='?')
+    args = parser.parse_args()
+
+    spans = load_spans(args.path, args.trace_id)
+    if not spans:
+        sys.exit('No spans found.')
+    span_ids = {span['span_id'] for span in spans}
+    children = defaultdict(list)
+    for span in sorted(spans, key=lambda span: span['start']):
+        parent_id = span['parent_id'] if span['parent_id'] in span_ids else None
+        children[parent_id].append(span)
+    trace_start = min(span['start'] for span in spans)
+
+    print(f'trace {spans[0]["trace_id"]}')
+    print(f'{"start [ms]":>11}{"duration [ms]":>15}{"pid":>8}  span')
+
+    def show(parent_id, depth):
+        for span in children[parent_id]:
+            offset = (span['start'] - trace_start) * 1000
+            print(f'{offset:>11.1f}{span["duration_ms"]:>15.1f}{span["pid"]:>8}  {"  " * depth}{span["name"]}')
+            show(span['span_id'], depth + 1)
+
+    show(None, 0)
+
+
+if __name__ == '__main__':
+    main()
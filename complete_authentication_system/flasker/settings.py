@@ -1,5 +1,5 @@
 import os
-import redis
+import tempfile
 
 
 SECRET_KEY = os.environ.get('FLASK_SECRET_KEY')
@@ -16,6 +16,76 @@ ADMINISTRATOR_MAILS = ['admin@fake-mail.com']
 
 MAIL_OFFICIAL_SITE_ADDRESS = 'flasker@fake-mail.com'
 
+# Index built with `manage.py build_password_index` command, breached passwords check is disabled if not set
+BREACHED_PASSWORDS_INDEX_PATH = os.environ.get('BREACHED_PASSWORDS_INDEX_PATH')
+
+# Email domains policy
+EMAIL_BLOCKED_DOMAINS_PATH = os.environ.get('EMAIL_BLOCKED_DOMAINS_PATH')  # e.g. list of disposable domains
+EMAIL_CHECK_DELIVERABILITY = str(os.environ.get('EMAIL_CHECK_DELIVERABILITY')).lower() in ('true', '1', 't')
+EMAIL_DOMAIN_RESOLVER = os.environ.get('EMAIL_DOMAIN_RESOLVER', 'webapp.auth.email_policy.dns_mx_resolver')
+EMAIL_DNS_TIMEOUT = 2.0  # in seconds
+EMAIL_DELIVERABILITY_CACHE_TTL = 24 * 60 * 60  # 1 day
+EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TTL = 1 * 60 * 60  # 1 hour
+
+
+# Auth audit events are buffered by every worker and stored in batches
+AUDIT_EVENTS_BUFFERED = not TESTING  # tests read events stored at once
+AUDIT_BUFFER_SIZE = 100  # flush when buffer reaches given number of events
+AUDIT_FLUSH_INTERVAL = 5.0  # or after given number of seconds
+AUDIT_FLUSH_MODE = os.environ.get('AUDIT_FLUSH_MODE', 'db')  # "db" (bulk insert) or "celery" (task)
+
+
+# Last login/last seen timestamps are coalesced and written to users table in batches
+LAST_SEEN_INTERVAL = 60  # user is marked as seen at most once per given number of seconds
+ACTIVITY_FLUSH_INTERVAL = 60  # in seconds
+
+# Counters of users shown on admin dashboard are updated with users and recomputed periodically
+USER_STATS_RECONCILE_INTERVAL = 24 * 60 * 60  # in seconds
+
+# Deleted accounts are hidden at once and purged with related data by celery task
+USER_PURGE_BATCH_SIZE = 1000  # number of related rows deleted in one transaction
+USER_PURGE_DELAY = 60 * 60  # in seconds, soft-deleted users older than that are purged by the periodic sweep
+USER_PURGE_INTERVAL = 60 * 60  # in seconds
+
+
+# Archives with personal data of users are built by celery task in a directory shared with web servers
+DATA_EXPORT_DIR = os.environ.get('DATA_EXPORT_DIR', os.path.join(os.path.dirname(__file__), 'exports'))
+DATA_EXPORT_BATCH_SIZE = 1000  # number of audit events fetched from the database at once
+DATA_EXPORT_MIN_INTERVAL = 24 * 60 * 60  # in seconds, a user can not export data more often than that
+DATA_EXPORT_PENDING_TIMEOUT = 60 * 60  # in seconds, pending export is failed after that (e.g. its task was lost)
+
+# Tasks triggered by user writes are stored in outbox table in the same transaction and published by relay
+TASK_OUTBOX_ENABLED = str(os.environ.get('TASK_OUTBOX_ENABLED', 'true')).lower() in ('true', '1', 't')
+OUTBOX_RELAY_INTERVAL = 1.0  # in seconds
+OUTBOX_RELAY_BATCH_SIZE = 100
+
+
+# Publishing of tasks from request handlers: "direct" (.delay() in request) or "buffered" (background thread)
+TASK_PUBLISHER = os.environ.get('TASK_PUBLISHER', 'direct')
+TASK_PUBLISHER_QUEUE_SIZE = 1000
+TASK_PUBLISHER_OVERFLOW = 'direct'  # when queue is full: "direct", "block" or "drop"
+TASK_PUBLISHER_BLOCK_TIMEOUT = 1.0  # in seconds
+TASK_PUBLISHER_SHUTDOWN_TIMEOUT = 5.0  # time to publish tasks left in queue on worker exit
+
+
+# Load shedding of emails, based on number of messages waiting in the mail queue
+# Queue depth can not be read from in-memory broker of tests
+BACKPRESSURE_ENABLED = str(os.environ.get('BACKPRESSURE_ENABLED', 'true')).lower() in ('true', '1', 't') and not TESTING
+BACKPRESSURE_QUEUE = 'mail'  # CELERY_QUEUE_MAIL
+BACKPRESSURE_DELAY_DEPTH = int(os.environ.get('BACKPRESSURE_DELAY_DEPTH', 1000))  # resends wait in the outbox
+BACKPRESSURE_REFUSE_DEPTH = int(os.environ.get('BACKPRESSURE_REFUSE_DEPTH', 10000))  # resends are refused
+BACKPRESSURE_CACHE_TTL = 5.0  # in seconds, how long queue depth read from the broker is reused
+BACKPRESSURE_CONNECT_TIMEOUT = 1.0  # in seconds, depth is assumed to be 0 when broker does not respond
+
+
+# Compression of responses
+COMPRESS_ENABLED = True
+COMPRESS_ALGORITHMS = ['br', 'zstd', 'gzip']  # in order of preference, br/zstd need brotli/zstandard packages
+COMPRESS_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+COMPRESS_MIN_SIZE = 500  # in bytes, smaller responses are sent uncompressed
+COMPRESS_MAX_FILE_SIZE = 1024 * 1024  # in bytes, bigger static files are sent uncompressed
+COMPRESS_SECRET_PAGES = False  # pages with CSRF token are sent uncompressed (BREACH)
+
 
 # Server name
 SERVER_NAME = os.environ.get('SERVER_NAME')
@@ -33,38 +103,183 @@ else:
     SQLALCHEMY_DATABASE_PORT = os.environ.get('SQLALCHEMY_DATABASE_PORT')
     SQLALCHEMY_DATABASE_DB = os.environ.get('SQLALCHEMY_DATABASE_DB')
 
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{SQLALCHEMY_DATABASE_USER}:{SQLALCHEMY_DATABASE_PASSWORD}' \
+    SQLALCHEMY_DATABASE_URI = f'postgresql+psycopg2://{SQLALCHEMY_DATABASE_USER}:{SQLALCHEMY_DATABASE_PASSWORD}' \
                               f'@{SQLALCHEMY_DATABASE_HOST}:{SQLALCHEMY_DATABASE_PORT}/{SQLALCHEMY_DATABASE_DB}'
 
+# Engine profiles (PostgreSQL only): "web" for gunicorn workers, "worker" for celery workers and "cli" for
+# manage.py commands and scripts. Statement timeout is in milliseconds, 0 disables it.
+DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'web')
+DB_ENGINE_PROFILES = {
+    'web': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 5, 'pool_recycle': 30 * 60, 'pool_pre_ping': True,
+            'statement_timeout': 5_000},
+    'worker': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 30, 'pool_recycle': 30 * 60,
+               'pool_pre_ping': True, 'statement_timeout': 60_000},
+    'cli': {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30, 'pool_recycle': -1, 'pool_pre_ping': True,
+            'statement_timeout': 0},
+}
+# Connections go through PgBouncer in transaction pooling mode, session settings are sent in every transaction.
+DB_PGBOUNCER = str(os.environ.get('DB_PGBOUNCER', 'false')).lower() in ('true', '1', 't')
+
+
+# Requests which can not be finished in given number of seconds fail fast with 503 (keep it below gunicorn
+# and nginx timeouts), the time left caps SQL statement timeout, Redis socket timeout and task publishing.
+REQUEST_DEADLINE_ENABLED = str(os.environ.get('REQUEST_DEADLINE_ENABLED', 'true')).lower() in ('true', '1', 't')
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 20.0))
+REQUEST_DEADLINES = {  # by endpoint, None disables the deadline
+    'auth.login': 5.0,
+    'auth.register': 5.0,
+}
+
 
 # Redis
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PORT = os.environ.get('REDIS_PORT')
 REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/1'
+REDIS_ENABLED = bool(REDIS_HOST)
+# One connection pool per logical database in a process (see webapp/connections.py), limits are per pool.
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = 1.0  # in seconds, waiting for a free connection when all are in use
+REDIS_SOCKET_TIMEOUT = 2.0  # in seconds
+REDIS_SOCKET_CONNECT_TIMEOUT = 1.0  # in seconds
+REDIS_HEALTH_CHECK_INTERVAL = 30  # in seconds, idle connections are pinged before use
+# Logical databases of consumers ("session", "activity", "cache", "profiler", "celery"), e.g. {"celery": 2},
+# other consumers use database of REDIS_URL.
+REDIS_DATABASES = {}
 
 
 # Session
 SESSION_TYPE = os.environ.get('SESSION_TYPE')
 if SESSION_TYPE == 'redis':
     SESSION_USE_SIGNER = True
-    SESSION_REDIS = redis.from_url(REDIS_URL)
 SESSION_PERMANENT = False
+SESSION_REFRESH_INTERVAL = 60 * 60  # unchanged sessions have their expiration time refreshed at most once an hour
+
+
+# Flash messages
+FLASH_BACKEND = os.environ.get('FLASH_BACKEND', 'cookie')  # "cookie" (no session write) or "session"
+FLASH_COOKIE_NAME = 'flashes'
+FLASH_COOKIE_MAX_AGE = 60  # in seconds, messages are read by the next request
+FLASH_COOKIE_MAX_MESSAGES = 10
+
+
+# Metrics
+# /metrics is served on the app port, enable it only where it is not reachable from outside or set the token
+METRICS_ENABLED = str(os.environ.get('METRICS_ENABLED', 'false')).lower() in ('true', '1', 't')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # required as "Authorization: Bearer <token>" when set
+# With Redis, every process (gunicorn and celery workers) adds its counters to shared totals in given interval
+METRICS_PUSH_INTERVAL = 5.0  # in seconds
+METRICS_KEY_PREFIX = 'metrics:'
+
+
+# Profiler
+# Administrators profile a request with "X-Profile" header or "_profile" query argument, profiles are listed
+# at /admin/profiles. When disabled, requests are not wrapped at all.
+PROFILER_ENABLED = str(os.environ.get('PROFILER_ENABLED', 'false')).lower() in ('true', '1', 't')
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0))  # fraction of all requests profiled
+PROFILER_INTERVAL = 0.005  # in seconds, time between stack samples
+PROFILER_MAX_PROFILES = 50
+
+
+# Tracing
+# Spans of requests, SQL queries, Redis commands, templates and celery tasks, "jsonl" exporter appends them
+# to TRACING_FILE (show a trace with scripts/show_trace.py), other exporters are given by import path.
+TRACING_ENABLED = str(os.environ.get('TRACING_ENABLED', 'false')).lower() in ('true', '1', 't')
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'jsonl')
+TRACING_FILE = os.environ.get('TRACING_FILE', os.path.join(os.path.dirname(__file__), 'logs', 'traces.jsonl'))
 
 
 # Celery
+CELERY_QUEUE_MAIL = 'mail'  # transactional auth emails, always served first
+CELERY_QUEUE_DEFAULT = 'default'
+CELERY_QUEUE_BULK = 'bulk'  # bulk and maintenance jobs, served when nothing else is waiting
+
+# Comma separated list of queues consumed by the worker started with this environment,
+# e.g. "mail" for a dedicated mail worker or "default,bulk" for a maintenance worker.
+CELERY_WORKER_QUEUES = [
+    queue.strip() for queue in os.environ.get('CELERY_WORKER_QUEUES', '').split(',') if queue.strip()
+]
+
+# Prefetch/ack tuning of worker processes, selected with CELERY_WORKER_PROFILE variable.
+CELERY_WORKER_PROFILES = {
+    'default': {
+        'worker_prefetch_multiplier': 4,
+    },
+    'transactional': {  # short, latency sensitive tasks: never hold messages another process could run
+        'worker_prefetch_multiplier': 1,
+        'task_acks_late': True,
+        'task_reject_on_worker_lost': True,
+    },
+    'bulk': {  # long running batches: throughput matters more than latency
+        'worker_prefetch_multiplier': 16,
+        'task_acks_late': True,
+    },
+}
+CELERY_WORKER_PROFILE = os.environ.get('CELERY_WORKER_PROFILE', 'default')
+
 CELERY_CONFIG = {
     'broker_url': REDIS_URL,
     'result_backend': REDIS_URL,
+    'broker_transport_options': {
+        # Workers consuming several queues poll them in the order of `task_queues`.
+        'queue_order_strategy': 'priority',
+    },
+    'task_queues': {
+        CELERY_QUEUE_MAIL: {},
+        CELERY_QUEUE_DEFAULT: {},
+        CELERY_QUEUE_BULK: {},
+    },
+    'task_default_queue': CELERY_QUEUE_DEFAULT,
+    'task_routes': {
+        'webapp.auth.tasks.send_*': {'queue': CELERY_QUEUE_MAIL},
+        'webapp.auth.tasks.store_auth_events': {'queue': CELERY_QUEUE_BULK},
+        'webapp.auth.tasks.flush_user_activity': {'queue': CELERY_QUEUE_BULK},
+        'webapp.auth.tasks.reconcile_user_stats': {'queue': CELERY_QUEUE_BULK},
+        'webapp.auth.tasks.purge_*': {'queue': CELERY_QUEUE_BULK},
+        'webapp.auth.tasks.export_user_data': {'queue': CELERY_QUEUE_BULK},
+        # Not in the mail queue, relay scheduled every second would add to its depth (BACKPRESSURE_QUEUE).
+        'webapp.tasks.relay_outbox': {'queue': CELERY_QUEUE_DEFAULT},
+    },
+    'beat_schedule': {
+        'relay-outbox': {
+            'task': 'webapp.tasks.relay_outbox',
+            'schedule': OUTBOX_RELAY_INTERVAL,
+        },
+        'flush-user-activity': {
+            'task': 'webapp.auth.tasks.flush_user_activity',
+            'schedule': ACTIVITY_FLUSH_INTERVAL,
+        },
+        'reconcile-user-stats': {
+            'task': 'webapp.auth.tasks.reconcile_user_stats',
+            'schedule': USER_STATS_RECONCILE_INTERVAL,
+        },
+        'purge-deleted-users': {
+            'task': 'webapp.auth.tasks.purge_deleted_users',
+            'schedule': USER_PURGE_INTERVAL,
+        },
+    },
+    # Tasks which results are needed have to enable it explicitly with `ignore_result=False`.
+    'task_ignore_result': True,
     'include': [
+        'webapp.tasks',
         'webapp.auth.tasks',
-    ]
+    ],
+    **CELERY_WORKER_PROFILES[CELERY_WORKER_PROFILE],
 }
 
 if TESTING:
     # WFT form extension
     WTF_CSRF_METHODS = []
     WTF_CSRF_ENABLED = False
+    # Extensions keep their data in process, celery uses in-memory broker
+    REDIS_ENABLED = False
+    # Password hashing with the lowest cost, full cost is only needed against offline attacks
+    BCRYPT_LOG_ROUNDS = 4
+    # Data exports
+    DATA_EXPORT_DIR = os.environ.get('TEST_DATA_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'flasker-exports'))
     # Celery
-    CELERY_ALWAYS_EAGER = True
-    CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
-    BROKER_BACKEND = 'memory'
+    CELERY_CONFIG.update({
+        'broker_url': 'memory://',
+        'result_backend': 'cache+memory://',
+        'task_always_eager': True,
+        'task_eager_propagates': True,
+    })
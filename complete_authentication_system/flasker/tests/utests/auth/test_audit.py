@@ -0,0 +1,29 @@
+from webapp.auth.audit import AuditEventBuffer
+from webapp.auth.models import AuthEvent
+
+
+class TestAuditEventBuffer:
+    """The class tests buffer of auth audit events."""
+
+    def test_events_are_stored_in_batch_on_flush(self, client, user):
+        app = client.application
+        app.config.update(AUDIT_EVENTS_BUFFERED=True, AUDIT_BUFFER_SIZE=100, AUDIT_FLUSH_INTERVAL=3600)
+        buffer = AuditEventBuffer(app)
+
+        buffer.record('login_success', user)
+        buffer.record('logout', user)
+        assert AuthEvent.find_by_user_id(user.id) == []
+
+        buffer.flush()
+        events = AuthEvent.find_by_user_id(user.id)
+        assert sorted(event.event for event in events) == ['login_success', 'logout']
+
+    def test_login_is_audited(self, client, user):
+        data = {
+            'email': 'john.kennedy@gmail.com',
+            'password': 'Ohh'
+        }
+        client.post('/login', data=data)
+
+        events = AuthEvent.find_by_user_id(user.id)
+        assert [(event.event, event.details) for event in events] == [('login_failure', 'invalid password')]
@@ -0,0 +1,81 @@
+import pytest
+import redis
+
+from webapp.auth.email_policy import EmailDomainPolicy, LocalTTLCache, RedisTTLCache, get_email_policy
+
+
+class StubResolver:
+    """Resolver answering from dictionary and counting lookups."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = 0
+
+    def __call__(self, domain):
+        self.calls += 1
+        return self.answers.get(domain)
+
+
+class BrokenRedis:
+    """Redis client double failing every command."""
+
+    def get(self, *_, **__):
+        raise redis.ConnectionError('Connection refused.')
+
+    def set(self, *_, **__):
+        raise redis.ConnectionError('Connection refused.')
+
+
+class TestEmailDomainPolicy:
+    """The class tests email domain policy."""
+
+    @pytest.mark.parametrize('domain,blocked', [
+        ('mailinator.com', True),
+        ('MAILINATOR.com.', True),
+        ('eu.mailinator.com', True),
+        ('notmailinator.com', False),
+        ('gmail.com', False),
+    ])
+    def test_blocked_domains(self, domain, blocked):
+        policy = EmailDomainPolicy(blocked_domains=['mailinator.com\n', '# comment', ''])
+
+        assert policy.is_blocked(domain) is blocked
+
+    def test_deliverability_is_cached(self):
+        resolver = StubResolver({'gmail.com': True, 'no-mx.com': False})
+        policy = EmailDomainPolicy(resolver=resolver, cache=LocalTTLCache())
+
+        assert policy.is_deliverable('gmail.com')
+        assert policy.is_deliverable('Gmail.com')
+        assert not policy.is_deliverable('no-mx.com')
+        assert not policy.is_deliverable('no-mx.com')
+        assert resolver.calls == 2
+
+    def test_unanswered_lookup_is_not_cached(self):
+        resolver = StubResolver({})
+        policy = EmailDomainPolicy(resolver=resolver)
+
+        assert policy.is_deliverable('slow-dns.com')
+        assert policy.is_deliverable('slow-dns.com')
+        assert resolver.calls == 2
+
+    def test_deliverability_without_resolver(self):
+        assert EmailDomainPolicy().is_deliverable('any.com')
+
+    def test_lookup_is_not_cached_when_redis_fails(self, client):
+        resolver = StubResolver({'no-mx.com': False})
+        policy = EmailDomainPolicy(resolver=resolver, cache=RedisTTLCache(BrokenRedis()))
+
+        assert not policy.is_deliverable('no-mx.com')
+        assert not policy.is_deliverable('no-mx.com')
+        assert resolver.calls == 2
+
+    def test_policy_follows_configuration(self, client, tmp_path):
+        blocked_domains_path = tmp_path / 'blocked.txt'
+        blocked_domains_path.write_text('mailinator.com\n')
+        assert not get_email_policy().is_blocked('mailinator.com')
+
+        client.application.config['EMAIL_BLOCKED_DOMAINS_PATH'] = str(blocked_domains_path)
+
+        assert get_email_policy().is_blocked('mailinator.com')
+        assert get_email_policy() is get_email_policy()
@@ -0,0 +1,143 @@
+import io
+import json
+import shutil
+import zipfile
+import datetime
+import pytest
+from pathlib import Path
+
+from webapp import db, outbox, auth_models
+from webapp.auth import tasks
+from webapp.auth.export import DataExport
+
+
+@pytest.fixture
+def export_dir(client):
+    path = Path(client.application.config['DATA_EXPORT_DIR'])
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def add_events(user_id, count):
+    db.session.execute(auth_models.AuthEvent.__table__.insert(), [
+        {'user_id': user_id, 'event': 'login', 'created': datetime.datetime(2024, 1, 1, 0, minute),
+         'ip_address': '10.0.0.1'} for minute in range(count)
+    ])
+    db.session.commit()
+
+
+class TestDataExport:
+    """The class tests export of personal data of users."""
+
+    def test_export_is_built_by_task(self, auth_client, user, export_dir):
+        add_events(user.id, 5)
+        auth_client.post('/account/export')
+        export = DataExport.latest(user.id)
+        assert export.status == DataExport.PENDING
+        assert [message.task for message in outbox.OutboxMessage.query.all()] == ['webapp.auth.tasks.export_user_data']
+
+        tasks.export_user_data(export.id)
+        db.session.refresh(export)
+
+        assert export.status == DataExport.READY
+        assert list(export_dir.iterdir()) == [export_dir / export.filename]
+        with zipfile.ZipFile(export.path) as archive:
+            assert json.loads(archive.read('profile.json'))['email'] == 'john.kennedy@gmail.com'
+            assert json.loads(archive.read('sessions.json'))['session_generation'] == 0
+            assert len(archive.read('auth_events.jsonl').splitlines()) == 5
+
+    def test_auth_events_are_streamed_in_batches(self, client, user, export_dir):
+        add_events(user.id, 5)
+        export = DataExport(user_id=user.id)
+        export.save_to_db()
+
+        export.build(batch_size=2)
+
+        with zipfile.ZipFile(export.path) as archive:
+            events = [json.loads(line) for line in archive.read('auth_events.jsonl').splitlines()]
+        assert [event['created'] for event in events] == [f'2024-01-01T00:0{minute}:00' for minute in range(5)]
+        assert events[0]['ip_address'] == '10.0.0.1'
+
+    def test_download_link(self, auth_client, user, export_dir):
+        export = DataExport(user_id=user.id)
+        export.save_to_db()
+        tasks.export_user_data(export.id)
+        db.session.expire_all()
+
+        html_page = auth_client.get('/account').data.decode('utf-8')
+        assert f'/account/export/{export.id}' in html_page
+
+        resp = auth_client.get(f'/account/export/{export.id}')
+        assert resp.status_code == 200
+        assert zipfile.ZipFile(io.BytesIO(resp.data)).namelist() == ['profile.json', 'sessions.json',
+                                                                     'auth_events.jsonl']
+
+    def test_download_of_other_user_export(self, auth_client, user, export_dir):
+        export = DataExport(user_id=user.id + 1, status=DataExport.READY)
+        export.save_to_db()
+
+        assert auth_client.get(f'/account/export/{export.id}').status_code == 404
+
+    def test_purge_removes_exports(self, client, export_dir):
+        user = auth_models.User(username='Jane', email='jane@gmail.com', password='-')
+        user.save_to_db()
+        export = DataExport(user_id=user.id)
+        export.save_to_db()
+        tasks.export_user_data(export.id)
+        user.soft_delete()
+        user.save_to_db()
+
+        tasks.purge_user(user.id)
+
+        assert DataExport.latest(user.id) is None
+        assert list(export_dir.iterdir()) == []
+
+    def test_new_export_removes_previous_archive(self, client, user, export_dir):
+        previous = DataExport(user_id=user.id)
+        previous.save_to_db()
+        tasks.export_user_data(previous.id)
+        previous_id = previous.id
+        export = DataExport(user_id=user.id)
+        export.save_to_db()
+
+        tasks.export_user_data(export.id)
+
+        assert db.session.get(DataExport, previous_id) is None
+        assert list(export_dir.iterdir()) == [export_dir / export.filename]
+
+    def test_recent_export_is_not_repeated(self, auth_client, user, export_dir):
+        export = DataExport(user_id=user.id, status=DataExport.READY, finished=datetime.datetime.utcnow())
+        export.save_to_db()
+
+        resp = auth_client.post('/account/export', follow_redirects=True)
+
+        assert 'Your data has been exported recently' in resp.data.decode('utf-8')
+        assert DataExport.latest(user.id) == export
+        assert outbox.backlog_size() == 0
+
+        export.created -= datetime.timedelta(seconds=auth_client.application.config['DATA_EXPORT_MIN_INTERVAL'])
+        export.save_to_db()
+        auth_client.post('/account/export')
+
+        assert DataExport.latest(user.id).status == DataExport.PENDING
+
+    def test_lost_pending_export_is_started_again(self, auth_client, user, export_dir):
+        timeout = auth_client.application.config['DATA_EXPORT_PENDING_TIMEOUT']
+        lost = DataExport(user_id=user.id, created=datetime.datetime.utcnow() - datetime.timedelta(seconds=timeout))
+        lost.save_to_db()
+
+        html_page = auth_client.get('/account').data.decode('utf-8')
+        assert 'Your data could not be exported, please try again.' in html_page
+
+        auth_client.post('/account/export')
+
+        export = DataExport.latest(user.id)
+        assert (lost.status, export.status) == (DataExport.FAILED, DataExport.PENDING)
+        assert export != lost
+        assert [message.args for message in outbox.OutboxMessage.query.all()] == [[export.id]]
+
+        tasks.export_user_data(lost.id)  # task published before it was lost
+        db.session.refresh(lost)
+        assert lost.status == DataExport.FAILED
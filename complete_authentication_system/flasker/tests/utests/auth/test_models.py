@@ -0,0 +1,106 @@
+import datetime
+from sqlalchemy import event
+
+from webapp import db, auth_models
+from webapp.auth.stats import UserStats
+
+
+class TestUserEmail:
+    """The class tests normalized email of users."""
+
+    def test_email_is_normalized(self, client, user):
+        user.email = 'John.Kennedy@Gmail.com'
+        user.save_to_db()
+
+        assert user.email_normalized == 'john.kennedy@gmail.com'
+        assert auth_models.User.find_by_email('JOHN.KENNEDY@gmail.com') == user
+
+    def test_backfill_normalized_emails(self, client, user):
+        table = auth_models.User.__table__
+        db.session.execute(table.update().values(email='John.Kennedy@Gmail.com', email_normalized=None))
+        db.session.commit()
+        assert auth_models.User.find_by_email('john.kennedy@gmail.com') is None
+
+        assert auth_models.User.backfill_normalized_emails(batch_size=1) == 1
+        assert auth_models.User.backfill_normalized_emails() == 0
+        db.session.expire_all()
+        assert auth_models.User.find_by_email('john.kennedy@gmail.com') == user
+
+
+class TestUserLookups:
+    """The class tests finders of users."""
+
+    def test_find_by_id_uses_identity_map(self, client, user):
+        assert user.username == 'John'  # reloads user expired by commit
+        statements = []
+
+        def listener(conn, cursor, statement, *_):  # pylint: disable=unused-argument
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert auth_models.User.find_by_id(user.id) is user
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert not [statement for statement in statements if 'FROM users' in statement]
+        assert auth_models.User.find_by_id(None) is None
+
+    def test_find_by_username(self, client, user):
+        assert auth_models.User.find_by_username('John') is user
+        assert auth_models.User.find_by_username('Abraham') is None
+
+
+class TestSoftDelete:
+    """The class tests soft delete and purge of users."""
+
+    def test_soft_deleted_user_is_hidden(self, client, user):
+        user.soft_delete()
+        user.save_to_db()
+
+        assert auth_models.User.find_by_id(user.id) is None
+        assert auth_models.User.find_by_username('John') is None
+        assert auth_models.User.find_by_email('john.kennedy@gmail.com') is None
+        assert auth_models.User.find_by_email('john.kennedy@gmail.com', include_deleted=True) == user
+        assert UserStats.counts()['total'] == 0
+
+    def test_purge_user(self, client):
+        from webapp.auth.tasks import purge_user
+        client.application.config['USER_PURGE_BATCH_SIZE'] = 2
+        user = auth_models.User(username='Jane', email='jane@gmail.com', password='-')
+        user.save_to_db()
+        db.session.execute(auth_models.AuthEvent.__table__.insert(), [
+            {'user_id': user.id, 'event': 'login', 'created': datetime.datetime.utcnow()} for _ in range(5)
+        ])
+        db.session.commit()
+        user_id = user.id
+
+        # run() executes the task in the app of the test client (not of celery), so batch size above is used
+        purge_user.run(user_id)  # not deleted yet
+        assert auth_models.User.find_by_id(user_id) is not None
+
+        user.soft_delete()
+        user.save_to_db()
+        purge_user.run(user_id)
+
+        assert auth_models.User.find_by_id(user_id, include_deleted=True) is None
+        assert auth_models.AuthEvent.find_by_user_id(user_id) == []
+        assert UserStats.counts()['total'] == 0
+
+    def test_purge_deleted_users(self, client, user):
+        from webapp.auth.tasks import purge_deleted_users
+        user.soft_delete()
+        user.deleted_at -= datetime.timedelta(seconds=client.application.config['USER_PURGE_DELAY'] + 1)
+        user.save_to_db()
+        user_id = user.id
+        db.session.execute(auth_models.AuthEvent.__table__.insert(), [
+            {'user_id': user_id + 1, 'event': 'account_delete', 'created': datetime.datetime.utcnow(),
+             'ip_address': '127.0.0.1'},  # stored after its user was purged
+            {'user_id': None, 'event': 'login_failure', 'created': datetime.datetime.utcnow(), 'ip_address': None},
+        ])
+        db.session.commit()
+
+        purge_deleted_users()
+        db.session.expunge_all()  # purged by the task in the session of celery app
+
+        assert auth_models.User.find_by_id(user_id, include_deleted=True) is None
+        assert [event.event for event in auth_models.AuthEvent.query.all()] == ['login_failure']
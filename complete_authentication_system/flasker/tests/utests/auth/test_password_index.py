@@ -0,0 +1,59 @@
+import hashlib
+import pytest
+
+from webapp.auth.password_index import PasswordHashIndex, get_password_index
+
+
+def sha1_line(password, count=1):
+    return f'{hashlib.sha1(password.encode()).hexdigest().upper()}:{count}'
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    lines = sorted([sha1_line('password'), sha1_line('Abrlin16', 3), sha1_line('qwerty', 10)])
+    path = tmp_path / 'passwords.idx'
+    PasswordHashIndex.build(lines, str(path))
+    return str(path)
+
+
+class TestPasswordHashIndex:
+    """The class tests index of breached passwords."""
+
+    def test_lookup(self, index_path):
+        index = PasswordHashIndex(index_path)
+
+        assert len(index) == 3
+        assert index.contains_password('password')
+        assert index.contains_password('Abrlin16')
+        assert index.contains_password('qwerty')
+        assert not index.contains_password('Jofken35')
+
+    def test_build_with_min_count(self, tmp_path):
+        lines = sorted([sha1_line('password', 1), sha1_line('qwerty', 10)])
+        path = str(tmp_path / 'passwords.idx')
+
+        assert PasswordHashIndex.build(lines, path, min_count=2) == 1
+        index = PasswordHashIndex(path)
+        assert index.contains_password('qwerty')
+        assert not index.contains_password('password')
+
+    def test_build_from_unordered_dump(self, tmp_path):
+        lines = sorted([sha1_line('password'), sha1_line('qwerty')], reverse=True)
+
+        with pytest.raises(ValueError, match='not ordered'):
+            PasswordHashIndex.build(lines, str(tmp_path / 'passwords.idx'))
+
+    def test_empty_index(self, tmp_path):
+        path = str(tmp_path / 'passwords.idx')
+        PasswordHashIndex.build([], path)
+
+        assert not PasswordHashIndex(path).contains_password('password')
+
+    def test_rebuilt_index_is_reopened(self, index_path):
+        index = get_password_index(index_path)
+        assert get_password_index(index_path) is index
+        assert not index.contains_password('Jofken35')
+
+        PasswordHashIndex.build([sha1_line('Jofken35')], index_path)
+
+        assert get_password_index(index_path).contains_password('Jofken35')
@@ -0,0 +1,46 @@
+from webapp import db, auth_models
+from webapp.auth.stats import UserStats
+
+
+class TestUserStats:
+    """The class tests counters of users."""
+
+    def test_counters_follow_user_changes(self, client, user):
+        role = auth_models.Role(name='Administrator', permissions=0xff)
+        role.save_to_db()
+        assert UserStats.counts() == {'total': 1, 'unconfirmed': 1, 'role:None': 1}
+
+        user.active = True
+        user.role = role
+        user.save_to_db()
+        assert UserStats.counts() == {'total': 1, 'unconfirmed': 0, 'active': 1, 'role:None': 0,
+                                      f'role:{role.id}': 1}
+
+        user.delete_from_db()
+        assert UserStats.counts() == {'total': 0, 'unconfirmed': 0, 'active': 0, 'role:None': 0,
+                                      f'role:{role.id}': 0}
+
+    def test_reconcile(self, client, user):
+        db.session.execute(UserStats.__table__.update().values(value=100))
+        db.session.commit()
+
+        assert UserStats.reconcile() == {'total': 1, 'active': 0, 'unconfirmed': 1, 'role:None': 1}
+        assert UserStats.counts() == {'total': 1, 'active': 0, 'unconfirmed': 1, 'role:None': 1}
+
+    def test_reconcile_resets_counters_of_removed_roles(self, client, user):
+        db.session.execute(UserStats.__table__.insert().values(key='role:99', value=3))
+        db.session.commit()
+
+        assert UserStats.reconcile()['role:99'] == 0
+        assert UserStats.counts() == {'total': 1, 'active': 0, 'unconfirmed': 1, 'role:None': 1, 'role:99': 0}
+
+    def test_admin_dashboard(self, auth_client, user):
+        role = auth_models.Role(name='Administrator', permissions=0xff)
+        role.save_to_db()
+        user.role = role
+        user.save_to_db()
+
+        html_page = auth_client.get('/admin').data.decode('utf-8')
+
+        assert '<tr><th>Active</th><td>1</td></tr>' in html_page
+        assert '<tr><th>Administrator</th><td>1</td></tr>' in html_page
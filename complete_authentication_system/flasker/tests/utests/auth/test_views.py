@@ -1,7 +1,12 @@
+import hashlib
 import pytest
 
-from webapp import auth_models
+from webapp import db, auth_models, outbox
 from webapp.auth import tasks
+from webapp.auth.activity import activity_tracker
+from webapp.auth.audit import audit_events
+from webapp.auth.utils import load_user
+from webapp.auth.password_index import PasswordHashIndex
 
 
 class MockDelay:
@@ -47,10 +52,11 @@ class TestRegisterEndpoint:
         html_page = resp.data.decode('utf-8')
         assert 'This username is already taken.' in html_page
 
-    def test_registration_with_existing_email_in_db(self, client, user):
+    @pytest.mark.parametrize('email', ['john.kennedy@gmail.com', 'John.Kennedy@Gmail.com'])
+    def test_registration_with_existing_email_in_db(self, client, user, email):
         data = {
             'username': 'Abraham',
-            'email': 'john.kennedy@gmail.com',
+            'email': email,
             'password': 'Abrlin16',
             'confirm_password': 'Abrlin16'
         }
@@ -59,6 +65,41 @@ class TestRegisterEndpoint:
         html_page = resp.data.decode('utf-8')
         assert 'This email is already taken, please select another one.' in html_page
 
+    def test_registration_with_breached_password(self, client, tmp_path):
+        index_path = str(tmp_path / 'passwords.idx')
+        PasswordHashIndex.build([hashlib.sha1(b'Abrlin16').hexdigest().upper() + ':5'], index_path)
+        client.application.config['BREACHED_PASSWORDS_INDEX_PATH'] = index_path
+
+        data = {
+            'username': 'Abraham',
+            'email': 'abraham.lincoln@gmail.com',
+            'password': 'Abrlin16',
+            'confirm_password': 'Abrlin16'
+        }
+        resp = client.post('/register', data=data)
+
+        assert resp.status_code == 200
+        html_page = resp.data.decode('utf-8')
+        assert 'This password has appeared in a data breach' in html_page
+        assert auth_models.User.find_by_username('Abraham') is None
+
+    def test_registration_with_blocked_email_domain(self, client, tmp_path):
+        blocked_domains_path = tmp_path / 'blocked_domains.txt'
+        blocked_domains_path.write_text('mailinator.com\n')
+        client.application.config['EMAIL_BLOCKED_DOMAINS_PATH'] = str(blocked_domains_path)
+
+        data = {
+            'username': 'Abraham',
+            'email': 'abraham.lincoln@mailinator.com',
+            'password': 'Abrlin16',
+            'confirm_password': 'Abrlin16'
+        }
+        resp = client.post('/register', data=data)
+
+        assert resp.status_code == 200
+        html_page = resp.data.decode('utf-8')
+        assert 'Emails from this domain are not accepted' in html_page
+
     def test_registration_with_invalid_form_fields(self, client):
         data = {
             'username': 'A',
@@ -109,14 +150,15 @@ class TestLoginEndpoint:
         assert 'Redirecting...' in html_page
         assert not user.active
 
-    def test_login_with_valid_credentials_and_active_account(self, client, user):
+    @pytest.mark.parametrize('email', ['john.kennedy@gmail.com', 'JOHN.Kennedy@gmail.com'])
+    def test_login_with_valid_credentials_and_active_account(self, client, user, email):
         # Prepare user
         user.active = True
         user.save_to_db()
         # Test endpoint
 
         data = {
-            'email': 'john.kennedy@gmail.com',
+            'email': email,
             'password': 'Jofken35'
         }
         resp = client.post('/login', data=data, follow_redirects=True)
@@ -125,6 +167,62 @@ class TestLoginEndpoint:
         html_page = resp.data.decode('utf-8')
         assert 'Main app content' in html_page
 
+    def test_login_timestamps_are_written_in_batch(self, client, user):
+        user.active = True
+        user.save_to_db()
+
+        data = {
+            'email': 'john.kennedy@gmail.com',
+            'password': 'Jofken35'
+        }
+        client.post('/login', data=data, follow_redirects=True)
+        assert user.last_login_at is None
+
+        assert activity_tracker.flush() == 2
+        db.session.expire_all()
+        assert user.last_login_at is not None
+
+    def test_failed_flush_after_request_does_not_fail_request(self, auth_client, user, monkeypatch):
+        def fail(_):
+            raise RuntimeError('Database is not available.')
+        monkeypatch.setattr('webapp.auth.activity._utc_datetime', fail)
+        monkeypatch.setattr(activity_tracker, 'flush_interval', 0)
+
+        resp = auth_client.get('/account')
+
+        assert resp.status_code == 200
+        monkeypatch.undo()
+        assert activity_tracker.flush() == 1  # last seen is kept for the next flush
+        assert user.last_seen_at is not None
+
+    def test_login_timestamps_are_kept_when_flush_fails(self, client, user, monkeypatch):
+        user.active = True
+        user.save_to_db()
+        client.post('/login', data={'email': 'john.kennedy@gmail.com', 'password': 'Jofken35'})
+
+        def fail(_):
+            raise RuntimeError('Database is not available.')
+        with monkeypatch.context() as patch:
+            patch.setattr('webapp.auth.activity._utc_datetime', fail)
+            with pytest.raises(RuntimeError):
+                activity_tracker.flush()
+
+        assert activity_tracker.flush() == 2
+        db.session.expire_all()
+        assert user.last_login_at is not None
+
+    def test_failed_flush_after_request_does_not_fail_request(self, auth_client, user, monkeypatch):
+        def fail(_):
+            raise RuntimeError('Database is not available.')
+        monkeypatch.setattr('webapp.auth.activity._utc_datetime', fail)
+        monkeypatch.setattr(activity_tracker, 'flush_interval', 0)
+
+        resp = auth_client.get('/account')
+
+        assert resp.status_code == 200
+        monkeypatch.undo()
+        assert activity_tracker.flush() == 1  # last seen is kept for the next flush
+
 
 class TestActivateAccountEndpoint:
     """The class tests '/confirm/<token>' endpoint."""
@@ -146,6 +244,21 @@ class TestActivateAccountEndpoint:
         assert resp.status_code == 404
 
 
+class TestSendResetPasswordLinkEndpoint:
+    """The class tests '/reset-password' endpoint."""
+
+    def test_reset_password_link_for_blocked_email_domain(self, client, user, tmp_path):
+        blocked_domains_path = tmp_path / 'blocked_domains.txt'
+        blocked_domains_path.write_text('gmail.com\n')  # blocked after the user has registered
+        client.application.config['EMAIL_BLOCKED_DOMAINS_PATH'] = str(blocked_domains_path)
+
+        resp = client.post('/reset-password', data={'email': user.email})
+
+        html_page = resp.data.decode('utf-8')
+        assert 'A reset password email has been sent to you.' in html_page
+        assert 'Emails from this domain are not accepted' not in html_page
+
+
 class TestResetPasswordEndpoint:
     """The class tests '/reset-password/<token>' endpoint."""
 
@@ -161,6 +274,20 @@ class TestResetPasswordEndpoint:
         html_page = resp.data.decode('utf-8')
         assert resp.status_code == 200 and 'Your password has been reset.' in html_page
 
+    def test_reset_password_logs_user_out_everywhere(self, client, user):
+        old_session_id = user.get_id()
+        assert load_user(old_session_id) is user
+
+        token = user.generate_jwt_token(expire_time=15)
+        data = {
+            'password': 'Jofken99',
+            'confirm_password': 'Jofken99'
+        }
+        client.post(f'/reset-password/{token}', data=data)
+
+        assert load_user(old_session_id) is None
+        assert load_user(user.get_id()) is user
+
 
 class TestAccountEndpoint:
     """The class tests '/account' endpoint."""
@@ -211,6 +338,21 @@ class TestAccountDeleteEndpoint:
         html_page = resp.data.decode('utf-8')
         assert 'Your account has been deleted successfully.' in html_page
 
+    def test_account_delete_hides_user_and_enqueues_purge(self, auth_client, user):
+        auth_client.post('/account/delete', data={'slug': 'delete'})
+
+        assert auth_models.User.find_by_username('John') is None
+        assert auth_models.User.find_by_id(user.id, include_deleted=True).deleted_at is not None
+        assert [message.task for message in outbox.OutboxMessage.query.all()] == ['webapp.auth.tasks.purge_user']
+
+    def test_account_delete_event_is_stored_before_purge(self, auth_client, user, monkeypatch):
+        monkeypatch.setattr(audit_events, 'buffered', True)
+        monkeypatch.setattr(audit_events, '_ensure_flusher', lambda: None)
+
+        auth_client.post('/account/delete', data={'slug': 'delete'})
+
+        assert [event.event for event in auth_models.AuthEvent.find_by_user_id(user.id)] == ['account_delete']
+
     def test_account_delete_with_invalid_slug(self, auth_client):
         data = {'slug': 'fake'}
         resp = auth_client.post('/account/delete', data=data, follow_redirects=True)
@@ -1,16 +1,86 @@
 import os
 import sys
+import sqlite3
+import tempfile
 import pytest
 from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 project_root_dir_path = Path(__file__).parents[2]
 sys.path.append(str(project_root_dir_path))
 
 os.environ["FLASK_ENV"] = 'testing'
 
+# Every pytest-xdist worker ("gw0", "gw1", ...) has its own database (in memory) and directory of exports.
+worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+os.environ.setdefault('TEST_DATA_EXPORT_DIR', str(Path(tempfile.gettempdir()) / f'flasker-exports-{worker}'))
+
 from webapp import create_app, db, auth_models
 
 
+class SharedConnection(sqlite3.Connection):
+    """SQLite connection shared by engines of all apps, transactions are controlled by `TestDatabase`."""
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestDatabase:
+    """
+    In-memory database of a test process. Engines of all apps (test client, celery tasks run eagerly, commands)
+    use the same connection, so they see each other's changes. Every test runs in a transaction which is rolled
+    back after it and transactions of the app (sessions, `db.engine.begin()`) are SAVEPOINTs in it, so the schema
+    is created once per process and nothing has to be deleted between tests.
+    """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False,
+                                          factory=SharedConnection)
+        self.savepoints = []
+        event.listen(Engine, 'do_connect', self._connect)
+        event.listen(Engine, 'begin', self._begin)
+        event.listen(Engine, 'commit', self._commit)
+        event.listen(Engine, 'rollback', self._rollback)
+
+    def begin_test(self) -> None:
+        self.connection.execute('BEGIN')
+
+    def rollback_test(self) -> None:
+        self.savepoints.clear()
+        self.connection.execute('ROLLBACK')
+
+    def _connect(self, dialect, connection_record, cargs, cparams):
+        return self.connection if dialect.name == 'sqlite' else None
+
+    def _owns(self, connection) -> bool:
+        return connection.connection.dbapi_connection is self.connection
+
+    def _begin(self, connection):
+        if self._owns(connection):
+            self.savepoints.append(f'transaction_{len(self.savepoints)}')
+            self.connection.execute(f'SAVEPOINT {self.savepoints[-1]}')
+
+    def _commit(self, connection):
+        if self._owns(connection) and self.savepoints:
+            self.connection.execute(f'RELEASE SAVEPOINT {self.savepoints.pop()}')
+
+    def _rollback(self, connection):
+        if self._owns(connection) and self.savepoints:
+            savepoint = self.savepoints.pop()
+            self.connection.execute(f'ROLLBACK TO SAVEPOINT {savepoint}')
+            self.connection.execute(f'RELEASE SAVEPOINT {savepoint}')
+
+
+test_database = TestDatabase()
+
+
 def request_loader(client, user):
     """
     The function load user. It allows make authenticated client in tests.
@@ -23,14 +93,25 @@ def request_loader(client, user):
         return user
 
 
+@pytest.fixture(scope='session')
+def database():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    yield test_database
+
+
 @pytest.fixture
-def client():
+def client(database):
+    # App is created for every test, tests change its configuration and register routes.
     app = create_app()
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-            yield client
-            db.drop_all()
+    database.begin_test()
+    try:
+        with app.test_client() as client:
+            with app.app_context():
+                yield client
+    finally:
+        database.rollback_test()
 
 
 @pytest.fixture
@@ -50,5 +131,4 @@ def user():
                                 email='john.kennedy@gmail.com',
                                 password=password_hash)
     new_user.save_to_db()
-    yield new_user
-    new_user.delete_from_db()
+    return new_user
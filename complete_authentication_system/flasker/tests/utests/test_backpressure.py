@@ -0,0 +1,139 @@
+import time
+import threading
+import pytest
+
+from webapp import outbox
+from webapp.celery import celery_app
+from webapp.auth import tasks
+from webapp.backpressure import mail_backpressure
+
+
+@pytest.fixture
+def queue_depth(client, monkeypatch):
+    client.application.config.update(BACKPRESSURE_ENABLED=True, BACKPRESSURE_DELAY_DEPTH=10,
+                                     BACKPRESSURE_REFUSE_DEPTH=100)
+    mail_backpressure.init_app(client.application)
+    depth = {'value': 0, 'reads': 0}
+
+    def read_depth():
+        depth['reads'] += 1
+        return depth['value']
+    monkeypatch.setattr(mail_backpressure, '_read_depth', read_depth)
+    yield depth
+    client.application.config['BACKPRESSURE_ENABLED'] = False
+    mail_backpressure.init_app(client.application)
+
+
+def set_depth(depth, value):
+    depth['value'] = value
+    mail_backpressure.refresh()
+
+
+class TestQueueBackpressure:
+    """The class tests load shedding based on depth of the mail queue."""
+
+    @pytest.mark.parametrize('value,level', [(0, 'normal'), (10, 'delay'), (100, 'refuse')])
+    def test_levels(self, queue_depth, value, level):
+        set_depth(queue_depth, value)
+
+        assert mail_backpressure.level() == level
+
+    def test_depth_is_cached(self, queue_depth):
+        set_depth(queue_depth, 5)
+        mail_backpressure.queue_depth()
+        queue_depth['value'] = 500
+
+        assert mail_backpressure.queue_depth() == 5
+        assert queue_depth['reads'] == 1
+
+    def test_depth_is_read_in_background(self, queue_depth, monkeypatch):
+        set_depth(queue_depth, 5)
+        mail_backpressure._checked_at = None  # pylint: disable=protected-access
+        release, read = threading.Event(), threading.Event()
+
+        def read_depth():
+            release.wait(5)
+            read.set()
+            return 500
+        monkeypatch.setattr(mail_backpressure, '_read_depth', read_depth)
+
+        assert mail_backpressure.queue_depth() == 5  # request does not wait for the broker
+        assert mail_backpressure.queue_depth() == 5  # refresh is started once
+        release.set()
+        assert read.wait(5)
+        for _ in range(100):
+            if mail_backpressure.queue_depth() == 500:
+                break
+            threading.Event().wait(0.01)
+        assert mail_backpressure.queue_depth() == 500
+
+    def test_broker_error_does_not_block_requests(self, queue_depth, monkeypatch):
+        set_depth(queue_depth, 100)
+
+        def read_depth():
+            raise ConnectionError('broker is down')
+        monkeypatch.setattr(mail_backpressure, '_read_depth', read_depth)
+
+        assert mail_backpressure.refresh() == 0
+        assert mail_backpressure.level() == 'normal'
+
+    def test_unavailable_broker_fails_fast(self, client, monkeypatch):
+        client.application.config.update(BACKPRESSURE_ENABLED=True, BACKPRESSURE_CONNECT_TIMEOUT=0.5)
+        mail_backpressure.init_app(client.application)
+        monkeypatch.setattr(celery_app.conf, 'broker_read_url', 'redis://127.0.0.1:1/0')
+        started = time.monotonic()
+
+        try:
+            assert mail_backpressure.refresh() == 0
+        finally:
+            client.application.config['BACKPRESSURE_ENABLED'] = False
+            mail_backpressure.init_app(client.application)
+        assert time.monotonic() - started < 1.5
+
+    def test_resend_is_refused(self, auth_client, user, queue_depth, monkeypatch):
+        sent = []
+        monkeypatch.setattr(tasks.send_account_activation_email, 'delay', lambda *args: sent.append(args))
+        user.active = False
+        user.save_to_db()
+        set_depth(queue_depth, 100)
+
+        resp = auth_client.get('/resend-confirmation', follow_redirects=True)
+
+        assert 'please try again in a few minutes' in resp.data.decode('utf-8')
+        assert sent == [] and outbox.backlog_size() == 0
+
+    def test_resend_is_delayed_in_outbox(self, auth_client, user, queue_depth):
+        user.active = False
+        user.save_to_db()
+        set_depth(queue_depth, 10)
+
+        resp = auth_client.get('/resend-confirmation', follow_redirects=True)
+
+        assert 'A new confirmation email has been sent to you.' in resp.data.decode('utf-8')
+        assert outbox.backlog_size() == 1
+        assert outbox.relay() == 0  # relay waits until the queue drains
+
+    def test_other_tasks_are_relayed_while_mail_is_delayed(self, client, queue_depth, monkeypatch):
+        published = []
+        monkeypatch.setattr(celery_app, 'send_task',
+                            lambda name, args, kwargs, headers=None: published.append(name))
+        outbox.db.session.add_all([
+            outbox.OutboxMessage(task='webapp.auth.tasks.send_account_activation_email', args=[1]),
+            outbox.OutboxMessage(task='webapp.auth.tasks.export_user_data', args=[1]),
+        ])
+        outbox.db.session.commit()
+        set_depth(queue_depth, 10)
+
+        assert outbox.relay() == 1
+        assert published == ['webapp.auth.tasks.export_user_data']
+
+        set_depth(queue_depth, 0)
+        assert outbox.relay() == 1
+        assert published[1:] == ['webapp.auth.tasks.send_account_activation_email']
+
+    def test_reset_password_link_is_refused(self, client, user, queue_depth):
+        set_depth(queue_depth, 100)
+
+        resp = client.post('/reset-password', data={'email': user.email})
+
+        assert 'please try again in a few minutes' in resp.data.decode('utf-8')
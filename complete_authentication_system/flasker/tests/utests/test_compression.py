@@ -0,0 +1,45 @@
+from flask import Response, stream_with_context
+
+from webapp.compression import decompress
+
+
+class TestCompression:
+    """The class tests compression of responses."""
+
+    def test_page_is_compressed_with_accepted_encoding(self, client):
+        resp = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in resp.headers['Vary']
+        assert b"Don't have an account?" in decompress(resp.data, 'gzip')
+
+    def test_page_is_not_compressed_without_accepted_encoding(self, client):
+        resp = client.get('/login')
+
+        assert 'Content-Encoding' not in resp.headers
+        assert b"Don't have an account?" in resp.data
+
+    def test_page_with_csrf_token_is_not_compressed(self, client):
+        client.application.config['WTF_CSRF_ENABLED'] = True
+        resp = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in resp.headers
+        assert b'name="csrf_token"' in resp.data
+
+    def test_small_response_is_not_compressed(self, client):
+        resp = client.get('/static/main.css', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in resp.headers
+
+    def test_streamed_response_is_compressed(self, client):
+        @client.application.route('/stream')
+        def stream():
+            def generate():
+                for i in range(100):
+                    yield f'<p>line {i}</p>'
+            return Response(stream_with_context(generate()), mimetype='text/html')
+
+        resp = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert decompress(resp.data, 'gzip') == ''.join(f'<p>line {i}</p>' for i in range(100)).encode()
@@ -0,0 +1,52 @@
+import redis
+import pytest
+
+from webapp.connections import InstrumentedConnectionPool, redis_connections
+from webapp.metrics import metrics
+
+
+@pytest.fixture
+def connections(client):
+    app = client.application
+    app.config.update(REDIS_ENABLED=True, REDIS_URL='redis://redis:6379/1', REDIS_DATABASES={'celery': 2},
+                      REDIS_MAX_CONNECTIONS=10, REDIS_SOCKET_TIMEOUT=0.5)
+    redis_connections.init_app(app)
+    yield redis_connections
+    app.config['REDIS_ENABLED'] = False
+    redis_connections.init_app(app)
+
+
+class TestRedisConnections:
+    """The class tests Redis connection pools shared by consumers."""
+
+    def test_redis_is_not_used_when_disabled(self, client):
+        assert redis_connections.client('session') is None
+        assert redis_connections.celery_options() == {}
+
+    def test_consumers_share_pool_of_database(self, connections):
+        session, cache, celery = (connections.client(name) for name in ('session', 'cache', 'celery'))
+
+        assert connections.client('session') is session
+        assert isinstance(session.connection_pool, InstrumentedConnectionPool)
+        assert session.connection_pool is cache.connection_pool
+        assert celery.connection_pool is not session.connection_pool
+        assert celery.connection_pool.connection_kwargs['db'] == 2
+        assert session.connection_pool.max_connections == 10
+        assert session.connection_pool.connection_kwargs['socket_timeout'] == 0.5
+
+    def test_celery_options(self, connections):
+        options = connections.celery_options({'queue_order_strategy': 'priority'})
+
+        assert options['broker_url'] == options['result_backend'] == 'redis://redis:6379/2'
+        assert options['broker_transport_options']['max_connections'] == 10
+        assert options['broker_transport_options']['queue_order_strategy'] == 'priority'
+        assert options['redis_socket_timeout'] == 0.5
+
+    def test_command_latency_is_measured(self, connections, monkeypatch):
+        monkeypatch.setattr(redis.Redis, 'execute_command', lambda *args, **kwargs: True)
+        metrics.clear()
+
+        connections.client('session').ping()
+
+        assert metrics.get('redis_command_seconds', command='ping') == 1
+        assert 'redis_pool_in_use 0' in metrics.render()
@@ -0,0 +1,160 @@
+import time
+import socket
+import threading
+import pytest
+from flask import request
+from flask_login import current_user
+
+from webapp import db
+from webapp.auth import tasks
+from webapp.auth.activity import activity_tracker
+from webapp.celery import celery_app
+from webapp.deadline import request_deadline, DeadlineExceeded
+from webapp.connections import DeadlineConnection, InstrumentedConnectionPool, InstrumentedRedis
+from webapp.publisher import TaskPublisher
+from webapp.metrics import metrics
+
+
+class FakeTask:
+    """Task double recording publishing options."""
+
+    name = 'fake'
+
+    def __init__(self):
+        self.options = None
+
+    def apply_async(self, args, kwargs, **options):
+        self.options = options
+
+
+class EchoServer:
+    """Minimal Redis server answering ECHO with its argument and other commands with OK."""
+
+    def __init__(self):
+        self.socket = socket.create_server(('127.0.0.1', 0))
+        self.port = self.socket.getsockname()[1]
+        self.commands = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:  # closed
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        with connection, connection.makefile('rb') as file:
+            for line in file:
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(file.readline()[1:])
+                    args.append(file.read(length + 2)[:-2])
+                self.commands.append(args)
+                if args[0].upper() == b'HELLO':
+                    connection.sendall(b'%1\r\n$5\r\nproto\r\n:3\r\n')
+                elif args[0].upper() == b'ECHO':
+                    connection.sendall(b'$%d\r\n%s\r\n' % (len(args[1]), args[1]))
+                else:
+                    connection.sendall(b'+OK\r\n')
+
+
+@pytest.fixture
+def echo_server():
+    server = EchoServer()
+    yield server
+    server.socket.close()
+
+
+@pytest.fixture
+def expired_request(client):
+    with client.application.test_request_context('/login'):
+        request.environ[request_deadline.ENVIRON_KEY] = time.monotonic() - 1
+        yield request
+
+
+class TestRequestDeadline:
+    """The class tests request deadlines."""
+
+    def test_request_after_deadline_fails_fast(self, client, user, monkeypatch):
+        monkeypatch.setitem(request_deadline.deadlines, 'auth.login', 0.0)
+        metrics.clear()
+
+        resp = client.post('/login', data={'email': 'john.kennedy@gmail.com', 'password': 'Jofken35'})
+
+        assert resp.status_code == 503
+        assert 'could not be finished in time (database)' in resp.data.decode('utf-8')
+        assert metrics.get('request_deadline_misses_total', endpoint='auth.login', operation='database') == 1
+
+    def test_late_response_is_counted(self, client, monkeypatch):
+        monkeypatch.setitem(request_deadline.deadlines, 'auth.login', 0.0)
+        metrics.clear()
+
+        assert client.get('/login').status_code == 200
+        assert metrics.get('request_deadline_misses_total', endpoint='auth.login', operation='response') == 1
+
+    def test_late_response_is_sent_with_activity_flush(self, auth_client, user, monkeypatch):
+        @auth_client.application.route('/slow')
+        def slow():
+            username = current_user.username
+            time.sleep(0.3)
+            return username
+        monkeypatch.setitem(request_deadline.deadlines, 'slow', 0.1)
+        monkeypatch.setattr(activity_tracker, 'flush_interval', 0)
+        metrics.clear()
+
+        resp = auth_client.get('/slow')
+
+        assert resp.status_code == 200
+        assert metrics.get('request_deadline_misses_total', endpoint='slow', operation='response') == 1
+        db.session.refresh(user)
+        assert user.last_seen_at is not None  # flushed after the response was ready
+
+    def test_endpoint_without_deadline(self, client, user, monkeypatch):
+        monkeypatch.setitem(request_deadline.deadlines, 'auth.login', None)
+
+        resp = client.post('/login', data={'email': 'john.kennedy@gmail.com', 'password': 'Jofken35'})
+
+        assert resp.status_code == 302
+
+    def test_no_deadline_outside_of_request(self, client):
+        assert request_deadline.remaining() is None
+        assert request_deadline.check('task') is None
+
+    def test_unread_redis_reply_is_not_passed_to_next_command(self, client, echo_server):
+        pool = InstrumentedConnectionPool(connection_class=DeadlineConnection, port=echo_server.port,
+                                          max_connections=1)
+        redis_client = InstrumentedRedis(connection_pool=pool)
+        with client.application.test_request_context('/login'):
+            request.environ[request_deadline.ENVIRON_KEY] = time.monotonic() + 5
+            connection = pool.get_connection()
+            connection.send_command('ECHO', 'sent before deadline')
+            request.environ[request_deadline.ENVIRON_KEY] = time.monotonic() - 1
+            with pytest.raises(DeadlineExceeded):
+                connection.read_response()
+            pool.release(connection)
+            with pytest.raises(DeadlineExceeded):
+                redis_client.echo('sent after deadline')
+
+        assert redis_client.echo('next') == b'next'
+        pool.disconnect()
+        assert [b'sent after deadline'] not in [args[1:] for args in echo_server.commands]
+
+    def test_task_is_not_published_after_deadline(self, client, expired_request):
+        with pytest.raises(DeadlineExceeded):
+            TaskPublisher(client.application).publish(FakeTask(), 1)
+
+    def test_task_publishing_stops_at_deadline(self, client, monkeypatch):
+        broker = socket.create_server(('127.0.0.1', 0))  # accepts connections, never answers
+        monkeypatch.setattr(celery_app.conf, 'task_always_eager', False)
+        monkeypatch.setattr(celery_app.conf, 'broker_write_url', f'redis://127.0.0.1:{broker.getsockname()[1]}/0')
+        monkeypatch.setitem(request_deadline.deadlines, 'auth.login', 0.5)
+
+        with broker, client.application.test_request_context('/login'):
+            client.application.preprocess_request()
+            started = time.monotonic()
+            with pytest.raises(DeadlineExceeded):
+                TaskPublisher(client.application).publish(tasks.send_account_activation_email, 1)
+
+        assert time.monotonic() - started < 1.0
@@ -0,0 +1,75 @@
+import pytest
+from flask import redirect, render_template_string
+
+from webapp.flashing import flash, get_flashed_messages
+from webapp.redis_session import RedisSessionInterface
+from .test_redis_session import FakeRedis
+
+
+@pytest.fixture
+def redis_client(client):
+    app = client.application
+    fake_redis = FakeRedis()
+    app.session_interface = RedisSessionInterface(fake_redis, refresh_interval=60)
+
+    @app.route('/flash/redirect')
+    def flash_and_redirect():
+        flash('Saved', 'success')
+        return redirect('/flash/render')
+
+    @app.route('/flash/render')
+    def render():
+        return render_template_string(
+            '{% for category, message in get_flashed_messages(with_categories=true) %}'
+            '[{{ category }}] {{ message }};{% endfor %}'
+        )
+
+    @app.route('/flash/same-request')
+    def flash_and_render():
+        flash('Error', 'error')
+        return ','.join(get_flashed_messages(category_filter=['error']))
+
+    return fake_redis
+
+
+class TestCookieFlash:
+    """The class tests flash messages stored in signed cookie."""
+
+    def test_redirect_then_render_does_not_touch_session(self, client, redis_client):
+        resp = client.get('/flash/redirect', follow_redirects=True)
+
+        assert resp.data == b'[success] Saved;'
+        assert redis_client.commands == []
+
+    def test_messages_are_cleared_on_read(self, client, redis_client):
+        client.get('/flash/redirect')
+
+        assert client.get('/flash/render').data == b'[success] Saved;'
+        assert client.get_cookie('flashes') is None
+        assert client.get('/flash/render').data == b''
+
+    def test_messages_flashed_in_the_same_request(self, client, redis_client):
+        assert client.get('/flash/same-request').data == b'Error'
+        assert client.get_cookie('flashes') is None
+
+    def test_tampered_cookie_is_ignored(self, client, redis_client):
+        client.set_cookie('flashes', 'forged')
+
+        assert client.get('/flash/render').data == b''
+
+    def test_session_backend(self, client, redis_client):
+        client.application.extensions['flash_backend'] = 'session'
+        client.get('/flash/redirect')
+
+        assert client.get_cookie('flashes') is None
+        assert 'set' in redis_client.commands
+
+    def test_login_required_message_does_not_touch_session(self, client, redis_client):
+        resp = client.get('/account')
+        assert resp.status_code == 302
+        assert '/login?next=' in resp.headers['Location']
+
+        resp = client.get(resp.headers['Location'])
+
+        assert 'Please log in to access this page.' in resp.data.decode('utf-8')
+        assert redis_client.commands == []
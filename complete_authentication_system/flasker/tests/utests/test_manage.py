@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+from pathlib import Path
+from click.testing import CliRunner
+
+import manage
+from webapp import auth_models
+
+PROJECT_ROOT_DIR = Path(__file__).parents[2]
+
+
+def import_times(*args):
+    """Returns cumulative import time (in microseconds) of top-level modules imported by manage.py."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', *args],
+        cwd=PROJECT_ROOT_DIR, env=dict(os.environ, FLASK_ENV='testing'), capture_output=True, text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+class TestManage:
+    """The class tests command line interface."""
+
+    def test_help_does_not_import_app(self):
+        times = import_times('--help')
+
+        assert 'flask' in times
+        for module in ('webapp', 'sqlalchemy', 'celery', 'redis', 'bcrypt', 'alembic'):
+            assert module not in times, f'{module} is imported by "manage.py --help"'
+
+    def test_command_builds_app(self, client):
+        result = CliRunner().invoke(manage.cli, ['create_user', 'jane', 'jane@gmail.com', 'Abcd1234'])
+
+        assert result.exit_code == 0, result.output
+        assert auth_models.User.find_by_username('jane') is not None
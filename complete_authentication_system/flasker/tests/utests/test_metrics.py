@@ -0,0 +1,120 @@
+import pytest
+from flask import Flask
+
+from webapp.metrics import Metrics, register_metrics_endpoint
+
+
+class FakeRedis:
+    """Redis double keeping hashes in dictionary, like Redis it stores floats as strings."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.broken = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hincrbyfloat(self, key, field, value):
+        if self.broken:
+            raise ConnectionError('Redis is not available.')
+        values = self.hashes.setdefault(key, {})
+        values[field.encode()] = str(float(values.get(field.encode(), 0)) + value).encode()
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+class FakePipeline:
+    """Pipeline double executing buffered commands at once."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hincrbyfloat(self, *args):
+        self.commands.append(args)
+
+    def execute(self):
+        for args in self.commands:
+            self.redis.hincrbyfloat(*args)
+
+
+@pytest.fixture
+def shared_metrics():
+    redis = FakeRedis()
+    app = Flask(__name__)
+    app.config['METRICS_PUSH_INTERVAL'] = 3600
+    processes = [Metrics(), Metrics()]
+    for process in processes:
+        process.init_app(app, redis)
+    return redis, processes
+
+
+@pytest.fixture
+def metrics_app():
+    app = Flask(__name__)
+    app.config.update(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    register_metrics_endpoint(app)
+    return app
+
+
+class TestMetricsEndpoint:
+    """The class tests endpoint exposing metrics."""
+
+    def test_endpoint_is_disabled_by_default(self, client):
+        assert client.get('/metrics').status_code == 404
+
+    def test_endpoint_requires_token(self, metrics_app):
+        client = metrics_app.test_client()
+
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+class TestSharedMetrics:
+    """The class tests metrics shared by processes in Redis."""
+
+    def test_every_process_renders_totals(self, shared_metrics):
+        _, (web, worker) = shared_metrics
+        web.inc('requests_total', endpoint='login')
+        worker.inc('requests_total', 2, endpoint='login')
+        worker.observe('relay_lag_seconds', 0.5)
+        worker.push()  # by background thread every METRICS_PUSH_INTERVAL seconds
+
+        for process in (web, worker):
+            rendered = process.render()
+            assert 'requests_total{endpoint="login"} 3.0' in rendered
+            assert 'relay_lag_seconds_count 1.0' in rendered
+            assert 'relay_lag_seconds_sum 0.5' in rendered
+
+    def test_values_are_pushed_once(self, shared_metrics):
+        _, (web, worker) = shared_metrics
+        web.inc('requests_total')
+        web.push()
+        web.push()
+
+        assert 'requests_total 1.0' in worker.render()
+
+    def test_values_are_pushed_after_redis_failure(self, shared_metrics):
+        redis, (web, worker) = shared_metrics
+        web.inc('requests_total')
+        redis.broken = True
+        assert web.push() is False
+        assert 'requests_total 1' in web.render()  # values of the process
+
+        redis.broken = False
+        web.push()
+
+        assert 'requests_total 1.0' in worker.render()
+
+    def test_values_inherited_by_forked_process_are_not_pushed_again(self, shared_metrics):
+        _, (web, worker) = shared_metrics
+        web.inc('requests_total')
+        web.push()
+
+        web._forked()  # pylint: disable=protected-access
+        web.inc('requests_total')
+        web.push()
+
+        assert 'requests_total 2.0' in worker.render()
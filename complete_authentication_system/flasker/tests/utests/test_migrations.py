@@ -0,0 +1,79 @@
+import os
+import sys
+import sqlite3
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT_DIR = Path(__file__).parents[2]
+
+
+def manage(database_path, *args):
+    """Runs manage.py command in a separate process with its own database."""
+    return subprocess.run(
+        [sys.executable, 'manage.py', *args], cwd=PROJECT_ROOT_DIR, capture_output=True, text=True, check=True,
+        env=dict(os.environ, FLASK_ENV='testing', DATABASE_URI=f'sqlite:///{database_path}'),
+    )
+
+
+class TestMigrations:
+    """The class tests database migrations."""
+
+    def test_migrations_match_models(self, tmp_path):
+        database_path = tmp_path / 'flasker.db'
+        manage(database_path, 'db', 'upgrade')
+
+        result = manage(database_path, 'db', 'check')
+        assert 'No new upgrade operations detected' in result.stdout + result.stderr
+
+        manage(database_path, 'db', 'downgrade', 'base')
+        with sqlite3.connect(database_path) as connection:
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert tables == {'alembic_version'}
+
+    def test_existing_users_are_migrated(self, tmp_path):
+        database_path = tmp_path / 'flasker.db'
+        manage(database_path, 'db', 'upgrade', '4c8e2a7f1b3d')
+        with sqlite3.connect(database_path) as connection:
+            connection.execute("INSERT INTO roles (id, name, permissions) VALUES (1, 'User', 1)")
+            connection.executemany(
+                'INSERT INTO users (username, email, password, active, role_id) VALUES (?, ?, ?, ?, 1)',
+                [('John', ' John.Kennedy@Gmail.com', 'hash', True), ('Jane', 'jane@gmail.com', 'hash', False)],
+            )
+
+        manage(database_path, 'db', 'upgrade')
+
+        with sqlite3.connect(database_path) as connection:
+            users = connection.execute(
+                'SELECT email_normalized, session_generation, deleted_at FROM users ORDER BY id'
+            ).fetchall()
+            stats = dict(connection.execute('SELECT key, value FROM user_stats').fetchall())
+        assert users == [('john.kennedy@gmail.com', 0, None), ('jane@gmail.com', 0, None)]
+        assert stats == {'total': 2, 'active': 1, 'unconfirmed': 1, 'role:1': 2}
+
+    def test_duplicate_normalized_emails_stop_upgrade(self, tmp_path):
+        database_path = tmp_path / 'flasker.db'
+        manage(database_path, 'db', 'upgrade', '4c8e2a7f1b3d')
+        with sqlite3.connect(database_path) as connection:
+            connection.execute("INSERT INTO roles (id, name, permissions) VALUES (1, 'User', 1)")
+            connection.executemany(
+                'INSERT INTO users (id, username, email, password, active, role_id) VALUES (?, ?, ?, ?, 1, 1)',
+                [(1, 'John', 'John@gmail.com', 'hash'), (2, 'Jane', 'jane@gmail.com', 'hash'),
+                 (3, 'Johnny', 'john@gmail.com ', 'hash')],
+            )
+
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'db', 'upgrade'], cwd=PROJECT_ROOT_DIR, capture_output=True, text=True,
+            env=dict(os.environ, FLASK_ENV='testing', DATABASE_URI=f'sqlite:///{database_path}'),
+        )
+        assert result.returncode != 0
+        assert 'user ids: 1, 3' in result.stderr
+
+        with sqlite3.connect(database_path) as connection:
+            connection.execute(
+                "UPDATE users SET email = 'johnny@gmail.com', email_normalized = 'johnny@gmail.com' WHERE id = 3"
+            )
+        manage(database_path, 'db', 'upgrade')
+
+        with sqlite3.connect(database_path) as connection:
+            emails = connection.execute('SELECT email_normalized FROM users ORDER BY id').fetchall()
+        assert emails == [('john@gmail.com',), ('jane@gmail.com',), ('johnny@gmail.com',)]
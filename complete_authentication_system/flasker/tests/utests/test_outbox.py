@@ -0,0 +1,69 @@
+from webapp import outbox, auth_models
+from webapp.celery import celery_app
+from webapp.metrics import metrics
+from webapp.tasks import relay_outbox
+
+
+class RecordingRedis:
+    """Redis double recording fields incremented through pipeline."""
+
+    def __init__(self):
+        self.fields = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hincrbyfloat(self, key, field, value):
+        self.fields.append(field)
+
+    def execute(self):
+        pass
+
+
+class TestOutbox:
+    """The class tests transactional outbox of celery tasks."""
+
+    def test_registration_stores_task_in_outbox(self, client):
+        data = {
+            'username': 'Abraham',
+            'email': 'abraham.lincoln@gmail.com',
+            'password': 'Abrlin16',
+            'confirm_password': 'Abrlin16'
+        }
+        client.post('/register', data=data)
+
+        new_user = auth_models.User.find_by_username('Abraham')
+        messages = outbox.OutboxMessage.query.all()
+        assert [(message.task, message.args) for message in messages] == [
+            ('webapp.auth.tasks.send_account_activation_email', [new_user.id])
+        ]
+
+    def test_relay_publishes_messages_in_batches(self, client, monkeypatch):
+        published = []
+        monkeypatch.setattr(celery_app, 'send_task',
+                            lambda name, args, kwargs, headers=None: published.append((name, args)))
+        for i in range(5):
+            outbox.db.session.add(outbox.OutboxMessage(task='webapp.auth.tasks.send_account_activation_email',
+                                                       args=[i]))
+        outbox.db.session.commit()
+        assert outbox.backlog_size() == 5
+
+        assert outbox.relay(batch_size=2) == 5
+
+        assert [args for _, args in published] == [[0], [1], [2], [3], [4]]
+        assert outbox.backlog_size() == 0
+        assert outbox.oldest_message_age() == 0.0
+
+    def test_relay_metrics_are_pushed_by_worker(self, client, monkeypatch):
+        monkeypatch.setattr(celery_app, 'send_task', lambda name, args, kwargs, headers=None: None)
+        outbox.db.session.add(outbox.OutboxMessage(task='webapp.auth.tasks.send_account_activation_email', args=[1]))
+        outbox.db.session.commit()
+        redis = RecordingRedis()
+        metrics.init_app(client.application, redis)
+        try:
+            relay_outbox()
+        finally:
+            metrics.init_app(client.application)
+
+        assert any('outbox_relay_lag_seconds' in field for field in redis.fields)
+        assert any('outbox_relayed_total' in field for field in redis.fields)
@@ -0,0 +1,77 @@
+import time
+from collections import Counter
+import pytest
+from flask import Flask
+
+from webapp import auth_models
+from webapp.profiling import request_profiler, StackSampler
+
+
+@pytest.fixture
+def profiled_client(client):
+    app = client.application
+    app.config.update(PROFILER_ENABLED=True, PROFILER_INTERVAL=0.001)
+    request_profiler.init_app(app)
+
+    @app.route('/profiling/slow')
+    def slow():
+        time.sleep(0.05)
+        return 'done'
+
+    yield client
+    app.login_manager.request_loader(lambda _: None)  # login manager is shared by apps of all tests
+
+
+@pytest.fixture
+def admin(user):
+    role = auth_models.Role(name='Administrator', permissions=0xff)
+    role.save_to_db()
+    user.role = role
+    user.save_to_db()
+    return user
+
+
+class TestRequestProfiler:
+    """The class tests on-demand profiler of requests."""
+
+    def test_disabled_profiler_does_not_wrap_requests(self, client):
+        assert client.application.dispatch_request.__func__ is Flask.dispatch_request
+
+    def test_admin_request_is_profiled(self, profiled_client, admin):
+        profiled_client.application.login_manager.request_loader(lambda _: admin)
+
+        resp = profiled_client.get('/profiling/slow', headers={'X-Profile': '1', 'X-Request-ID': 'abc-1'})
+
+        assert resp.data == b'done'
+        assert resp.headers['X-Profile-Id'] == 'abc-1'
+        profile = request_profiler.store.get('abc-1')
+        assert profile['endpoint'] == 'slow' and profile['samples'] > 0
+        assert 'slow (test_profiling.py' in profile['stacks']
+
+    def test_not_admin_request_is_not_profiled(self, profiled_client, user):
+        profiled_client.application.login_manager.request_loader(lambda _: user)
+
+        resp = profiled_client.get('/profiling/slow?_profile=1')
+
+        assert 'X-Profile-Id' not in resp.headers
+        assert request_profiler.store.recent() == []
+
+    def test_sampled_request_is_profiled(self, profiled_client):
+        request_profiler.sample_rate = 1.0
+
+        resp = profiled_client.get('/profiling/slow')
+
+        assert request_profiler.store.get(resp.headers['X-Profile-Id']) is not None
+
+    def test_admin_page(self, profiled_client, admin):
+        profiled_client.application.login_manager.request_loader(lambda _: admin)
+        profiled_client.get('/profiling/slow', headers={'X-Profile': '1', 'X-Request-ID': 'abc-2'})
+
+        assert 'abc-2' in profiled_client.get('/admin/profiles').data.decode('utf-8')
+        resp = profiled_client.get('/admin/profiles/abc-2')
+        assert resp.mimetype == 'text/plain' and b'slow (test_profiling.py' in resp.data
+        assert profiled_client.get('/admin/profiles/missing').status_code == 404
+
+
+def test_fold():
+    assert StackSampler.fold(Counter({'a;b': 1, 'a;c': 3})) == 'a;c 3\na;b 1'
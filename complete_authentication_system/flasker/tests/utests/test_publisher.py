@@ -0,0 +1,78 @@
+import threading
+
+from webapp.metrics import metrics
+from webapp.publisher import TaskPublisher, task_publisher
+
+
+class FakeTask:
+    """Task double recording the way it was published."""
+
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = []
+        self.published = threading.Event()
+
+    def delay(self, *args, **kwargs):
+        self.calls.append(('delay', args))
+
+    def apply_async(self, args, kwargs, producer=None, headers=None):
+        self.calls.append(('apply_async', args))
+        self.published.set()
+
+
+class TestTaskPublisher:
+    """The class tests publisher of celery tasks."""
+
+    def test_direct_mode(self, client):
+        task = FakeTask()
+        publisher = TaskPublisher(client.application)
+
+        publisher.publish(task, 1)
+
+        assert task.calls == [('delay', (1,))]
+
+    def test_buffered_mode_publishes_in_background(self, client):
+        client.application.config['TASK_PUBLISHER'] = 'buffered'
+        task = FakeTask()
+        publisher = TaskPublisher(client.application)
+
+        publisher.publish(task, 1)
+        assert task.published.wait(5)
+        publisher.shutdown()
+
+        assert task.calls == [('apply_async', (1,))]
+
+    def test_overflow_is_published_directly(self, client):
+        client.application.config.update(TASK_PUBLISHER='buffered', TASK_PUBLISHER_QUEUE_SIZE=1)
+        task = FakeTask()
+        publisher = TaskPublisher(client.application)
+        publisher._ensure_worker = lambda: None  # keep messages in queue
+
+        publisher.publish(task, 1)
+        publisher.publish(task, 2)
+
+        assert task.calls == [('delay', (2,))]
+
+    def test_overflow_is_dropped(self, client):
+        client.application.config.update(TASK_PUBLISHER='buffered', TASK_PUBLISHER_QUEUE_SIZE=1,
+                                         TASK_PUBLISHER_OVERFLOW='drop')
+        task = FakeTask()
+        publisher = TaskPublisher(client.application)
+        publisher._ensure_worker = lambda: None  # keep messages in queue
+
+        publisher.publish(task, 1)
+        publisher.publish(task, 2)
+
+        assert task.calls == []
+
+    def test_queue_size_gauge_reads_publisher_of_app(self, client):
+        client.application.config.update(TASK_PUBLISHER='buffered')
+        publisher = TaskPublisher(client.application)
+        publisher._ensure_worker = lambda: None  # keep messages in queue
+        publisher.publish(FakeTask(), 1)
+        assert 'task_publisher_queue_size 1\n' in metrics.render()
+
+        task_publisher.init_app(client.application)  # gauge follows the publisher of the app
+
+        assert 'task_publisher_queue_size 0\n' in metrics.render()
@@ -0,0 +1,117 @@
+import pytest
+from flask import session, flash, get_flashed_messages
+
+from webapp.redis_session import RedisSessionInterface
+
+
+class FakeRedis:
+    """Redis double keeping data in dictionary and recording executed commands."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append('get')
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.commands.append('set')
+        self.data[key] = value
+
+    def delete(self, key):
+        self.commands.append('delete')
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def redis_client(client):
+    app = client.application
+    fake_redis = FakeRedis()
+    app.session_interface = RedisSessionInterface(fake_redis, refresh_interval=60)
+
+    @app.route('/session/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/session/get')
+    def get_value():
+        return session.get('value', '')
+
+    @app.route('/session/flash')
+    def add_flash():
+        flash('Hello', 'info')
+        return ''
+
+    @app.route('/session/messages')
+    def messages():
+        return ','.join(get_flashed_messages())
+
+    @app.route('/session/clear')
+    def clear():
+        session.clear()
+        return ''
+
+    return fake_redis
+
+
+class TestRedisSessionInterface:
+    """The class tests session interface skipping writes of unchanged sessions."""
+
+    def test_unchanged_session_is_not_written(self, client, redis_client):
+        client.get('/session/set/foo')
+        assert redis_client.commands == ['set']
+
+        resp = client.get('/session/get')
+        assert resp.data == b'foo'
+        client.get('/session/set/foo')
+
+        assert redis_client.commands == ['set', 'get', 'get']
+
+    def test_changed_session_is_written(self, client, redis_client):
+        client.get('/session/set/foo')
+        client.get('/session/set/bar')
+
+        assert redis_client.commands == ['set', 'get', 'set']
+        assert client.get('/session/get').data == b'bar'
+
+    def test_anonymous_request_does_not_touch_redis(self, client, redis_client):
+        client.get('/session/get')
+
+        assert redis_client.commands == []
+
+    def test_expiration_refresh_is_throttled(self, client, redis_client, monkeypatch):
+        client.get('/session/set/foo')
+        monkeypatch.setattr('webapp.redis_session.time.time', lambda: 2 ** 40)
+        client.get('/session/get')
+        client.get('/session/get')
+
+        assert redis_client.commands == ['set', 'get', 'set', 'get']
+
+    def test_flash_messages(self, client, redis_client):
+        client.get('/session/flash')
+
+        assert client.get('/session/messages').data == b'Hello'
+        assert client.get('/session/messages').data == b''
+
+    def test_cleared_session_is_deleted(self, client, redis_client):
+        client.get('/session/set/foo')
+        client.get('/session/clear')
+
+        assert redis_client.commands == ['set', 'get', 'delete']
+        assert redis_client.data == {}
+
+    def test_unsigned_session_id(self, client, redis_client):
+        client.application.session_interface.use_signer = False
+        client.get('/session/set/foo')
+
+        cookie = client.get_cookie('session')
+        assert 'session:' + cookie.value in redis_client.data
+        assert client.get('/session/get').data == b'foo'
+
+    def test_permanent_session_cookie(self, client, redis_client):
+        client.application.session_interface.permanent = True
+        client.get('/session/set/foo')
+
+        assert client.get_cookie('session').expires is not None
@@ -0,0 +1,89 @@
+import json
+import pytest
+from celery.signals import before_task_publish
+from sqlalchemy.exc import OperationalError
+
+from webapp import auth_models, db
+from webapp.celery import celery_app
+from webapp.tracing import tracer, parse_traceparent
+
+
+@celery_app.task(name='tests.traced_task', ignore_result=True)
+def traced_task():
+    return auth_models.User.find_by_id(1)
+
+
+@pytest.fixture
+def spans(client, tmp_path):
+    app = client.application
+    path = tmp_path / 'traces.jsonl'
+    app.config.update(TRACING_ENABLED=True, TRACING_FILE=str(path))
+    tracer.init_app(app)
+
+    @app.route('/tracing/task')
+    def start_task():
+        traced_task.delay()
+        return ''
+
+    def read():
+        return [json.loads(line) for line in path.read_text().splitlines()]
+    yield read
+    app.config['TRACING_ENABLED'] = False
+    tracer.init_app(app)
+
+
+class TestTracer:
+    """The class tests tracing of requests and celery tasks."""
+
+    def test_request_spans(self, client, spans):
+        client.get('/login')
+
+        request_span = next(span for span in spans() if span['name'] == 'GET /login')
+        render_span = next(span for span in spans() if span['name'] == 'render login.html')
+        assert request_span['parent_id'] is None
+        assert request_span['attributes'] == {'endpoint': 'auth.login', 'status': 200}
+        assert render_span['trace_id'] == request_span['trace_id']
+        assert render_span['parent_id'] == request_span['span_id']
+
+    def test_task_span_is_part_of_request_trace(self, client, spans):
+        client.get('/tracing/task')
+
+        by_name = {span['name']: span for span in spans()}
+        request_span = by_name['GET /tracing/task']
+        task_span = by_name['celery execute tests.traced_task']
+        query_span = by_name['SQL SELECT']
+        assert task_span['parent_id'] == request_span['span_id']
+        assert query_span['parent_id'] == task_span['span_id']
+        assert 'FROM users' in query_span['attributes']['statement']
+
+    def test_failed_query_span_is_finished(self, client, spans):
+        with tracer.span('parent') as parent:
+            with pytest.raises(OperationalError), db.session.begin_nested():
+                db.session.execute(db.text('SELECT * FROM missing_table'))
+            assert tracer.current_span() is parent
+
+        query_span = next(span for span in spans() if span['name'] == 'SQL SELECT')
+        assert query_span['parent_id'] == parent.span_id
+        assert 'no such table' in query_span['attributes']['error']
+
+    def test_incoming_traceparent_is_continued(self, client, spans):
+        traceparent = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+        client.get('/login', headers={'traceparent': traceparent})
+
+        request_span = next(span for span in spans() if span['name'] == 'GET /login')
+        assert (request_span['trace_id'], request_span['parent_id']) == ('a' * 32, 'b' * 16)
+
+    def test_publish_passes_trace_context_in_headers(self, client, spans):
+        headers = {}
+        with tracer.span('parent') as parent:
+            before_task_publish.send(sender='tests.traced_task', headers=headers, routing_key='mail')
+            publish_span = tracer.current_span()
+            tracer.finish_span(publish_span)
+
+        assert parse_traceparent(headers['traceparent']) == (parent.trace_id, publish_span.span_id)
+        assert publish_span.parent_id == parent.span_id
+
+    def test_disabled_tracer_records_nothing(self, client):
+        assert not tracer.enabled
+        with tracer.span('anything') as span:
+            assert span is None
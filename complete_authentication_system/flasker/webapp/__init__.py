@@ -1,12 +1,19 @@
 """Package with flasker app."""
 
 from .app import create_app, db, auth_models
-from .celery import celery_app
 
 
 __all__ = [
     'create_app',
-    'celery_app',
+    'celery_app',  # pylint: disable=undefined-all-variable  # provided lazily by __getattr__ below
     'db',
     'auth_models',
 ]
+
+
+def __getattr__(name: str):
+    # Celery instance creates its own app on import, so it is imported only when used (not by manage.py).
+    if name == 'celery_app':
+        from .celery import celery_app  # pylint: disable=import-outside-toplevel
+        return celery_app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
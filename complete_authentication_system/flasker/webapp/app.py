@@ -11,6 +11,17 @@ from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_session import Session
 
+from .metrics import metrics, register_metrics_endpoint
+from .database import configure_engine, register_engine_events
+from .publisher import task_publisher
+from .backpressure import mail_backpressure
+from .compression import compress
+from .flashing import cookie_flash
+from .profiling import request_profiler
+from .tracing import tracer
+from .connections import redis_connections
+from .deadline import request_deadline
+
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -76,6 +87,43 @@ def register_logger(app, project_root_dir) -> None:
     app.logger.info('Flasker started')
 
 
+def register_session(app: Flask) -> None:
+    """
+    Setups server-side session. Redis sessions use interface which skips writes of unchanged sessions,
+    other types are handled by Flask-Session.
+
+    :param app: instance of Flask app
+    :return: None
+    """
+    if app.config.get('SESSION_TYPE') == 'redis':
+        # pylint: disable=import-outside-toplevel
+        from .redis_session import RedisSessionInterface
+        # pylint: enable=import-outside-toplevel
+        app.session_interface = RedisSessionInterface(
+            redis_connections.client('session'),
+            key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+            refresh_interval=app.config.get('SESSION_REFRESH_INTERVAL', 60 * 60),
+            use_signer=app.config.get('SESSION_USE_SIGNER', False),
+            permanent=app.config.get('SESSION_PERMANENT', True),
+        )
+    else:
+        session.init_app(app)
+
+
+def reset_connections(app: Flask) -> None:
+    """
+    Drops connection pools inherited from the parent process. It has to be called in a process forked
+    after the app was created (e.g. gunicorn worker with preloaded app).
+
+    :param app: instance of Flask app
+    :return: None
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)  # connections belong to the parent, do not close them
+    redis_connections.reset()
+
+
 def create_app() -> Flask:
     """
     Creates flasker app.
@@ -93,17 +141,30 @@ def create_app() -> Flask:
     app.config.from_pyfile(str(settings_path))
 
     register_logger(app, project_root_dir_path)
+    tracer.init_app(app)  # first, so Redis clients are instrumented and request span covers other hooks
+    request_deadline.init_app(app)
+    redis_connections.init_app(app)
+    metrics.init_app(app, redis_connections.client('metrics'))  # counters of all processes are shared in Redis
 
+    configure_engine(app)
     db.init_app(app)
+    register_engine_events(app, db)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
-    session.init_app(app)
+    register_session(app)
+    task_publisher.init_app(app)
+    mail_backpressure.init_app(app)
+    compress.init_app(app)
+    cookie_flash.init_app(app)
+    request_profiler.init_app(app)
 
     register_blueprints(app)
+    register_metrics_endpoint(app)
 
     return app
 
 
 # pylint: disable=wrong-import-position,unused-import
 from .auth import models as auth_models
+from . import outbox
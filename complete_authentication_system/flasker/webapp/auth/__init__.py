@@ -1,7 +1,7 @@
 """Auth blueprint."""
 
 from .views import auth_blueprint
-from . import models
+from . import models, stats, export
 
 from .utils import load_user
 
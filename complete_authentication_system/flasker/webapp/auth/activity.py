@@ -0,0 +1,184 @@
+"""Contains tracker of users last login and last seen timestamps."""
+
+import time
+import datetime
+import threading
+from typing import Dict
+from flask import Flask, Response, g, current_app
+from sqlalchemy import bindparam
+
+from ..app import db
+from ..metrics import metrics
+from ..connections import redis_connections
+from .models import User
+
+
+class LocalActivityStore:
+    """Keeps pending timestamps in memory of the worker."""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[int, int]] = {'last_login': {}, 'last_seen': {}}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, user_id: int, timestamp: int) -> None:
+        """Stores timestamp of given kind for user."""
+        with self._lock:
+            self._data[kind][user_id] = timestamp
+
+    def pop_all(self, kind: str) -> Dict[int, int]:
+        """Returns and removes all pending timestamps of given kind."""
+        with self._lock:
+            data, self._data[kind] = self._data[kind], {}
+        return data
+
+    def restore(self, kind: str, data: Dict[int, int]) -> None:
+        """Puts back timestamps which could not be written, newer timestamps are kept."""
+        with self._lock:
+            for user_id, timestamp in data.items():
+                self._data[kind][user_id] = max(timestamp, self._data[kind].get(user_id, timestamp))
+
+
+class RedisActivityStore:
+    """Keeps pending timestamps in Redis hashes shared by all workers."""
+
+    def __init__(self, client, key_prefix: str = 'activity:'):
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def add(self, kind: str, user_id: int, timestamp: int) -> None:
+        """Stores timestamp of given kind for user."""
+        self.client.hset(self.key_prefix + kind, user_id, timestamp)
+
+    def pop_all(self, kind: str) -> Dict[int, int]:
+        """Returns and removes all pending timestamps of given kind."""
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.hgetall(self.key_prefix + kind)
+        pipeline.delete(self.key_prefix + kind)
+        data, _ = pipeline.execute()
+        return {int(user_id): int(timestamp) for user_id, timestamp in data.items()}
+
+    def restore(self, kind: str, data: Dict[int, int]) -> None:
+        """Puts back timestamps which could not be written, newer timestamps are kept."""
+        pipeline = self.client.pipeline(transaction=False)
+        for user_id, timestamp in data.items():
+            pipeline.hsetnx(self.key_prefix + kind, user_id, timestamp)
+        pipeline.execute()
+
+
+class ActivityTracker:
+    """
+    Coalesces last login and last seen timestamps of users and writes them to users table in batches.
+    A user is marked as seen at most once per `LAST_SEEN_INTERVAL` seconds by a worker. Pending timestamps
+    are kept in Redis and flushed by periodic task or, without Redis, kept by the worker and flushed
+    after request when `ACTIVITY_FLUSH_INTERVAL` elapsed.
+    """
+
+    COLUMNS = {'last_login': 'last_login_at', 'last_seen': 'last_seen_at'}
+
+    def __init__(self):
+        self.store = LocalActivityStore()
+        self.seen_interval = 60
+        self.flush_interval = 60
+        self.flush_after_request = True
+        self._recently_seen: Dict[int, int] = {}
+        self._last_flush = time.monotonic()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures tracker for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        redis_client = redis_connections.client('activity')
+        self.store = RedisActivityStore(redis_client) if redis_client is not None else LocalActivityStore()
+        self.flush_after_request = redis_client is None
+        self.seen_interval = app.config.get('LAST_SEEN_INTERVAL', 60)
+        self.flush_interval = app.config.get('ACTIVITY_FLUSH_INTERVAL', 60)
+        self._recently_seen = {}
+        app.extensions['activity_tracker'] = self
+        app.after_request(self._after_request)
+
+    def logged_in(self, user: User) -> None:
+        """
+        Records login of user.
+
+        :param user: logged user
+        :return: None
+        """
+        now = int(time.time())
+        self.store.add('last_login', user.id, now)
+        self._mark_seen(user.id, now)
+
+    def seen(self, user: User) -> None:
+        """
+        Records activity of user (deduplicated per interval).
+
+        :param user: active user
+        :return: None
+        """
+        now = int(time.time())
+        last_seen = self._recently_seen.get(user.id)
+        if last_seen is not None and now - last_seen < self.seen_interval:
+            return
+        self._mark_seen(user.id, now)
+
+    def _mark_seen(self, user_id: int, now: int) -> None:
+        if len(self._recently_seen) > 100_000:
+            self._recently_seen.clear()
+        self._recently_seen[user_id] = now
+        self.store.add('last_seen', user_id, now)
+
+    def flush(self) -> int:
+        """
+        Writes pending timestamps to users table with batched UPDATEs. If the transaction fails, timestamps
+        are put back to the store and written by the next flush.
+
+        :return: number of updated rows
+        """
+        updated = 0
+        table = User.__table__
+        popped: Dict[str, Dict[int, int]] = {}
+        try:
+            with db.engine.begin() as connection:
+                for kind, column in self.COLUMNS.items():
+                    pending = popped[kind] = self.store.pop_all(kind)
+                    if not pending:
+                        continue
+                    statement = table.update().where(table.c.id == bindparam('user_id')).values(
+                        {column: bindparam('timestamp')}
+                    )
+                    connection.execute(statement, [
+                        {'user_id': user_id, 'timestamp': _utc_datetime(timestamp)}
+                        for user_id, timestamp in pending.items()
+                    ])
+                    updated += len(pending)
+        except Exception:
+            for kind, pending in popped.items():
+                if pending:
+                    self.store.restore(kind, pending)
+            raise
+        metrics.inc('user_activity_flushed_total', updated)
+        return updated
+
+    def _after_request(self, response: Response) -> Response:
+        user = g.get('_login_user')  # only users already loaded by the view, no additional query
+        if user is not None and user.is_authenticated:
+            self.seen(user)
+        if self.flush_after_request and time.monotonic() - self._last_flush >= self.flush_interval:
+            self._last_flush = time.monotonic()
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # Timestamps were put back to the store, the response of this user is not affected.
+                metrics.inc('user_activity_flush_errors_total')
+                current_app.logger.exception('User activity could not be flushed.')
+        return response
+
+
+def _utc_datetime(timestamp: int) -> datetime.datetime:
+    # Columns keep naive UTC datetimes.
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+
+
+activity_tracker = ActivityTracker()
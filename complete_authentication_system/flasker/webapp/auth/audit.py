@@ -0,0 +1,113 @@
+"""Contains buffer of auth audit events stored in batches."""
+
+import atexit
+import datetime
+import threading
+from typing import List
+from flask import Flask, request, has_request_context
+
+from ..app import db
+from ..metrics import metrics
+from ..utils import ProcessThread
+from .models import AuthEvent
+
+
+class AuditEventBuffer:
+    """
+    Collects auth events in memory of the worker and stores them in batches. The buffer is flushed by
+    background thread when it reaches `AUDIT_BUFFER_SIZE` events or every `AUDIT_FLUSH_INTERVAL` seconds,
+    so recording an event costs no database round trip in the request. Events are inserted with one bulk
+    INSERT or, if `AUDIT_FLUSH_MODE` is "celery", passed to a task.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.buffered = True
+        self.max_size = 100
+        self.flush_interval = 5.0
+        self.mode = 'db'
+        self._events: List[dict] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = ProcessThread(self._run, 'audit-events-flusher')
+        self._exit_handler_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures buffer for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        self.app = app
+        self.buffered = app.config.get('AUDIT_EVENTS_BUFFERED', True)
+        self.max_size = app.config.get('AUDIT_BUFFER_SIZE', 100)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 5.0)
+        self.mode = app.config.get('AUDIT_FLUSH_MODE', 'db')
+        app.extensions['audit_events'] = self
+        if not self._exit_handler_registered:
+            atexit.register(self.flush)
+            self._exit_handler_registered = True
+
+    def record(self, event: str, user=None, details: str = None) -> None:
+        """
+        Adds event to the buffer.
+
+        :param event: event name, e.g. "login_success"
+        :param user: user which the event concerns
+        :param details: additional information
+        :return: None
+        """
+        entry = {
+            'user_id': getattr(user, 'id', None),
+            'event': event,
+            'created': datetime.datetime.utcnow(),
+            'ip_address': request.remote_addr if has_request_context() else None,
+            'user_agent': request.user_agent.string[:255] if has_request_context() else None,
+            'details': details[:255] if details else None,
+        }
+        metrics.inc('auth_events_total', event=event)
+        if not self.buffered:
+            self._store([entry])
+            return
+        self._ensure_flusher()
+        with self._lock:
+            self._events.append(entry)
+            size = len(self._events)
+        if size >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Stores all buffered events."""
+        with self._lock:
+            events, self._events = self._events, []
+        if events:
+            self._store(events)
+
+    def _store(self, events: List[dict]) -> None:
+        try:
+            if self.mode == 'celery':
+                from .tasks import store_auth_events  # pylint: disable=import-outside-toplevel
+                store_auth_events.delay([dict(event, created=event['created'].isoformat()) for event in events])
+            else:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(AuthEvent.__table__.insert(), events)
+            metrics.inc('auth_events_flushed_total', len(events))
+        except Exception:  # pylint: disable=broad-except
+            metrics.inc('auth_events_dropped_total', len(events))
+            self.app.logger.exception('%s auth events could not be stored.', len(events))
+
+    def _ensure_flusher(self) -> None:
+        self._flusher.ensure_started()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+audit_events = AuditEventBuffer()
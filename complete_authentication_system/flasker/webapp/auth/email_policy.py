@@ -0,0 +1,192 @@
+"""Contains policy of email domains accepted by auth forms."""
+
+import os
+import time
+import threading
+from functools import partial
+from typing import Callable, Iterable, Optional
+import redis
+from flask import current_app
+from werkzeug.utils import import_string
+
+from ..connections import redis_connections
+
+
+def dns_mx_resolver(domain: str, timeout: float = 2.0) -> Optional[bool]:
+    """
+    Checks if domain can receive emails (has MX record or, as fallback, A/AAAA record).
+
+    :param domain: email domain
+    :param timeout: DNS lifetime in seconds
+    :return: True/False if domain is deliverable or not, None if DNS did not answer in time
+    """
+    # pylint: disable=import-outside-toplevel
+    import dns.resolver
+    import dns.exception
+    # pylint: enable=import-outside-toplevel
+    for record_type in ('MX', 'A', 'AAAA'):
+        try:
+            dns.resolver.resolve(domain, record_type, lifetime=timeout)
+            return True
+        except dns.resolver.NXDOMAIN:
+            return False
+        except (dns.resolver.NoAnswer, dns.resolver.NoNameservers):
+            continue
+        except dns.exception.Timeout:
+            return None
+    return False
+
+
+class LocalTTLCache:
+    """Simple in-process cache with expiring keys."""
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bool]:
+        """Returns cached value or None if key is missing or expired."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: bool, ttl: int) -> None:
+        """Stores value for ttl seconds."""
+        with self._lock:
+            if len(self._data) >= self.max_size:
+                self._data.clear()
+            self._data[key] = (value, time.monotonic() + ttl)
+
+
+class RedisTTLCache:
+    """
+    Cache with expiring keys stored in Redis, so results are shared by all workers. When Redis fails,
+    lookups are not cached instead of failing the form validation.
+    """
+
+    def __init__(self, client, prefix: str = 'email-domain:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bool]:
+        """Returns cached value or None if key is missing, expired or Redis is not available."""
+        try:
+            value = self.client.get(self.prefix + key)
+        except redis.RedisError:
+            current_app.logger.warning('Email domain %s could not be read from cache.', key, exc_info=True)
+            return None
+        if value is None:
+            return None
+        return value == b'1'
+
+    def set(self, key: str, value: bool, ttl: int) -> None:
+        """Stores value for ttl seconds, skipped if Redis is not available."""
+        try:
+            self.client.set(self.prefix + key, b'1' if value else b'0', ex=ttl)
+        except redis.RedisError:
+            current_app.logger.warning('Email domain %s could not be stored in cache.', key, exc_info=True)
+
+
+class EmailDomainPolicy:
+    """
+    Decides if email domain is accepted. Blocked (e.g. disposable) domains are kept in frozen set and matched
+    together with their subdomains. Results of deliverability checks are cached, so DNS is asked at most
+    once per TTL for given domain.
+    """
+
+    def __init__(self, blocked_domains: Iterable[str] = (), resolver: Callable[[str], Optional[bool]] = None,
+                 cache=None, ttl: int = 24 * 60 * 60, negative_ttl: int = 60 * 60):
+        self.blocked_domains = frozenset(self.normalize(domain) for domain in blocked_domains if domain.strip())
+        self.resolver = resolver
+        self.cache = cache if cache is not None else LocalTTLCache()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def normalize(domain: str) -> str:
+        """Returns domain in form used in lookups."""
+        return domain.strip().lower().rstrip('.')
+
+    def is_blocked(self, domain: str) -> bool:
+        """
+        Checks if domain or any of its parent domains is blocked.
+
+        :param domain: email domain
+        :return: True if domain is blocked, otherwise False
+        """
+        labels = self.normalize(domain).split('.')
+        return any('.'.join(labels[i:]) in self.blocked_domains for i in range(len(labels)))
+
+    def is_deliverable(self, domain: str) -> bool:
+        """
+        Checks if domain can receive emails. Domains are treated as deliverable when resolver is not set
+        or did not answer.
+
+        :param domain: email domain
+        :return: True if domain is deliverable, otherwise False
+        """
+        if self.resolver is None:
+            return True
+        domain = self.normalize(domain)
+        deliverable = self.cache.get(domain)
+        if deliverable is None:
+            deliverable = self.resolver(domain)
+            if deliverable is None:
+                return True
+            self.cache.set(domain, deliverable, self.ttl if deliverable else self.negative_ttl)
+        return deliverable
+
+
+def load_blocked_domains(path: Optional[str]) -> Iterable[str]:
+    """
+    Reads blocked domains from file (one domain per line, lines starting with # are skipped).
+
+    :param path: path to file or None
+    :return: blocked domains
+    """
+    if not path:
+        return []
+    with open(path, encoding='utf-8') as file:
+        return [line for line in file if line.strip() and not line.startswith('#')]
+
+
+def get_email_policy() -> EmailDomainPolicy:
+    """
+    Returns email domain policy of current app. The policy is built once per worker and rebuilt when its
+    configuration or the file of blocked domains changes.
+
+    :return: email domain policy
+    """
+    config = current_app.config
+    blocked_domains_path = config.get('EMAIL_BLOCKED_DOMAINS_PATH')
+    version = (
+        config.get('EMAIL_CHECK_DELIVERABILITY'),
+        config.get('EMAIL_DOMAIN_RESOLVER'),
+        config.get('EMAIL_DNS_TIMEOUT', 2.0),
+        config.get('EMAIL_DELIVERABILITY_CACHE_TTL', 24 * 60 * 60),
+        config.get('EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TTL', 60 * 60),
+        blocked_domains_path,
+        os.stat(blocked_domains_path).st_mtime_ns if blocked_domains_path else None,
+    )
+    cached = current_app.extensions.get('email_domain_policy')
+    if cached is None or cached[0] != version:
+        resolver = None
+        if config.get('EMAIL_CHECK_DELIVERABILITY'):
+            resolver = partial(import_string(config['EMAIL_DOMAIN_RESOLVER']),
+                               timeout=config.get('EMAIL_DNS_TIMEOUT', 2.0))
+        redis_client = redis_connections.client('cache')
+        policy = EmailDomainPolicy(
+            blocked_domains=load_blocked_domains(blocked_domains_path),
+            resolver=resolver,
+            cache=RedisTTLCache(redis_client) if redis_client is not None else LocalTTLCache(),
+            ttl=config.get('EMAIL_DELIVERABILITY_CACHE_TTL', 24 * 60 * 60),
+            negative_ttl=config.get('EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TTL', 60 * 60),
+        )
+        cached = current_app.extensions['email_domain_policy'] = (version, policy)
+    return cached[1]
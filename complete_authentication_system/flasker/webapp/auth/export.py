@@ -0,0 +1,169 @@
+"""Contains export of personal data of users."""
+
+import os
+import json
+import zipfile
+import datetime
+from typing import Iterator
+from flask import current_app
+from sqlalchemy import select
+
+from ..app import db
+from .models import BaseMixin, User, AuthEvent
+
+
+class DataExport(BaseMixin, db.Model):
+    """Archive with personal data of a user, built by celery task and downloaded from account page."""
+
+    __tablename__ = 'data_exports'
+
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=PENDING)
+    created = db.Column(db.DateTime(), nullable=False, default=datetime.datetime.utcnow)
+    finished = db.Column(db.DateTime())
+
+    @property
+    def filename(self) -> str:
+        """
+        Returns name of the archive file.
+
+        :return: file name
+        """
+        return f'user-{self.user_id}-export-{self.id}.zip'
+
+    @property
+    def path(self) -> str:
+        """
+        Returns path of the archive file in `DATA_EXPORT_DIR`.
+
+        :return: file path
+        """
+        return os.path.join(current_app.config['DATA_EXPORT_DIR'], self.filename)
+
+    @classmethod
+    def latest(cls, user_id: int) -> 'DataExport':
+        """
+        Returns the latest export of the given user.
+
+        :param user_id: user id
+        :return: export or None
+        """
+        return db.session.execute(
+            select(cls).where(cls.user_id == user_id).order_by(cls.id.desc()).limit(1)
+        ).scalars().first()
+
+    @classmethod
+    def delete_by_user_id(cls, user_id: int, before_id: int = None) -> int:
+        """
+        Deletes exports of the given user together with archive files.
+
+        :param user_id: user id
+        :param before_id: id of export, only older exports are deleted if given
+        :return: number of deleted exports
+        """
+        statement = select(cls).where(cls.user_id == user_id)
+        if before_id is not None:
+            statement = statement.where(cls.id < before_id)
+        exports = db.session.execute(statement).scalars().all()
+        for export in exports:
+            if os.path.exists(export.path):
+                os.remove(export.path)
+            db.session.delete(export)
+        db.session.commit()
+        return len(exports)
+
+    def is_recent(self, interval: float) -> bool:
+        """
+        Checks if the export was created less than `interval` seconds ago.
+
+        :param interval: time in seconds
+        :return: True if the export is recent
+        """
+        return datetime.datetime.utcnow() - self.created < datetime.timedelta(seconds=interval)
+
+    def expire(self, timeout: float) -> bool:
+        """
+        Marks pending export as failed if it was not built within `timeout` seconds (e.g. its task was lost),
+        so the user can start a new one. The task of expired export does nothing if it runs later.
+
+        :param timeout: time in seconds
+        :return: True if the export expired
+        """
+        if self.status != self.PENDING or self.is_recent(timeout):
+            return False
+        self.status = self.FAILED
+        self.finished = datetime.datetime.utcnow()
+        db.session.commit()
+        return True
+
+    def build(self, batch_size: int = 1000) -> None:
+        """
+        Writes archive with profile, session metadata and audit history of the user. Rows are streamed from
+        the database in batches of `batch_size` and every record is written to the archive as soon as it is
+        read, so memory use does not depend on the size of the history. The archive is written to temporary
+        file and renamed when complete, so a partial archive is never served.
+
+        :param batch_size: number of audit events fetched from the database at once
+        :return: None
+        """
+        user = User.find_by_id(self.user_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        partial_path = self.path + '.part'
+        with zipfile.ZipFile(partial_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            _write_lines(archive, 'profile.json', [_profile(user)])
+            _write_lines(archive, 'sessions.json', [_session_metadata(user)])
+            _write_lines(archive, 'auth_events.jsonl', _auth_events(self.user_id, batch_size))
+        os.replace(partial_path, self.path)
+
+    def __repr__(self) -> str:
+        """
+        Returns export representation.
+
+        :return: export string representation
+        """
+        return f"DataExport(user_id={self.user_id}, id={self.id}, '{self.status}')"
+
+
+def _isoformat(value: datetime.datetime) -> str:
+    return value.isoformat() if value is not None else None
+
+
+def _profile(user: User) -> dict:
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'created': _isoformat(user.created),
+        'active': user.active,
+        'role': user.role.name if user.role is not None else None,
+    }
+
+
+def _session_metadata(user: User) -> dict:
+    return {
+        'last_login_at': _isoformat(user.last_login_at),
+        'last_seen_at': _isoformat(user.last_seen_at),
+        'session_generation': user.session_generation,
+    }
+
+
+def _auth_events(user_id: int, batch_size: int) -> Iterator[dict]:
+    table = AuthEvent.__table__
+    # Core rows are not kept in the session, with yield_per only one batch is in memory at once.
+    rows = db.session.execute(
+        select(table.c.event, table.c.created, table.c.ip_address, table.c.user_agent, table.c.details)
+        .where(table.c.user_id == user_id).order_by(table.c.created),
+        execution_options={'yield_per': batch_size},
+    )
+    for row in rows:
+        yield dict(row._mapping, created=_isoformat(row.created))  # pylint: disable=protected-access
+
+
+def _write_lines(archive: zipfile.ZipFile, name: str, records) -> None:
+    with archive.open(name, 'w') as file:
+        for record in records:
+            file.write(json.dumps(record).encode('utf-8') + b'\n')
@@ -4,7 +4,8 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired, Length, Email, EqualTo
 
-from .validators import PasswordType, UniqueEmail, UniqueUsername, DeleteSlug, PasswordOfCurrentUser
+from .validators import (PasswordType, NotBreachedPassword, AllowedEmailDomain, UniqueEmail, UniqueUsername,
+                         DeleteSlug, PasswordOfCurrentUser)
 
 
 class RegistrationForm(FlaskForm):
@@ -25,6 +26,10 @@ class RegistrationForm(FlaskForm):
             DataRequired('This field is required.'),
             Length(min=5, max=100),
             Email(),
+            AllowedEmailDomain(
+                'Emails from this domain are not accepted, please use another address.',
+                'This email domain cannot receive emails.'
+            ),
             UniqueEmail('This email is already taken, please select another one.'),
         ]
     )
@@ -39,6 +44,7 @@ class RegistrationForm(FlaskForm):
                 'Make sure your password has a letter in it.',
                 'Make sure your password has a capital letter in it.'
             ),
+            NotBreachedPassword('This password has appeared in a data breach, please choose another one.'),
         ]
     )
 
@@ -89,7 +95,7 @@ class ResetPasswordEmailForm(FlaskForm):
         'Email',
         validators=[
             DataRequired('This field is required.'),
-            Email(),
+            Email(),  # no domain policy, users registered before their domain was blocked can reset password
         ]
     )
 
@@ -111,6 +117,7 @@ class ResetPasswordCredentialsForm(FlaskForm):
                 'Make sure your password has a letter in it.',
                 'Make sure your password has a capital letter in it.'
             ),
+            NotBreachedPassword('This password has appeared in a data breach, please choose another one.'),
         ]
     )
 
@@ -143,6 +150,10 @@ class AccountUpdateForm(FlaskForm):
         validators=[
             Length(min=5, max=100),
             Email(),
+            AllowedEmailDomain(
+                'Emails from this domain are not accepted, please use another address.',
+                'This email domain cannot receive emails.'
+            ),
             UniqueEmail('This email is already taken, please select another one.', skip_current_user=True),
         ]
     )
@@ -169,6 +180,14 @@ class DeleteAccountForm(FlaskForm):
     )
 
 
+class DataExportForm(FlaskForm):
+    """Requests export of user's personal data."""
+
+    submit = SubmitField(
+        'Download my data'
+    )
+
+
 class ChangePasswordForm(FlaskForm):
     """Get new user password to change."""
 
@@ -190,6 +209,7 @@ class ChangePasswordForm(FlaskForm):
                 'Make sure your password has a letter in it.',
                 'Make sure your password has a capital letter in it.'
             ),
+            NotBreachedPassword('This password has appeared in a data breach, please choose another one.'),
         ]
     )
 
@@ -7,9 +7,12 @@ from dataclasses import dataclass
 from jwt import encode as encode_jwt_token, decode as decode_jwt_token
 from flask import current_app
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy import select, bindparam
+from sqlalchemy.orm import validates, mapped_column
 from flask_login import UserMixin
 
 from ..app import db, bcrypt
+from ..deadline import request_deadline
 
 
 class BaseMixin:
@@ -39,10 +42,24 @@ class User(UserMixin, BaseMixin, db.Model):
 
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
+    # Lowercase copy of the email used by case-insensitive lookups (filled in for old rows by backfill_emails).
+    email_normalized = db.Column(db.String(100), unique=True, index=True)
     password = db.Column(db.String(100), nullable=False)
     created = db.Column(db.DateTime(), default=datetime.datetime.utcnow)
-    active = db.Column(db.Boolean(), default=False)
-    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
+    # Previous values are loaded before change, counters of users (see auth.stats module) need them.
+    active = mapped_column(db.Boolean(), default=False, active_history=True)
+    role_id = mapped_column(db.Integer, db.ForeignKey('roles.id'), active_history=True)
+    last_login_at = db.Column(db.DateTime())  # updated in batches, see auth.activity module
+    last_seen_at = db.Column(db.DateTime(), index=True)
+    # Part of the id stored in sessions and remember cookies, incrementing it logs user out everywhere.
+    session_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Deleted users are hidden at once and purged with their data by a background task.
+    deleted_at = mapped_column(db.DateTime(), active_history=True)
+
+    __table_args__ = (
+        db.Index('ix_users_deleted_at', 'deleted_at', postgresql_where=db.text('deleted_at IS NOT NULL'),
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -54,6 +71,28 @@ class User(UserMixin, BaseMixin, db.Model):
                 self.role = Role.query.filter_by(default=True).first()
         # pylint: enable=access-member-before-definition
 
+    @validates('email')
+    def _normalize_email(self, _, email: str) -> str:
+        self.email_normalized = self.normalize_email(email)
+        return email
+
+    def get_id(self) -> str:
+        """
+        Returns id stored in session and remember cookie, it contains session generation of the user.
+
+        :return: user id with session generation
+        """
+        return f'{self.id}:{self.session_generation or 0}'
+
+    def soft_delete(self) -> None:
+        """Marks user as deleted and invalidates all user's sessions (changes are not committed)."""
+        self.deleted_at = datetime.datetime.utcnow()
+        self.revoke_sessions()
+
+    def revoke_sessions(self) -> None:
+        """Invalidates all sessions and remember cookies of the user (changes are not committed)."""
+        self.session_generation = (self.session_generation or 0) + 1
+
     def check_password(self, password: str) -> bool:
         """
         Checks if the passed password matches the user's password.
@@ -61,6 +100,7 @@ class User(UserMixin, BaseMixin, db.Model):
         :param password: password to check
         :return: True if passwords match, otherwise False
         """
+        request_deadline.check('password check')
         return bcrypt.check_password_hash(self.password, password)
 
     def generate_jwt_token(self, expire_time: int = 600) -> str:
@@ -85,34 +125,81 @@ class User(UserMixin, BaseMixin, db.Model):
         return self.role is not None and (self.role.permissions & permissions) == permissions
 
     @classmethod
-    def find_by_id(cls, _id: int) -> 'User':
+    def find_by_id(cls, _id: int, include_deleted: bool = False) -> 'User':
         """
         Returns user based on the given user id.
 
         :param _id: user id
+        :param include_deleted: True to find also soft-deleted user
         :return: user with the given id or None
         """
-        return cls.query.filter_by(id=_id).first()
+        if _id is None:
+            return None
+        user = db.session.get(cls, _id)  # no query if the user is already in the session
+        if user is not None and user.deleted_at is not None and not include_deleted:
+            return None
+        return user
 
     @classmethod
-    def find_by_username(cls, username: str) -> 'User':
+    def find_by_username(cls, username: str, include_deleted: bool = False) -> 'User':
         """
         Returns user based on the given user username.
 
         :param username: username
+        :param include_deleted: True to find also soft-deleted user
         :return: user with the given username or None
         """
-        return cls.query.filter_by(username=username).first()
+        statement = _USER_BY_USERNAME if include_deleted else _NOT_DELETED_USER_BY_USERNAME
+        return db.session.execute(statement, {'username': username}).scalars().first()
 
     @classmethod
-    def find_by_email(cls, email: str) -> 'User':
+    def find_by_email(cls, email: str, include_deleted: bool = False) -> 'User':
         """
-        Returns user based on the given user email.
+        Returns user based on the given user email (case-insensitive).
 
         :param email: user's email
+        :param include_deleted: True to find also soft-deleted user
         :return: user with the given email or None
         """
-        return cls.query.filter_by(email=email).first()
+        statement = _USER_BY_EMAIL if include_deleted else _NOT_DELETED_USER_BY_EMAIL
+        return db.session.execute(statement, {'email': cls.normalize_email(email)}).scalars().first()
+
+    @staticmethod
+    def normalize_email(email: str) -> str:
+        """
+        Returns email in the form used by lookups.
+
+        :param email: email
+        :return: normalized email
+        """
+        return email.strip().lower() if email else email
+
+    @classmethod
+    def backfill_normalized_emails(cls, batch_size: int = 1000) -> int:
+        """
+        Fills in normalized email of users created before the column was added. Rows are updated in batches,
+        each one in separate transaction, so the table is never locked for long.
+
+        :param batch_size: number of users updated in one transaction
+        :return: number of updated users
+        """
+        table = cls.__table__
+        updated = 0
+        last_id = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(
+                    db.select(table.c.id).where(table.c.id > last_id, table.c.email_normalized.is_(None))
+                    .order_by(table.c.id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                connection.execute(table.update().where(table.c.id.in_(ids)).values(
+                    email_normalized=db.func.lower(db.func.trim(table.c.email))
+                ))
+            updated += len(ids)
+            last_id = ids[-1]
+        return updated
 
     @classmethod
     def generate_password_hash(cls, password: str) -> str:
@@ -134,7 +221,7 @@ class User(UserMixin, BaseMixin, db.Model):
         """
         try:
             user_id = decode_jwt_token(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])['user_id']
-            user = User.query.get(user_id)
+            user = User.find_by_id(user_id)
         except Exception:  # pylint: disable=broad-except
             user = None
         return user
@@ -148,6 +235,100 @@ class User(UserMixin, BaseMixin, db.Model):
         return f"User('{self.email}')"
 
 
+# Statements of hot lookups are built once, so calls only bind parameters and reuse the compiled form from cache.
+_USER_BY_USERNAME = select(User).where(User.username == bindparam('username')).limit(1)
+_USER_BY_EMAIL = select(User).where(User.email_normalized == bindparam('email')).limit(1)
+# Lookups go through unique indexes, deleted_at is only checked on the found row.
+_NOT_DELETED_USER_BY_USERNAME = _USER_BY_USERNAME.where(User.deleted_at.is_(None))
+_NOT_DELETED_USER_BY_EMAIL = _USER_BY_EMAIL.where(User.deleted_at.is_(None))
+
+
+class AuthEvent(BaseMixin, db.Model):
+    """Audit record of authentication related event (login, logout, password change, etc.)."""
+
+    __tablename__ = 'auth_events'
+    __table_args__ = (
+        db.Index('ix_auth_events_user_id_created', 'user_id', 'created'),
+    )
+
+    # Plain column instead of foreign key: events are written in batches and have to outlive soft-deleted accounts
+    # until they are purged.
+    user_id = db.Column(db.Integer, nullable=True)
+    event = db.Column(db.String(32), nullable=False)
+    created = db.Column(db.DateTime(), nullable=False, index=True)
+    ip_address = db.Column(db.String(45))
+    user_agent = db.Column(db.String(255))
+    details = db.Column(db.String(255))
+
+    @classmethod
+    def find_by_user_id(cls, user_id: int, limit: int = 100) -> list:
+        """
+        Returns the latest events of the given user.
+
+        :param user_id: user id
+        :param limit: max number of events
+        :return: list of events
+        """
+        return cls.query.filter_by(user_id=user_id).order_by(cls.created.desc()).limit(limit).all()
+
+    @classmethod
+    def delete_by_user_id(cls, user_id: int, batch_size: int = 1000) -> int:
+        """
+        Deletes all events of the given user in batches, each one in separate transaction, so a long history
+        never holds locks for long.
+
+        :param user_id: user id
+        :param batch_size: number of events deleted in one transaction
+        :return: number of deleted events
+        """
+        table = cls.__table__
+        deleted = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(
+                    db.select(table.c.id).where(table.c.user_id == user_id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                connection.execute(table.delete().where(table.c.id.in_(ids)))
+            deleted += len(ids)
+        return deleted
+
+    @classmethod
+    def delete_orphaned(cls, created_after: datetime.datetime, batch_size: int = 1000) -> int:
+        """
+        Deletes events of users which do not exist anymore, i.e. events stored after the user was purged.
+        Only events created after the given time are checked, so the whole table is not scanned.
+
+        :param created_after: time of the oldest checked event
+        :param batch_size: number of events deleted in one transaction
+        :return: number of deleted events
+        """
+        table, users = cls.__table__, User.__table__
+        deleted = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(
+                    db.select(table.c.id).where(
+                        table.c.created >= created_after, table.c.user_id.is_not(None),
+                        ~db.select(users.c.id).where(users.c.id == table.c.user_id).exists()
+                    ).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                connection.execute(table.delete().where(table.c.id.in_(ids)))
+            deleted += len(ids)
+        return deleted
+
+    def __repr__(self) -> str:
+        """
+        Returns event representation.
+
+        :return: event string representation
+        """
+        return f"AuthEvent('{self.event}', user_id={self.user_id})"
+
+
 @dataclass
 class Permission:
     """Users permissions."""
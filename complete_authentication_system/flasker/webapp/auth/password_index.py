@@ -0,0 +1,138 @@
+"""Contains index of breached passwords hashes."""
+
+import os
+import mmap
+import hashlib
+import threading
+from typing import Dict, Iterable, Tuple
+
+
+class PasswordHashIndex:
+    """
+    Read only, memory-mapped index of SHA-1 hashes of breached passwords.
+
+    The index file is a sorted sequence of raw 20 bytes SHA-1 digests. Lookup is a binary search over
+    the mapped file, so it costs O(log n) page reads and the pages are shared through the page cache
+    by all processes which opened the same file.
+    """
+
+    RECORD_SIZE = hashlib.sha1().digest_size
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap = None
+        self._records = 0
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size % self.RECORD_SIZE:
+                raise ValueError(f'File {path} is not a valid password index (invalid size: {size}).')
+            if size:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(self._mmap, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+                    self._mmap.madvise(mmap.MADV_RANDOM)  # binary search does not benefit from read-ahead
+                self._records = size // self.RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self._records
+
+    def __contains__(self, digest: bytes) -> bool:
+        """
+        Checks if the given SHA-1 digest is in the index.
+
+        :param digest: raw SHA-1 digest
+        :return: True if digest was found, otherwise False
+        """
+        low, high = 0, self._records
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * self.RECORD_SIZE
+            record = self._mmap[offset:offset + self.RECORD_SIZE]
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def contains_password(self, password: str) -> bool:
+        """
+        Checks if the given password is in the index.
+
+        :param password: plain text password
+        :return: True if password is breached, otherwise False
+        """
+        return hashlib.sha1(password.encode('utf-8')).digest() in self
+
+    def close(self) -> None:
+        """Unmaps index file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._records = 0
+
+    @classmethod
+    def build(cls, lines: Iterable[str], target_path: str, min_count: int = 1) -> int:
+        """
+        Converts text dump of hashes (HIBP format: "<SHA-1 hex>:<count>" per line, ordered by hash)
+        into index file. The file is replaced atomically, so running processes keep their mapping of the old one.
+
+        :raises ValueError: if dump contains invalid line or is not ordered by hash
+        :param lines: lines of text dump
+        :param target_path: path to the index file
+        :param min_count: minimum number of occurrences of password in breaches
+        :return: number of hashes written to index
+        """
+        tmp_path = f'{target_path}.tmp'
+        written = 0
+        previous = b''
+        try:
+            with open(tmp_path, 'wb') as file:
+                for line_number, line in enumerate(lines, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    hex_digest, _, count = line.partition(':')
+                    try:
+                        digest = bytes.fromhex(hex_digest)
+                        count = int(count) if count else min_count
+                    except ValueError as error:
+                        raise ValueError(f'Invalid line {line_number}: {line!r}') from error
+                    if len(digest) != cls.RECORD_SIZE:
+                        raise ValueError(f'Invalid line {line_number}: {line!r}')
+                    if digest <= previous:
+                        if digest == previous:
+                            continue
+                        raise ValueError(f'Dump is not ordered by hash (line {line_number}).')
+                    previous = digest
+                    if count < min_count:
+                        continue
+                    file.write(digest)
+                    written += 1
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
+
+
+_indexes: Dict[str, Tuple[Tuple[int, int], PasswordHashIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_password_index(path: str) -> PasswordHashIndex:
+    """
+    Returns index opened once per process. The index is reopened when the file was replaced
+    (e.g. by `build_password_index` command), so workers pick up a new index without restart.
+    The old mapping is released when lookups in progress no longer use it.
+
+    :param path: path to the index file
+    :return: password index
+    """
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != version:
+            cached = _indexes[path] = (version, PasswordHashIndex(path))
+        return cached[1]
@@ -0,0 +1,122 @@
+"""Contains counters of users maintained incrementally for admin dashboard."""
+
+from typing import Dict
+from sqlalchemy import event, func, select, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from ..app import db
+from .models import User
+
+
+class UserStats(db.Model):
+    """
+    Counter of users ("total", "active", "unconfirmed" and "role:<role id>"). Counters are updated in the same
+    transaction as users by model events, so reading them never scans users table.
+    """
+
+    __tablename__ = 'user_stats'
+
+    key = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def counts(cls) -> Dict[str, int]:
+        """
+        Returns all counters.
+
+        :return: counter value by key
+        """
+        return dict(db.session.execute(select(cls.key, cls.value)).all())
+
+    @classmethod
+    def reconcile(cls) -> Dict[str, int]:
+        """
+        Recomputes all counters from users table, e.g. after users were changed by bulk statements which do
+        not fire model events. Users and counters are read from the same snapshot and only the difference
+        is added to counters afterwards, so updates made while users are counted are neither lost nor blocked.
+
+        :return: recomputed counters
+        """
+        table = User.__table__
+        with db.engine.connect() as connection:
+            if connection.dialect.name == 'postgresql':
+                connection = connection.execution_options(isolation_level='REPEATABLE READ')
+            with connection.begin():
+                counts: Dict[str, int] = {'total': 0, 'active': 0, 'unconfirmed': 0}
+                rows = connection.execute(
+                    select(table.c.active, table.c.role_id, func.count()).where(table.c.deleted_at.is_(None))
+                    .group_by(table.c.active, table.c.role_id)
+                )
+                for active, role_id, count in rows:
+                    for key in _keys(active, role_id):
+                        counts[key] = counts.get(key, 0) + count
+                current = dict(connection.execute(select(cls.key, cls.value)).all())
+        counts = {key: counts.get(key, 0) for key in counts.keys() | current.keys()}
+        with db.engine.begin() as connection:
+            for key, value in counts.items():
+                if key not in current or value != current[key]:
+                    _increment(connection, key, value - current.get(key, 0))
+        return counts
+
+    def __repr__(self) -> str:
+        """
+        Returns counter representation.
+
+        :return: counter string representation
+        """
+        return f"UserStats('{self.key}'={self.value})"
+
+
+def _keys(active: bool, role_id: int, deleted: bool = False) -> list:
+    if deleted:  # soft-deleted users are not counted
+        return []
+    return ['total', 'active' if active else 'unconfirmed', f'role:{role_id}']
+
+
+def _apply(connection: Connection, deltas: Dict[str, int]) -> None:
+    for key, delta in deltas.items():
+        if delta:
+            _increment(connection, key, delta)
+
+
+def _increment(connection: Connection, key: str, delta: int) -> None:
+    table = UserStats.__table__
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(connection.dialect.name)
+    if dialect is not None:  # single statement, concurrent first updates of a key do not conflict
+        statement = dialect.insert(table).values(key=key, value=delta)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.key], set_={'value': table.c.value + statement.excluded.value}
+        ))
+        return
+    result = connection.execute(table.update().where(table.c.key == key).values(value=table.c.value + delta))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(key=key, value=delta))
+
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(_, connection: Connection, user: User) -> None:
+    _apply(connection, {key: 1 for key in _keys(user.active, user.role_id, user.deleted_at is not None)})
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(_, connection: Connection, user: User) -> None:
+    _apply(connection, {key: -1 for key in _keys(user.active, user.role_id, user.deleted_at is not None)})
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(_, connection: Connection, user: User) -> None:
+    state = inspect(user)
+    active, role_id = state.attrs.active.history, state.attrs.role_id.history
+    deleted_at = state.attrs.deleted_at.history
+    if not (active.has_changes() or role_id.has_changes() or deleted_at.has_changes()):
+        return
+    old_active = active.deleted[0] if active.deleted else user.active
+    old_role_id = role_id.deleted[0] if role_id.deleted else user.role_id
+    old_deleted_at = deleted_at.deleted[0] if deleted_at.deleted else user.deleted_at
+    deltas: Dict[str, int] = {}
+    for key in _keys(old_active, old_role_id, old_deleted_at is not None):
+        deltas[key] = deltas.get(key, 0) - 1
+    for key in _keys(user.active, user.role_id, user.deleted_at is not None):
+        deltas[key] = deltas.get(key, 0) + 1
+    _apply(connection, deltas)
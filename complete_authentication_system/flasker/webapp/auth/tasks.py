@@ -1,12 +1,17 @@
 """Contains functions executed by celery worker."""
 
+import datetime
 from flask import current_app, render_template
 from ..celery import celery_app
 
-from .models import User
+from ..app import db
+from .models import User, AuthEvent
+from .activity import activity_tracker
+from .stats import UserStats
+from .export import DataExport
 
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, ignore_result=True)
 def send_account_activation_email(_, user_id: int) -> None:
     """
     Sends email with private link to activate account.
@@ -15,6 +20,8 @@ def send_account_activation_email(_, user_id: int) -> None:
     :return: None
     """
     user = User.find_by_id(user_id)
+    if user is None:  # deleted before the email was sent
+        return
     token = user.generate_jwt_token(expire_time=current_app.config['ACCOUNT_ACTIVATION_LINK_EXPIRE_TIME'])
     mail_artifacts = {
         'subject': '[Flasker] Activate Your Account',
@@ -26,7 +33,7 @@ def send_account_activation_email(_, user_id: int) -> None:
     print(f'[*] Sending email: {mail_artifacts}')  # mock of sending email
 
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, ignore_result=True)
 def send_reset_password_email(_, user_email: str) -> None:
     """
     Sends email with private link to reset password.
@@ -46,3 +53,108 @@ def send_reset_password_email(_, user_email: str) -> None:
         'html_body': render_template('reset_password_email_template.html', user=user, token=token)
     }
     print(f'[*] Sending email: {mail_artifacts}')  # mock of sending email
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def store_auth_events(_, events: list) -> None:
+    """
+    Stores batch of auth audit events with one bulk insert.
+
+    :param events: list of events with "created" field in ISO format
+    :return: None
+    """
+    for event in events:
+        event['created'] = datetime.datetime.fromisoformat(event['created'])
+    db.session.execute(AuthEvent.__table__.insert(), events)
+    db.session.commit()
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def flush_user_activity(_) -> None:
+    """
+    Writes pending last login and last seen timestamps of users to database.
+
+    :return: None
+    """
+    activity_tracker.flush()
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def reconcile_user_stats(_) -> None:
+    """
+    Recomputes counters of users from users table.
+
+    :return: None
+    """
+    counts = UserStats.reconcile()
+    current_app.logger.info('User counters were reconciled: %s.', counts)
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def export_user_data(_, export_id: int) -> None:
+    """
+    Builds archive with personal data of the user. Archives of previous exports are deleted when the new one
+    is ready.
+
+    :param export_id: data export id
+    :return: None
+    """
+    export = db.session.get(DataExport, export_id)
+    if export is None or export.status != DataExport.PENDING:
+        return
+    if User.find_by_id(export.user_id) is None:  # deleted in the meantime
+        export.status = DataExport.FAILED
+    else:
+        try:
+            export.build(batch_size=current_app.config['DATA_EXPORT_BATCH_SIZE'])
+            export.status = DataExport.READY
+        except Exception:  # pylint: disable=broad-except
+            current_app.logger.exception('%s could not be built.', export)
+            export.status = DataExport.FAILED
+    export.finished = datetime.datetime.utcnow()
+    db.session.commit()
+    if export.status == DataExport.READY:
+        DataExport.delete_by_user_id(export.user_id, before_id=export.id)
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def purge_user(_, user_id: int) -> None:
+    """
+    Removes soft-deleted user with all related data. Related rows are deleted in bounded batches, each one
+    in separate transaction, and the user row goes last, so the purge can be safely retried.
+
+    :param user_id: user id
+    :return: None
+    """
+    user = User.find_by_id(user_id, include_deleted=True)
+    if user is None or user.deleted_at is None:  # already purged or restored
+        return
+    label = str(user)
+    events = AuthEvent.delete_by_user_id(user_id, batch_size=current_app.config['USER_PURGE_BATCH_SIZE'])
+    DataExport.delete_by_user_id(user_id)
+    user.delete_from_db()
+    current_app.logger.info('%s was purged with %s auth events.', label, events)
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def purge_deleted_users(_) -> None:
+    """
+    Purges users soft-deleted earlier than `USER_PURGE_DELAY` seconds ago whose purge task was lost and removes
+    auth events which were stored (buffered) after their user had been purged.
+
+    :return: None
+    """
+    now = datetime.datetime.utcnow()
+    deleted_before = now - datetime.timedelta(seconds=current_app.config['USER_PURGE_DELAY'])
+    user_ids = db.session.execute(
+        db.select(User.id).where(User.deleted_at.is_not(None), User.deleted_at < deleted_before)
+        .order_by(User.deleted_at).limit(current_app.config['USER_PURGE_BATCH_SIZE'])
+    ).scalars().all()
+    db.session.commit()  # do not keep the read transaction open during the sweep
+    for user_id in user_ids:
+        purge_user.delay(user_id)
+    # Every purge happened after the previous sweep or is started by this one, so older events were checked.
+    created_after = now - datetime.timedelta(seconds=2 * current_app.config['USER_PURGE_INTERVAL'])
+    events = AuthEvent.delete_orphaned(created_after, batch_size=current_app.config['USER_PURGE_BATCH_SIZE'])
+    if events:
+        current_app.logger.info('%s auth events of purged users were deleted.', events)
@@ -2,22 +2,46 @@
 
 from typing import Callable
 from functools import wraps
-from flask import redirect, url_for, abort
-from flask_login import current_user
+from flask import redirect, url_for, abort, request
+from flask_login import current_user, login_url
 
 from ..app import login_manager
+from ..flashing import flash
 from .models import User, Permission
 
 
 @login_manager.user_loader
-def load_user(user_id: int) -> User:
+def load_user(user_id: str) -> User:
     """
-    Assigns a user object to the global current_user variable.
+    Assigns a user object to the global current_user variable. The session generation stored together
+    with the id has to match the current generation of the user, so revoked sessions are rejected without
+    any additional query.
 
-    :param user_id: id of user to assigne
-    :return: User instance
+    :param user_id: id of user to assigne in "<id>:<session generation>" format
+    :return: User instance or None
     """
-    return User.find_by_id(user_id)
+    _id, _, generation = str(user_id).partition(':')
+    try:
+        _id, generation = int(_id), int(generation or 0)
+    except ValueError:
+        return None
+    user = User.find_by_id(_id)
+    if user is None or (user.session_generation or 0) != generation:
+        return None
+    return user
+
+
+@login_manager.unauthorized_handler
+def redirect_to_login():
+    """
+    Redirects anonymous users from views which require login to login page. Works as default handler
+    of Flask-Login, but the message is flashed with the flash backend of the app, so the redirect does not
+    write the session.
+
+    :return: redirect response
+    """
+    flash(login_manager.login_message, login_manager.login_message_category)
+    return redirect(login_url(login_manager.login_view, next_url=request.url))
 
 
 def redirect_authenticated_users(func: Callable) -> Callable:
@@ -1,11 +1,15 @@
 """Contains validators of form fields."""
 
+import os
 import re
 from wtforms.validators import ValidationError
 from wtforms import PasswordField, StringField
+from flask import current_app
 from flask_login import current_user
 
 from .models import User
+from .password_index import get_password_index
+from .email_policy import get_email_policy
 
 
 class PasswordType:  # pylint: disable=too-few-public-methods
@@ -30,6 +34,27 @@ class PasswordType:  # pylint: disable=too-few-public-methods
             raise ValidationError(self.missing_capital_letter_message)
 
 
+class NotBreachedPassword:  # pylint: disable=too-few-public-methods
+    """
+    Creates validator for password field. The validator checks if the password is not in the local index
+    of breached passwords (see BREACHED_PASSWORDS_INDEX_PATH setting). The check is skipped when index is not set.
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def __call__(self, _, field: PasswordField) -> None:
+        """Raises ValidationError if the required conditions are not met."""
+        index_path = current_app.config.get('BREACHED_PASSWORDS_INDEX_PATH')
+        if not index_path:
+            return
+        if not os.path.exists(index_path):
+            current_app.logger.warning('Index of breached passwords %s does not exist.', index_path)
+            return
+        if get_password_index(index_path).contains_password(field.data):
+            raise ValidationError(self.message)
+
+
 class UniqueEmail:  # pylint: disable=too-few-public-methods
     """
     Class creates validator for email form field. Validator checks that the email is unique.
@@ -42,14 +67,36 @@ class UniqueEmail:  # pylint: disable=too-few-public-methods
     def __call__(self, _, field: StringField) -> None:
         """Raises ValidationError if the required conditions are not met."""
         email = field.data
-        user = User.find_by_email(email)
+        user = User.find_by_email(email, include_deleted=True)  # taken until deleted user is purged
         if user:
             if not self.skip_current_user:
                 raise ValidationError(self.message)
-            if user.email != current_user.email:
+            if user.id != current_user.id:
                 raise ValidationError(self.message)
 
 
+class AllowedEmailDomain:  # pylint: disable=too-few-public-methods
+    """
+    Creates validator for email field. The validator checks if the email domain is not blocked (e.g. disposable)
+    and, if EMAIL_CHECK_DELIVERABILITY setting is enabled, if the domain can receive emails.
+    """
+
+    def __init__(self, blocked_domain_message: str, undeliverable_domain_message: str):
+        self.blocked_domain_message = blocked_domain_message
+        self.undeliverable_domain_message = undeliverable_domain_message
+
+    def __call__(self, _, field: StringField) -> None:
+        """Raises ValidationError if the required conditions are not met."""
+        _, separator, domain = (field.data or '').rpartition('@')
+        if not separator or not domain:
+            return
+        policy = get_email_policy()
+        if policy.is_blocked(domain):
+            raise ValidationError(self.blocked_domain_message)
+        if not policy.is_deliverable(domain):
+            raise ValidationError(self.undeliverable_domain_message)
+
+
 class UniqueUsername:  # pylint: disable=too-few-public-methods
     """
     Class creates validator for username form field. Validator checks that the username is unique.
@@ -62,7 +109,7 @@ class UniqueUsername:  # pylint: disable=too-few-public-methods
     def __call__(self, _, field: StringField) -> None:
         """Raises ValidationError if the required conditions are not met."""
         username = field.data
-        user = User.find_by_username(username)
+        user = User.find_by_username(username, include_deleted=True)
         if user:
             if not self.skip_current_user:
                 raise ValidationError(self.message)
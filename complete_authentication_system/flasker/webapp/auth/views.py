@@ -1,18 +1,51 @@
 """Contains views for auth blueprint."""
 
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import render_template, redirect, url_for, request, current_app, abort, send_file
 from flask.views import View
 from flask_login import login_user, logout_user, current_user, login_required
 
 from .forms import (RegistrationForm, LoginForm, ResetPasswordEmailForm, ResetPasswordCredentialsForm,
-                    AccountUpdateForm, DeleteAccountForm, ChangePasswordForm)
+                    AccountUpdateForm, DeleteAccountForm, ChangePasswordForm, DataExportForm)
 from .models import User
+from .export import DataExport
 from .utils import redirect_authenticated_users
+from .audit import audit_events
+from .activity import activity_tracker
+from .. import outbox
+from ..app import db
+from ..backpressure import mail_backpressure
+from ..flashing import flash
+from ..publisher import task_publisher
 from ..utils import Blueprint
 
 
 auth_blueprint = Blueprint('auth',  __name__, template_folder='templates',
                            static_folder='static', static_url_path='/static/auth')
+auth_blueprint.record_once(lambda state: audit_events.init_app(state.app))
+auth_blueprint.record_once(lambda state: activity_tracker.init_app(state.app))
+
+TRY_AGAIN_LATER_MESSAGE = 'We are sending too many emails right now, please try again in a few minutes.'
+
+
+def send_optional_email(task, *args) -> bool:
+    """
+    Sends email which user can request again (confirmation resend, reset password link) according to load of
+    the mail queue: publishes it, delays it in the outbox or refuses it.
+
+    :param task: celery task sending email
+    :param args: task arguments
+    :return: False if email was refused, otherwise True
+    """
+    level = mail_backpressure.level()
+    if level == mail_backpressure.NORMAL:
+        task_publisher.publish(task, *args)
+        return True
+    if level == mail_backpressure.DELAY and current_app.config.get('TASK_OUTBOX_ENABLED'):
+        outbox.enqueue(task, *args)
+        db.session.commit()
+        return True
+    current_app.logger.warning('%s was refused, mail queue is overloaded.', task.name)
+    return False
 
 
 @auth_blueprint.class_route('/register', 'register')
@@ -28,10 +61,19 @@ class Register(View):
         if form.validate_on_submit():
             hashed_password = User.generate_password_hash(form.password.data)
             user = User(username=form.username.data, email=form.email.data, password=hashed_password)
-            user.save_to_db()
-            current_app.logger.info('%s was created.', user)
             from .tasks import send_account_activation_email  # pylint: disable=import-outside-toplevel
-            send_account_activation_email.delay(user.id)
+            if current_app.config.get('TASK_OUTBOX_ENABLED'):  # delayed by the relay when mail queue is overloaded
+                db.session.add(user)
+                db.session.flush()  # assigns user id
+                outbox.enqueue(send_account_activation_email, user.id)
+                user.save_to_db()
+            elif mail_backpressure.level() == mail_backpressure.REFUSE:
+                flash(TRY_AGAIN_LATER_MESSAGE, 'warning')
+                return render_template(self.template, form=form)
+            else:
+                user.save_to_db()
+                task_publisher.publish(send_account_activation_email, user.id)
+            current_app.logger.info('%s was created.', user)
             login_user(user)
             flash('User account was created successfully.', 'success')
             return redirect(url_for('auth.unconfirmed'))
@@ -54,6 +96,8 @@ class Login(View):
                 if user.check_password(form.password.data):
                     login_user(user, remember=form.remember.data)
                     current_app.logger.info('%s was logged in.', user)
+                    audit_events.record('login_success', user)
+                    activity_tracker.logged_in(user)
                     if current_user.is_authenticated and not current_user.active:
                         return redirect(url_for('auth.unconfirmed'))
                     next_page = request.args.get('next')
@@ -61,8 +105,10 @@ class Login(View):
                         return redirect(next_page)
                     return redirect(url_for('service.home'))
                 current_app.logger.info('%s passed invalid password.', user)
+                audit_events.record('login_failure', user, details='invalid password')
             else:
                 current_app.logger.info('User with %s mail does not exist.', form.email.data)
+                audit_events.record('login_failure', details=f'unknown email: {form.email.data}')
             flash('Invalid email or password!', 'error')
         return render_template(self.template, form=form)
 
@@ -77,6 +123,7 @@ class Logout(View):
 
     def dispatch_request(self):
         user_label = str(current_user)
+        audit_events.record('logout', current_user)
         logout_user()
         current_app.logger.info('%s was logged out.', user_label)
         return render_template(self.template)
@@ -135,7 +182,9 @@ class ResendConfirmation(View):
             flash('You have already confirmed your account.', 'info')
             return redirect(url_for('service.home'))
         from .tasks import send_account_activation_email  # pylint: disable=import-outside-toplevel
-        send_account_activation_email.delay(current_user.id)
+        if not send_optional_email(send_account_activation_email, current_user.id):
+            flash(TRY_AGAIN_LATER_MESSAGE, 'warning')
+            return redirect(url_for('auth.unconfirmed'))
         current_app.logger.info('Email with confirmation link was send to %s.', current_user)
         flash('A new confirmation email has been sent to you.', 'info')
         return redirect(url_for('auth.unconfirmed'))
@@ -150,7 +199,56 @@ class Account(View):
     decorators = [login_required]
 
     def dispatch_request(self):
-        return render_template(self.template)
+        export = DataExport.latest(current_user.id)
+        if export is not None:
+            export.expire(current_app.config['DATA_EXPORT_PENDING_TIMEOUT'])
+        return render_template(self.template, form=DataExportForm(), export=export)
+
+
+@auth_blueprint.class_route('/account/export', 'account_export')
+class AccountExport(View):
+    """Starts export of user's personal data, the archive is built by celery task."""
+    init_every_request = False
+    methods = ["POST"]
+    decorators = [login_required]
+
+    def dispatch_request(self):
+        if DataExportForm().validate_on_submit():
+            export = DataExport.latest(current_user.id)
+            if export is not None:
+                export.expire(current_app.config['DATA_EXPORT_PENDING_TIMEOUT'])
+            if (export is not None and export.status == DataExport.READY
+                    and export.is_recent(current_app.config['DATA_EXPORT_MIN_INTERVAL'])):
+                flash('Your data has been exported recently, please download the archive below.', 'warning')
+                return redirect(url_for('auth.account'))
+            if export is None or export.status != DataExport.PENDING:
+                export = DataExport(user_id=current_user.id)
+                from .tasks import export_user_data  # pylint: disable=import-outside-toplevel
+                if current_app.config.get('TASK_OUTBOX_ENABLED'):
+                    db.session.add(export)
+                    db.session.flush()  # assigns export id
+                    outbox.enqueue(export_user_data, export.id)
+                    export.save_to_db()
+                else:
+                    export.save_to_db()
+                    task_publisher.publish(export_user_data, export.id)
+            flash('Your data is being exported, the download link will appear on this page.', 'info')
+        return redirect(url_for('auth.account'))
+
+
+@auth_blueprint.class_route('/account/export/<int:export_id>', 'account_export_download')
+class AccountExportDownload(View):
+    """Sends archive with user's personal data."""
+    init_every_request = False
+    methods = ["GET"]
+    decorators = [login_required]
+
+    def dispatch_request(self, export_id: int):  # pylint: disable=arguments-differ
+        export = db.session.get(DataExport, export_id)
+        if export is None or export.user_id != current_user.id or export.status != DataExport.READY:
+            abort(404)
+        return send_file(export.path, mimetype='application/zip', as_attachment=True,
+                         download_name='flasker-data.zip')
 
 
 @auth_blueprint.class_route('/account/update', 'account_update')
@@ -189,10 +287,19 @@ class AccountDelete(View):
     def dispatch_request(self):
         form = DeleteAccountForm()
         if form.validate_on_submit():
-            user_label = current_user
-            current_user.delete_from_db()
+            user = current_user._get_current_object()  # pylint: disable=protected-access
+            audit_events.record('account_delete', user)
+            audit_events.flush()  # stored before the purge, which is relayed at once
+            user.soft_delete()  # hidden at once, related data is purged by celery task
+            from .tasks import purge_user  # pylint: disable=import-outside-toplevel
+            if current_app.config.get('TASK_OUTBOX_ENABLED'):
+                outbox.enqueue(purge_user, user.id)
+                db.session.commit()
+            else:
+                db.session.commit()
+                task_publisher.publish(purge_user, user.id)
             logout_user()
-            current_app.logger.info('%s account has been deleted.', user_label)
+            current_app.logger.info('%s account has been deleted.', user)
             flash('Your account has been deleted successfully.', 'success')
             return redirect(url_for('auth.login'))
         return render_template(self.template, form=form)
@@ -211,8 +318,13 @@ class AccountChangePassword (View):
         if form.validate_on_submit():
             hashed_password = User.generate_password_hash(form.new_password.data)
             current_user.password = hashed_password
+            current_user.revoke_sessions()
             current_user.save_to_db()
+            # Keep the current session valid, all other sessions are logged out.
+            remember = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token') in request.cookies
+            login_user(current_user._get_current_object(), remember=remember)  # pylint: disable=protected-access
             current_app.logger.info('%s changed password.', current_user)
+            audit_events.record('password_change', current_user)
             flash('Your password has been changed successfully.', 'success')
             return redirect(url_for('auth.account'))
         return render_template(self.template, form=form)
@@ -230,7 +342,9 @@ class SendResetPasswordLink(View):
         form = ResetPasswordEmailForm()
         if form.validate_on_submit():
             from .tasks import send_reset_password_email  # pylint: disable=import-outside-toplevel
-            send_reset_password_email.delay(form.email.data)
+            if not send_optional_email(send_reset_password_email, form.email.data):
+                flash(TRY_AGAIN_LATER_MESSAGE, 'warning')
+                return render_template(self.template, form=form)
             current_app.logger.info('User with email %s has requested email with link to reset password.',
                                     form.email.data)
             flash('A reset password email has been sent to you.', 'info')
@@ -253,8 +367,10 @@ class ResetPassword(View):
         form = ResetPasswordCredentialsForm()
         if form.validate_on_submit():
             user.password = User.generate_password_hash(form.password.data)
+            user.revoke_sessions()
             user.save_to_db()
             current_app.logger.info('%s has has reset password.', user)
+            audit_events.record('password_reset', user)
             flash('Your password has been reset.', 'success')
             return redirect(url_for('auth.login'))
         return render_template(self.template, form=form)
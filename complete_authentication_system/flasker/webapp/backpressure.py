@@ -0,0 +1,123 @@
+"""Contains load shedding based on depth of celery queue."""
+
+import time
+import threading
+from flask import Flask
+from kombu.exceptions import ChannelError
+
+from .metrics import metrics
+
+
+class QueueBackpressure:
+    """
+    Watches number of messages waiting in a celery queue (`BACKPRESSURE_QUEUE`) and tells how enqueueing
+    of new tasks should degrade. Below `BACKPRESSURE_DELAY_DEPTH` tasks are published as usual ("normal"),
+    above it optional tasks are delayed in the outbox, which is not relayed until the queue drains ("delay"),
+    and above `BACKPRESSURE_REFUSE_DEPTH` they are refused ("refuse"). Depth is read from the broker at most
+    once per `BACKPRESSURE_CACHE_TTL` seconds by a process, in a background thread, so requests never wait
+    for the broker and use the last known depth. When the broker can not be reached within
+    `BACKPRESSURE_CONNECT_TIMEOUT` seconds, depth is assumed to be 0 (nothing is shed).
+    """
+
+    NORMAL = 'normal'
+    DELAY = 'delay'
+    REFUSE = 'refuse'
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.enabled = False
+        self.queue = 'mail'
+        self.delay_depth = 1000
+        self.refuse_depth = 10000
+        self.cache_ttl = 5.0
+        self.connect_timeout = 1.0
+        self._depth = 0
+        self._checked_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        metrics.register_callback('celery_queue_depth', self.queue_depth)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures backpressure for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        self.app = app
+        self.enabled = app.config.get('BACKPRESSURE_ENABLED', False)
+        self.queue = app.config.get('BACKPRESSURE_QUEUE', 'mail')
+        self.delay_depth = app.config.get('BACKPRESSURE_DELAY_DEPTH', 1000)
+        self.refuse_depth = app.config.get('BACKPRESSURE_REFUSE_DEPTH', 10000)
+        self.cache_ttl = app.config.get('BACKPRESSURE_CACHE_TTL', 5.0)
+        self.connect_timeout = app.config.get('BACKPRESSURE_CONNECT_TIMEOUT', 1.0)
+        self._depth = 0
+        self._checked_at = None
+        app.extensions['backpressure'] = self
+
+    def queue_depth(self) -> int:
+        """
+        Returns number of messages waiting in the queue (cached). Refresh of outdated value is started
+        in a background thread and the last known value is returned.
+
+        :return: number of messages, 0 if backpressure is disabled
+        """
+        if not self.enabled:
+            return 0
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.cache_ttl:
+            return self._depth
+        with self._lock:
+            if self._refreshing:
+                return self._depth
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name='queue-depth', daemon=True).start()
+        return self._depth
+
+    def refresh(self) -> int:
+        """
+        Reads depth of the queue from the broker.
+
+        :return: number of messages, 0 if the broker is not available
+        """
+        try:
+            self._depth = self._read_depth()
+        except Exception:  # pylint: disable=broad-except
+            # Broker is not available, do not shed anything, publishing will fail on its own.
+            self._depth = 0
+            metrics.inc('celery_queue_depth_errors_total')
+            self.app.logger.warning('Depth of %s queue could not be read.', self.queue, exc_info=True)
+        finally:
+            self._checked_at = time.monotonic()
+            with self._lock:
+                self._refreshing = False
+        return self._depth
+
+    def _read_depth(self) -> int:
+        from .celery import celery_app  # pylint: disable=import-outside-toplevel
+
+        with celery_app.connection_for_read(connect_timeout=self.connect_timeout) as connection:
+            # Fail at once instead of retrying connection (forever by default) when broker is down.
+            connection.ensure_connection(max_retries=0, timeout=self.connect_timeout)
+            try:
+                # Passive declare only returns queue size (LLEN of all priority lists with Redis broker).
+                return connection.default_channel.queue_declare(self.queue, passive=True).message_count
+            except ChannelError:  # Redis broker removes lists of empty queues
+                return 0
+
+    def level(self) -> str:
+        """
+        Returns current degradation level.
+
+        :return: "normal", "delay" or "refuse"
+        """
+        depth = self.queue_depth()
+        if depth >= self.refuse_depth:
+            return self.REFUSE
+        if depth >= self.delay_depth:
+            return self.DELAY
+        return self.NORMAL
+
+
+mail_backpressure = QueueBackpressure()
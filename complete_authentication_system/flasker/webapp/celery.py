@@ -1,9 +1,12 @@
 """Creates celery instance for flasker app."""
 
 from celery import Celery
+from celery.signals import celeryd_init
 from flask import Flask
 
 from .app import create_app
+from .tracing import tracer
+from .connections import redis_connections
 
 
 def create_celery(app: Flask = None):
@@ -18,6 +21,9 @@ def create_celery(app: Flask = None):
 
     celery = Celery(app.import_name)
     celery.conf.update(app.config.get('CELERY_CONFIG', {}))
+    celery.conf.update(redis_connections.celery_options(  # same Redis limits as other consumers
+        app.config.get('CELERY_CONFIG', {}).get('broker_transport_options')
+    ))
     TaskBase = celery.Task
 
     class ContextTask(TaskBase):  # pylint: disable=too-few-public-methods
@@ -26,9 +32,21 @@ def create_celery(app: Flask = None):
 
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return TaskBase.__call__(self, *args, **kwargs)
+                if not tracer.enabled:
+                    return TaskBase.__call__(self, *args, **kwargs)
+                traceparent = (self.request.headers or {}).get('traceparent')
+                with tracer.span(f'celery execute {self.name}', traceparent, task_id=self.request.id):
+                    return TaskBase.__call__(self, *args, **kwargs)
 
     celery.Task = ContextTask
+
+    worker_queues = app.config.get('CELERY_WORKER_QUEUES')
+    if worker_queues:
+        @celeryd_init.connect(weak=False)
+        def select_worker_queues(sender=None, instance=None, **_):  # pylint: disable=unused-argument
+            """Limits queues consumed by the worker, works as `-Q` option of `celery worker` command."""
+            instance.app.amqp.queues.select(worker_queues)
+
     return celery
 
 
@@ -0,0 +1,205 @@
+"""Contains compression of app responses."""
+
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+from flask import Flask, Response, request, g, current_app
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class _GzipCompressor:  # pylint: disable=too-few-public-methods
+    """Gzip stream compressor."""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        """Returns compressed part of the data (may be empty until enough data is buffered)."""
+        return self._compressor.compress(data)
+
+    def sync(self) -> bytes:
+        """Returns all buffered data, so the client can decompress everything sent so far."""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self) -> bytes:
+        """Returns the rest of compressed data and ends the stream."""
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:  # pylint: disable=too-few-public-methods
+    """Brotli stream compressor."""
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        """Returns compressed part of the data (may be empty until enough data is buffered)."""
+        return self._compressor.process(data)
+
+    def sync(self) -> bytes:
+        """Returns all buffered data, so the client can decompress everything sent so far."""
+        return self._compressor.flush()
+
+    def flush(self) -> bytes:
+        """Returns the rest of compressed data and ends the stream."""
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:  # pylint: disable=too-few-public-methods
+    """Zstandard stream compressor."""
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """Returns compressed part of the data (may be empty until enough data is buffered)."""
+        return self._compressor.compress(data)
+
+    def sync(self) -> bytes:
+        """Returns all buffered data, so the client can decompress everything sent so far."""
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def flush(self) -> bytes:
+        """Returns the rest of compressed data and ends the stream."""
+        return self._compressor.flush()
+
+
+COMPRESSORS = {'gzip': _GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = _BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _ZstdCompressor
+
+
+class Compress:
+    """
+    Compresses responses with the best encoding accepted by the client (br, zstd or gzip, depending on
+    installed packages and `COMPRESS_ALGORITHMS` setting). Responses smaller than `COMPRESS_MIN_SIZE`,
+    with not compressible mimetype (e.g. images, fonts, archives which are compressed already) or already
+    encoded are sent as they are. Static files up to `COMPRESS_MAX_FILE_SIZE` are compressed too.
+    Streamed responses are compressed and flushed chunk by chunk, so the client gets them progressively.
+    Pages with CSRF token are not compressed unless `COMPRESS_SECRET_PAGES` is set, as compressing a secret
+    next to reflected input lets an attacker guess the secret from response sizes (BREACH).
+    """
+
+    def __init__(self, app: Flask = None):
+        self.algorithms = ['gzip']
+        self.levels = {}
+        self.min_size = 500
+        self.max_file_size = 1024 * 1024
+        self.mimetypes = set()
+        self.compress_secret_pages = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers compression of responses in the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return
+        self.algorithms = [
+            algorithm for algorithm in app.config.get('COMPRESS_ALGORITHMS', ['br', 'zstd', 'gzip'])
+            if algorithm in COMPRESSORS
+        ]
+        self.levels = app.config.get('COMPRESS_LEVELS', {'gzip': 6, 'br': 4, 'zstd': 3})
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.max_file_size = app.config.get('COMPRESS_MAX_FILE_SIZE', 1024 * 1024)
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['text/html', 'text/css', 'text/plain',
+                                                                  'application/javascript', 'application/json']))
+        self.compress_secret_pages = app.config.get('COMPRESS_SECRET_PAGES', False)
+        app.after_request(self.after_request)
+
+    def choose_encoding(self, accept_encoding) -> Optional[str]:
+        """
+        Returns the best encoding accepted by the client.
+
+        :param accept_encoding: parsed Accept-Encoding header
+        :return: encoding name or None
+        """
+        for algorithm in self.algorithms:
+            if accept_encoding[algorithm] > 0:
+                return algorithm
+        return None
+
+    def after_request(self, response: Response) -> Response:
+        """
+        Compresses the response if it is worth it.
+
+        :param response: response
+        :return: compressed or original response
+        """
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if ('Content-Encoding' in response.headers or response.status_code < 200
+                or response.status_code in (204, 206, 304)):
+            return response
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None or (not self.compress_secret_pages and self._carries_secret()):
+            return response
+        static_file = response.direct_passthrough
+        if static_file:
+            if response.content_length is None or response.content_length > self.max_file_size:
+                return response
+            response.direct_passthrough = False
+        level = self.levels.get(encoding, 6)
+
+        if response.is_streamed and not static_file:
+            response.response = self._compress_stream(response.response, COMPRESSORS[encoding](level))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            compressor = COMPRESSORS[encoding](level)
+            response.set_data(compressor.compress(data) + compressor.flush())
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)  # compressed representation is not byte-identical
+        return response
+
+    @staticmethod
+    def _carries_secret() -> bool:
+        return current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g  # token rendered by Flask-WTF
+
+    @staticmethod
+    def _compress_stream(chunks: Iterable, compressor) -> Iterator[bytes]:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            yield compressor.compress(chunk) + compressor.sync()
+        yield compressor.flush()
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """
+    Decompresses data compressed by this module (used by tests and benchmarks).
+
+    :param data: compressed data
+    :param encoding: encoding name
+    :return: decompressed data
+    """
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return brotli.decompress(data)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f'Unknown encoding: {encoding}')
+
+
+compress = Compress()
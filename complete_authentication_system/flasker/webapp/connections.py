@@ -0,0 +1,201 @@
+"""Contains Redis connection pools shared by all consumers in a process."""
+
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+import redis
+from redis.client import Pipeline
+from redis.connection import SENTINEL
+from flask import Flask
+
+from .metrics import metrics
+from .tracing import tracer
+from .deadline import request_deadline, DeadlineExceeded
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Connection pool which waits for a free connection when all are in use and measures the wait."""
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().get_connection(*args, **kwargs)
+        finally:
+            metrics.observe('redis_pool_wait_seconds', time.perf_counter() - start)
+
+    def in_use(self) -> int:
+        """Returns number of connections checked out of the pool."""
+        return len(self._get_in_use_connections())
+
+    def idle(self) -> int:
+        """Returns number of open connections waiting in the pool."""
+        return len(self._get_free_connections())
+
+
+class DeadlineConnection(redis.Connection):
+    """
+    Connection which sends commands only before the deadline of the current request and waits for a reply
+    at most until the deadline. The connection is closed when a reply is not read, otherwise the next
+    command sent over it would get the reply of this one.
+    """
+
+    def send_packed_command(self, command, check_health=True):
+        request_deadline.check('redis')
+        super().send_packed_command(command, check_health)
+
+    def read_response(self, *args, timeout=SENTINEL, **kwargs):
+        if request_deadline.remaining() is None or timeout is not SENTINEL:
+            return super().read_response(*args, timeout=timeout, **kwargs)
+        try:
+            remaining = request_deadline.check('redis')
+            if self.socket_timeout is not None:
+                remaining = min(remaining, self.socket_timeout)
+            return super().read_response(*args, timeout=remaining, **kwargs)
+        except BaseException as error:
+            self.disconnect()
+            if isinstance(error, redis.TimeoutError) and request_deadline.remaining() <= 0:
+                raise DeadlineExceeded('redis') from error
+            raise
+
+
+class InstrumentedPipeline(Pipeline):  # pylint: disable=abstract-method,too-many-ancestors
+    """Pipeline which measures latency of executed batch of commands."""
+
+    def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            metrics.observe('redis_command_seconds', time.perf_counter() - start, command='pipeline')
+
+
+class InstrumentedRedis(redis.Redis):  # pylint: disable=abstract-method,too-many-ancestors
+    """Redis client which measures latency of commands."""
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            metrics.observe('redis_command_seconds', time.perf_counter() - start, command=str(args[0]).lower())
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class RedisConnections:
+    """
+    Manages one connection pool per logical database in a process. Session, activity tracker, caches and
+    profiler get their clients with `client(<consumer>)`, so their connections are limited together with
+    `REDIS_MAX_CONNECTIONS` and share socket timeouts and health checks. A consumer can be moved to its own
+    logical database with `REDIS_DATABASES`. Celery connects with kombu, which keeps its own pools, so it gets
+    the same limits and database through `celery_options`. Replies are not awaited after the deadline
+    of the request. Redis is not used (`client` returns None) when `REDIS_ENABLED` is not set.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.url = None
+        self.databases: Dict[str, int] = {}
+        self.pool_options = {}
+        self._pools: Dict[Optional[int], InstrumentedConnectionPool] = {}
+        self._clients: Dict[str, InstrumentedRedis] = {}
+        metrics.register_callback('redis_pool_in_use', lambda: sum(pool.in_use() for pool in self._pools.values()))
+        metrics.register_callback('redis_pool_idle', lambda: sum(pool.idle() for pool in self._pools.values()))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures connections for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        self.url = app.config.get('REDIS_URL') if app.config.get('REDIS_ENABLED', False) else None
+        self.databases = dict(app.config.get('REDIS_DATABASES', {}))
+        self.pool_options = {
+            'max_connections': app.config.get('REDIS_MAX_CONNECTIONS', 50),
+            'timeout': app.config.get('REDIS_POOL_TIMEOUT', 1.0),
+            'socket_timeout': app.config.get('REDIS_SOCKET_TIMEOUT', 2.0),
+            'socket_connect_timeout': app.config.get('REDIS_SOCKET_CONNECT_TIMEOUT', 1.0),
+            'health_check_interval': app.config.get('REDIS_HEALTH_CHECK_INTERVAL', 30),
+        }
+        self._pools = {}
+        self._clients = {}
+        app.extensions['redis_connections'] = self
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if Redis is configured."""
+        return self.url is not None
+
+    def client(self, consumer: str = 'default') -> Optional[InstrumentedRedis]:
+        """
+        Returns client of the given consumer. Client does not connect until the first command.
+
+        :param consumer: consumer name, e.g. "session", "cache" (selects logical database)
+        :return: Redis client or None if Redis is not configured
+        """
+        if not self.enabled:
+            return None
+        client = self._clients.get(consumer)
+        if client is None:
+            database = self.databases.get(consumer)
+            pool = self._pools.get(database)
+            if pool is None:
+                options = dict(self.pool_options)
+                if self.url.startswith('redis://'):  # TCP connections (not TLS or Unix socket)
+                    options['connection_class'] = DeadlineConnection
+                pool = InstrumentedConnectionPool.from_url(self.url_for(consumer), **options)
+                self._pools[database] = pool
+            client = self._clients[consumer] = InstrumentedRedis(connection_pool=pool)
+            if tracer.enabled:
+                tracer.instrument_redis(client)
+        return client
+
+    def url_for(self, consumer: str) -> Optional[str]:
+        """
+        Returns URL of the logical database of the given consumer.
+
+        :param consumer: consumer name
+        :return: Redis URL or None if Redis is not configured
+        """
+        if not self.enabled or self.databases.get(consumer) is None:
+            return self.url
+        parts = urlsplit(self.url)
+        return urlunsplit(parts._replace(path=f'/{self.databases[consumer]}'))
+
+    def celery_options(self, transport_options: dict = None) -> dict:
+        """
+        Returns Celery settings which connect broker and result backend with the limits of the pools.
+
+        :param transport_options: other broker transport options
+        :return: Celery settings, empty if Redis is not configured
+        """
+        if not self.enabled:
+            return {}
+        url = self.url_for('celery')
+        options = self.pool_options
+        return {
+            'broker_url': url,
+            'result_backend': url,
+            'broker_transport_options': {
+                **(transport_options or {}),
+                'max_connections': options['max_connections'],
+                'socket_timeout': options['socket_timeout'],
+                'socket_connect_timeout': options['socket_connect_timeout'],
+                'health_check_interval': options['health_check_interval'],
+            },
+            'redis_max_connections': options['max_connections'],
+            'redis_socket_timeout': options['socket_timeout'],
+            'redis_socket_connect_timeout': options['socket_connect_timeout'],
+            'redis_backend_health_check_interval': options['health_check_interval'],
+        }
+
+    def reset(self) -> None:
+        """Drops connections inherited from the parent process (e.g. in forked gunicorn worker)."""
+        for pool in self._pools.values():
+            pool.reset()
+
+
+redis_connections = RedisConnections()
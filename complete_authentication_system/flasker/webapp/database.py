@@ -0,0 +1,109 @@
+"""Contains configuration of database engine: pool profiles, statement timeouts and pool metrics."""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from .metrics import metrics
+from .deadline import request_deadline, DeadlineExceeded
+
+
+_statement_timeout: ContextVar[Optional[int]] = ContextVar('statement_timeout', default=None)
+
+
+class TimedQueuePool(QueuePool):
+    """Queue pool which measures how long checkout waits for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - start)
+
+
+@contextmanager
+def statement_timeout(milliseconds: int) -> Iterator[None]:
+    """
+    Changes statement timeout of transactions started in the block (e.g. for a slow report).
+
+    :param milliseconds: timeout in milliseconds, 0 disables it
+    """
+    token = _statement_timeout.set(milliseconds)
+    try:
+        yield
+    finally:
+        _statement_timeout.reset(token)
+
+
+def configure_engine(app: Flask) -> None:
+    """
+    Builds `SQLALCHEMY_ENGINE_OPTIONS` from profile chosen with `DB_ENGINE_PROFILE` ("web", "worker" or "cli").
+    Options set directly in `SQLALCHEMY_ENGINE_OPTIONS` take precedence. Only PostgreSQL engines are tuned.
+    Statement timeout of the profile is sent as connection startup parameter, so it costs no queries, except
+    with PgBouncer in transaction pooling mode (`DB_PGBOUNCER`), which does not keep session settings,
+    there it is set with `SET LOCAL` in every transaction.
+
+    :param app: instance of Flask app
+    :return: None
+    """
+    if not app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('postgresql'):
+        return
+    profile = dict(app.config['DB_ENGINE_PROFILES'][app.config.get('DB_ENGINE_PROFILE', 'web')])
+    timeout = profile.pop('statement_timeout', 0)
+    options = dict(profile, poolclass=TimedQueuePool)
+    if timeout and not app.config.get('DB_PGBOUNCER', False):
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_STATEMENT_TIMEOUT'] = timeout
+
+
+def register_engine_events(app: Flask, db) -> None:
+    """
+    Registers statement timeout of transactions and pool metrics of app engines. Transactions started
+    in a request are not started after its deadline and on PostgreSQL their statement timeout is lowered
+    to the time left when it is shorter than the profile timeout.
+
+    :param app: instance of Flask app
+    :param db: Flask-SQLAlchemy extension
+    :return: None
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+    profile_timeout = app.config.get('DB_STATEMENT_TIMEOUT', 0)
+    default_timeout = profile_timeout if app.config.get('DB_PGBOUNCER', False) else None
+    for engine in engines:
+        if engine.dialect.name != 'postgresql':
+            event.listen(engine, 'begin', lambda _: request_deadline.check('database'))
+            continue
+
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(connection):
+            timeout = _statement_timeout.get()
+            if timeout is None:
+                timeout = default_timeout
+            remaining = request_deadline.check('database')
+            if remaining is not None:
+                current = timeout if timeout is not None else profile_timeout
+                if not current or remaining * 1000 < current:
+                    timeout = max(int(remaining * 1000), 1)
+            if timeout is not None:
+                connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+        @event.listens_for(engine, 'handle_error')
+        def raise_deadline_exceeded(context):
+            # Statement cancelled by timeout lowered to the request deadline (SQLSTATE 57014, query_canceled).
+            remaining = request_deadline.remaining()
+            if remaining is not None and remaining <= 0 \
+                    and getattr(context.original_exception, 'pgcode', None) == '57014':
+                raise DeadlineExceeded('database') from context.original_exception
+
+    pools = [engine.pool for engine in engines if isinstance(engine.pool, QueuePool)]
+    if pools:
+        metrics.register_callback('db_pool_checked_out', lambda: sum(pool.checkedout() for pool in pools))
+        metrics.register_callback('db_pool_overflow', lambda: sum(max(pool.overflow(), 0) for pool in pools))
@@ -0,0 +1,99 @@
+"""Contains time budget of requests shared by database, Redis and task publishing."""
+
+import time
+from typing import Optional
+from flask import Flask, Response, request, has_request_context
+from werkzeug.exceptions import ServiceUnavailable
+
+from .metrics import metrics
+
+
+class DeadlineExceeded(ServiceUnavailable):
+    """Raised when work of the request can not be finished before its deadline (answered with 503)."""
+
+    def __init__(self, operation: str):
+        super().__init__(f'The request could not be finished in time ({operation}), please try again.')
+        self.operation = operation
+
+
+class RequestDeadline:
+    """
+    Gives every request a deadline, `REQUEST_DEADLINE` seconds after it started (per endpoint in
+    `REQUEST_DEADLINES`, e.g. {"auth.login": 5.0}). The remaining time caps SQL statement timeout, Redis socket
+    timeout and task publishing, and work started after the deadline fails at once with 503, so the worker
+    is not busy with answers nobody waits for. A response which is ready is always sent. Misses are counted
+    in `request_deadline_misses_total` by endpoint. Outside of requests (celery tasks, commands) there is
+    no deadline.
+    """
+
+    ENVIRON_KEY = 'flasker.deadline'
+
+    def __init__(self, app: Flask = None):
+        self.enabled = False
+        self.default = 20.0
+        self.deadlines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures deadlines for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        self.enabled = app.config.get('REQUEST_DEADLINE_ENABLED', False)
+        self.default = app.config.get('REQUEST_DEADLINE', 20.0)
+        self.deadlines = dict(app.config.get('REQUEST_DEADLINES', {}))
+        app.extensions['request_deadline'] = self
+        if self.enabled:
+            app.before_request(self._start)
+            # Deadline ends before any `after_request` function (they run in reverse order of registration),
+            # so work done after the response is ready (session, activity flush) never fails with 503.
+            process_response = app.process_response
+            app.process_response = lambda response: process_response(self._finish(response))
+
+    def remaining(self) -> Optional[float]:
+        """
+        Returns time left to the deadline of the current request.
+
+        :return: seconds (negative after the deadline) or None if there is no deadline
+        """
+        if not self.enabled or not has_request_context():
+            return None
+        deadline = request.environ.get(self.ENVIRON_KEY)
+        return deadline - time.monotonic() if deadline is not None else None
+
+    def check(self, operation: str, needed: float = 0.0) -> Optional[float]:
+        """
+        Fails if the operation can not be finished before the deadline.
+
+        :raises DeadlineExceeded: if less than `needed` seconds are left
+        :param operation: name of the operation (shown in the error)
+        :param needed: expected duration of the operation in seconds
+        :return: remaining time in seconds or None if there is no deadline
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= needed:
+            request.environ[self.ENVIRON_KEY + '.missed'] = operation
+            raise DeadlineExceeded(operation)
+        return remaining
+
+    def _start(self) -> None:
+        timeout = self.deadlines.get(request.endpoint, self.default)
+        if timeout is not None:
+            request.environ[self.ENVIRON_KEY] = time.monotonic() + timeout
+
+    def _finish(self, response: Response) -> Response:
+        # Response is ready, after request functions, saving the session and teardown are finished
+        # regardless of the deadline.
+        deadline = request.environ.pop(self.ENVIRON_KEY, None)
+        missed = request.environ.get(self.ENVIRON_KEY + '.missed')
+        if missed is None and deadline is not None and deadline < time.monotonic():
+            missed = 'response'
+        if missed is not None:
+            metrics.inc('request_deadline_misses_total', endpoint=request.endpoint, operation=missed)
+        return response
+
+
+request_deadline = RequestDeadline()
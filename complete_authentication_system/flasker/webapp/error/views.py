@@ -20,6 +20,12 @@ def page_forbidden(_):
     return render_template('403.html'), 403
 
 
+@error_blueprint.app_errorhandler(503)
+def page_service_unavailable(error):
+    """Renders 503 error page (e.g. request deadline exceeded)."""
+    return render_template('503.html', error=error), 503
+
+
 @error_blueprint.app_errorhandler(500)
 def page_internal_server_error(_):
     """Renders 500 error page."""
@@ -0,0 +1,125 @@
+"""Contains flash messages stored in short-lived signed cookie instead of the session."""
+
+from typing import List, Tuple
+import flask
+from flask import Flask, Response, current_app, request
+from itsdangerous import URLSafeTimedSerializer, BadData
+
+from .metrics import metrics
+
+
+_INCOMING = 'flasker.flashes.incoming'
+_PENDING = 'flasker.flashes.pending'
+_CONSUMED = 'flasker.flashes.consumed'
+
+
+class CookieFlash:
+    """
+    Keeps flash messages in signed cookie, so carrying a message across redirect does not modify
+    the server-side session. Messages are removed from the cookie once they are read. The backend is
+    selected with `FLASH_BACKEND` setting ("cookie" or "session").
+    """
+
+    def __init__(self, app: Flask = None):
+        self.cookie_name = 'flashes'
+        self.max_age = 60
+        self.max_messages = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers cookie flash backend in the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        app.extensions['flash_backend'] = app.config.get('FLASH_BACKEND', 'session')
+        if app.extensions['flash_backend'] != 'cookie':
+            return
+        self.cookie_name = app.config.get('FLASH_COOKIE_NAME', 'flashes')
+        self.max_age = app.config.get('FLASH_COOKIE_MAX_AGE', 60)
+        self.max_messages = app.config.get('FLASH_COOKIE_MAX_MESSAGES', 10)
+        app.jinja_env.globals['get_flashed_messages'] = get_flashed_messages
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def _serializer() -> URLSafeTimedSerializer:
+        return URLSafeTimedSerializer(current_app.secret_key, salt='flash-messages')
+
+    def incoming(self) -> List[Tuple[str, str]]:
+        """
+        Returns messages sent by the client in the cookie.
+
+        :return: list of (category, message) pairs
+        """
+        if _INCOMING not in request.environ:
+            messages = []
+            value = request.cookies.get(self.cookie_name)
+            if value:
+                try:
+                    messages = [tuple(item) for item in self._serializer().loads(value, max_age=self.max_age)]
+                except (BadData, TypeError, ValueError):
+                    messages = []
+            request.environ[_INCOMING] = messages
+        return request.environ[_INCOMING]
+
+    def after_request(self, response: Response) -> Response:
+        """
+        Stores pending messages in the cookie or removes already read messages.
+
+        :param response: response
+        :return: response
+        """
+        pending = request.environ.get(_PENDING, [])
+        consumed = request.environ.get(_CONSUMED, False)
+        if pending:
+            metrics.inc('flash_cookie_messages_total', len(pending))  # each one would be a session write
+            messages = pending if consumed else self.incoming() + pending
+            response.set_cookie(
+                self.cookie_name, self._serializer().dumps(messages[-self.max_messages:]),
+                max_age=self.max_age, httponly=True, samesite='Lax',
+                secure=current_app.config.get('SESSION_COOKIE_SECURE', False),
+            )
+        elif consumed and self.cookie_name in request.cookies:
+            response.delete_cookie(self.cookie_name, httponly=True, samesite='Lax')
+        return response
+
+
+cookie_flash = CookieFlash()
+
+
+def flash(message: str, category: str = 'message') -> None:
+    """
+    Flashes a message to the next request (works as `flask.flash`).
+
+    :param message: message to flash
+    :param category: message category
+    :return: None
+    """
+    if current_app.extensions.get('flash_backend') != 'cookie':
+        flask.flash(message, category)
+        return
+    request.environ.setdefault(_PENDING, []).append((category, message))
+
+
+def get_flashed_messages(with_categories: bool = False, category_filter=()) -> list:
+    """
+    Pulls all flashed messages (works as `flask.get_flashed_messages`).
+
+    :param with_categories: True to return (category, message) pairs
+    :param category_filter: categories to return
+    :return: list of messages
+    """
+    if current_app.extensions.get('flash_backend') != 'cookie':
+        return flask.get_flashed_messages(with_categories, category_filter)
+    if not request.environ.get(_CONSUMED):
+        incoming = cookie_flash.incoming()
+        request.environ[_INCOMING] = incoming + request.environ.pop(_PENDING, [])
+        request.environ[_CONSUMED] = True
+    messages = request.environ[_INCOMING]
+    if category_filter:
+        messages = [message for message in messages if message[0] in category_filter]
+    if not with_categories:
+        return [message for _, message in messages]
+    return messages
@@ -0,0 +1,260 @@
+"""Contains metrics of flasker app exposed in Prometheus text format."""
+
+import os
+import hmac
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Tuple, Optional
+from flask import Flask, Response, request, abort
+
+from .utils import ProcessThread
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    Registry of counters, gauges and summaries. Values are collected in memory of every process (gunicorn
+    worker, celery worker). When Redis is configured, every process adds what its counters and summaries
+    grew by to shared hashes in Redis every `METRICS_PUSH_INTERVAL` seconds (and before rendering), so any
+    gunicorn worker serving the scrape renders totals of all processes, celery workers included. Gauges
+    and callbacks describe the process which renders them.
+    """
+
+    def __init__(self):
+        self.key_prefix = 'metrics:'
+        self.push_interval = 5.0
+        self._client = None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._summaries: Dict[str, Dict[Labels, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+        self._pushed: Dict[str, float] = defaultdict(float)  # pushed values by Redis hash field
+        self._pusher = ProcessThread(self._run, 'metrics-pusher')
+        os.register_at_fork(after_in_child=self._forked)
+
+    def init_app(self, app: Flask, client=None) -> None:
+        """
+        Configures shared store of the metrics.
+
+        :param app: instance of Flask app
+        :param client: Redis client, values are kept only in the process if None
+        :return: None
+        """
+        self.key_prefix = app.config.get('METRICS_KEY_PREFIX', 'metrics:')
+        self.push_interval = app.config.get('METRICS_PUSH_INTERVAL', 5.0)
+        self._client = client
+        app.extensions['metrics'] = self
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increments counter.
+
+        :param name: metric name
+        :param value: value to add
+        :param labels: metric labels
+        :return: None
+        """
+        with self._lock:
+            self._counters[name][self._labels(labels)] += value
+        if self._client is not None:
+            self._pusher.ensure_started()
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        Sets gauge value.
+
+        :param name: metric name
+        :param value: current value
+        :param labels: metric labels
+        :return: None
+        """
+        with self._lock:
+            self._gauges[name][self._labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Adds observation to summary (exposed as <name>_count and <name>_sum).
+
+        :param name: metric name
+        :param value: observed value
+        :param labels: metric labels
+        :return: None
+        """
+        with self._lock:
+            summary = self._summaries[name][self._labels(labels)]
+            summary[0] += 1
+            summary[1] += value
+        if self._client is not None:
+            self._pusher.ensure_started()
+
+    def register_callback(self, name: str, callback: Callable[[], float]) -> None:
+        """
+        Registers gauge which value is computed by callback during scraping.
+
+        :param name: metric name
+        :param callback: function returning current value
+        :return: None
+        """
+        self._callbacks[name] = callback
+
+    def get(self, name: str, **labels) -> float:
+        """
+        Returns current value of counter or gauge (or count of summary observations).
+
+        :param name: metric name
+        :param labels: metric labels
+        :return: metric value, 0 if metric is missing
+        """
+        key = self._labels(labels)
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0)
+            if name in self._gauges:
+                return self._gauges[name].get(key, 0)
+            if name in self._summaries:
+                return self._summaries[name].get(key, [0, 0.0])[0]
+        return 0
+
+    def clear(self) -> None:
+        """Removes all collected values."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+            self._pushed.clear()
+
+    def push(self) -> bool:
+        """
+        Adds growth of counters and summaries since the previous push to the shared store.
+
+        :return: True if values were pushed (or there is no shared store)
+        """
+        if self._client is None:
+            return True
+        with self._lock:
+            deltas = {field: value - self._pushed[field] for field, value in self._fields().items()}
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return True
+        try:
+            pipeline = self._client.pipeline(transaction=False)
+            for field, delta in deltas.items():
+                pipeline.hincrbyfloat(self.key_prefix + 'values', field, delta)
+            pipeline.execute()
+        except Exception:  # pylint: disable=broad-except
+            # Not pushed deltas are added by the next push.
+            with self._lock:
+                self._counters['metrics_push_errors_total'][()] += 1
+            return False
+        with self._lock:
+            for field, delta in deltas.items():
+                self._pushed[field] += delta
+        return True
+
+    def _fields(self) -> Dict[str, float]:
+        fields = {}
+        for name, values in self._counters.items():
+            for labels, value in values.items():
+                fields[json.dumps(['counter', name, labels])] = value
+        for name, values in self._summaries.items():
+            for labels, (count, total) in values.items():
+                fields[json.dumps(['summary_count', name, labels])] = count
+                fields[json.dumps(['summary_sum', name, labels])] = total
+        return fields
+
+    def _shared_values(self) -> Optional[tuple]:
+        if self._client is None or not self.push():
+            return None
+        try:
+            stored = self._client.hgetall(self.key_prefix + 'values')
+        except Exception:  # pylint: disable=broad-except
+            return None
+        counters = defaultdict(dict)
+        summaries = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        for field, value in stored.items():
+            kind, name, labels = json.loads(field)
+            labels = tuple(tuple(label) for label in labels)
+            value = float(value)
+            if kind == 'counter':
+                counters[name][labels] = value
+            else:
+                summaries[name][labels][0 if kind == 'summary_count' else 1] = value
+        return counters, summaries
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.push_interval)
+            self.push()
+
+    def _forked(self) -> None:
+        # Values inherited from the parent process are pushed by the parent.
+        self._lock = threading.Lock()
+        self._pushed = defaultdict(float, self._fields())
+
+    def render(self) -> str:
+        """
+        Returns metrics in Prometheus text format.
+
+        :return: metrics
+        """
+        def sample(name: str, labels: Labels, value: float) -> str:
+            if labels:
+                rendered_labels = ','.join(f'{key}="{value}"' for key, value in labels)
+                return f'{name}{{{rendered_labels}}} {value}'
+            return f'{name} {value}'
+
+        lines = []
+        shared = self._shared_values()
+        with self._lock:
+            counters, summaries = shared if shared is not None else (self._counters, self._summaries)
+            for name, values in sorted(counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                lines.extend(sample(name, labels, value) for labels, value in values.items())
+            for name, values in sorted(self._gauges.items()):
+                lines.append(f'# TYPE {name} gauge')
+                lines.extend(sample(name, labels, value) for labels, value in values.items())
+            for name, values in sorted(summaries.items()):
+                lines.append(f'# TYPE {name} summary')
+                for labels, (count, total) in values.items():
+                    lines.append(sample(f'{name}_count', labels, count))
+                    lines.append(sample(f'{name}_sum', labels, total))
+        for name, callback in sorted(self._callbacks.items()):
+            try:
+                value = callback()
+            except Exception:  # pylint: disable=broad-except
+                continue
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(sample(name, (), value))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def register_metrics_endpoint(app: Flask) -> None:
+    """
+    Adds /metrics endpoint to the app if METRICS_ENABLED setting is set. When METRICS_TOKEN is set,
+    scrapers have to send it in "Authorization: Bearer <token>" header.
+
+    :param app: instance of Flask app
+    :return: None
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    token = app.config.get('METRICS_TOKEN')
+
+    def metrics_view():
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,116 @@
+"""Contains transactional outbox of celery tasks."""
+
+import datetime
+from typing import TYPE_CHECKING
+from sqlalchemy import func, select
+
+from .app import db
+from .metrics import metrics
+from .backpressure import mail_backpressure
+from .tracing import tracer
+
+if TYPE_CHECKING:  # celery is imported by the relay
+    from celery import Task
+
+
+class OutboxMessage(db.Model):
+    """Celery task waiting to be published to the broker."""
+
+    __tablename__ = 'outbox'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    task = db.Column(db.String(255), nullable=False)
+    args = db.Column(db.JSON, nullable=False, default=list)
+    kwargs = db.Column(db.JSON, nullable=False, default=dict)
+    created = db.Column(db.DateTime(), nullable=False, default=datetime.datetime.utcnow)
+    traceparent = db.Column(db.String(55))  # trace context of the request which added the task
+
+    def __repr__(self) -> str:
+        """
+        Returns message representation.
+
+        :return: message string representation
+        """
+        return f"OutboxMessage('{self.task}', id={self.id})"
+
+
+def enqueue(task: 'Task', *args, **kwargs) -> None:
+    """
+    Adds task to the outbox in the current database transaction. The task is published by the relay after
+    the transaction is committed, so the request never waits for the broker and the task is not lost
+    if the broker is unavailable.
+
+    :param task: celery task
+    :param args: task positional arguments (JSON serializable)
+    :param kwargs: task keyword arguments (JSON serializable)
+    :return: None
+    """
+    db.session.add(OutboxMessage(task=task.name, args=list(args), kwargs=kwargs, traceparent=tracer.traceparent()))
+
+
+def relay(batch_size: int = 100, max_batches: int = 10) -> int:
+    """
+    Publishes tasks from the outbox in batches and removes published messages. Messages are removed after
+    publishing, so a task may be published more than once (at-least-once delivery) if the relay fails
+    before commit. While the queue watched by backpressure (mail) is overloaded, tasks routed to it wait
+    in the outbox until it drains and other tasks are still published.
+
+    :param batch_size: number of messages published in one transaction
+    :param max_batches: maximum number of batches published in one call
+    :return: number of published messages
+    """
+    from .celery import celery_app  # pylint: disable=import-outside-toplevel
+
+    query = select(OutboxMessage).order_by(OutboxMessage.id).limit(batch_size).with_for_update(skip_locked=True)
+    if mail_backpressure.level() != mail_backpressure.NORMAL:
+        delayed = _tasks_routed_to(celery_app, mail_backpressure.queue)
+        if delayed:
+            metrics.inc('outbox_relay_paused_total')  # messages wait in the database until the queue drains
+            query = query.where(OutboxMessage.task.not_in(delayed))
+    published = 0
+    for _ in range(max_batches):
+        messages = db.session.execute(query).scalars().all()
+        if not messages:
+            break
+        now = datetime.datetime.utcnow()
+        for message in messages:
+            headers = {'traceparent': message.traceparent} if message.traceparent else None
+            celery_app.send_task(message.task, args=message.args, kwargs=message.kwargs, headers=headers)
+            metrics.observe('outbox_relay_lag_seconds', (now - message.created).total_seconds())
+            db.session.delete(message)
+        db.session.commit()
+        published += len(messages)
+        metrics.inc('outbox_relayed_total', len(messages))
+        if len(messages) < batch_size:
+            break
+    return published
+
+
+def _tasks_routed_to(celery_app, queue: str) -> list:
+    tasks = db.session.execute(select(OutboxMessage.task).distinct()).scalars().all()
+    return [task for task in tasks if celery_app.amqp.router.route({}, task)['queue'].name == queue]
+
+
+def backlog_size() -> int:
+    """
+    Returns number of messages waiting in the outbox.
+
+    :return: number of messages
+    """
+    return db.session.execute(select(func.count(OutboxMessage.id))).scalar_one()
+
+
+def oldest_message_age() -> float:
+    """
+    Returns age of the oldest message waiting in the outbox.
+
+    :return: age in seconds, 0 if outbox is empty
+    """
+    oldest = db.session.execute(select(func.min(OutboxMessage.created))).scalar_one()
+    if oldest is None:
+        return 0.0
+    return (datetime.datetime.utcnow() - oldest).total_seconds()
+
+
+metrics.register_callback('outbox_backlog_size', backlog_size)
+metrics.register_callback('outbox_oldest_message_age_seconds', oldest_message_age)
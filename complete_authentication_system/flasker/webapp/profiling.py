@@ -0,0 +1,203 @@
+"""Contains on-demand sampling profiler of requests."""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+from typing import List, Optional
+from flask import Flask, after_this_request, current_app, request
+from flask_login import current_user
+
+from .metrics import metrics
+from .connections import redis_connections
+
+
+class StackSampler:
+    """
+    Statistical profiler of one thread. Background thread takes stack of the profiled thread every
+    `interval` seconds and counts identical stacks, the result is in "folded stacks" format accepted by
+    flamegraph tools (flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._target = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts sampling of the current thread."""
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """
+        Stops sampling.
+
+        :return: number of samples per folded stack
+        """
+        self._stopping.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self._target)  # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    @staticmethod
+    def fold(samples: Counter) -> str:
+        """
+        Returns samples as text, one "stack count" line per stack.
+
+        :param samples: number of samples per folded stack
+        :return: folded stacks
+        """
+        return '\n'.join(f'{stack} {count}' for stack, count in samples.most_common())
+
+
+class LocalProfileStore:
+    """Keeps recent profiles in memory of the worker."""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile: dict) -> None:
+        """Stores profile."""
+        with self._lock:
+            self._profiles.appendleft(profile)
+
+    def recent(self) -> List[dict]:
+        """Returns recent profiles, the newest first."""
+        with self._lock:
+            return list(self._profiles)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        """Returns profile with the given id."""
+        return next((profile for profile in self.recent() if profile['id'] == profile_id), None)
+
+
+class RedisProfileStore:
+    """Keeps recent profiles in Redis list shared by all workers."""
+
+    def __init__(self, client, max_profiles: int = 50, key: str = 'profiles'):
+        self.client = client
+        self.max_profiles = max_profiles
+        self.key = key
+
+    def add(self, profile: dict) -> None:
+        """Stores profile."""
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.lpush(self.key, json.dumps(profile))
+        pipeline.ltrim(self.key, 0, self.max_profiles - 1)
+        pipeline.execute()
+
+    def recent(self) -> List[dict]:
+        """Returns recent profiles, the newest first."""
+        return [json.loads(profile) for profile in self.client.lrange(self.key, 0, -1)]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        """Returns profile with the given id."""
+        return next((profile for profile in self.recent() if profile['id'] == profile_id), None)
+
+
+class RequestProfiler:
+    """
+    Profiles `dispatch_request` of chosen requests: requests of administrators with `X-Profile` header or
+    `_profile` query argument, and a `PROFILER_SAMPLE_RATE` fraction of all requests. Profiles are kept per
+    request id (`X-Request-ID` header or generated one, returned in `X-Profile-Id` header). When
+    `PROFILER_ENABLED` is not set nothing is registered, so requests are not affected at all.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.store = LocalProfileStore()
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers profiler in the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        app.extensions['profiler'] = self
+        if not app.config.get('PROFILER_ENABLED', False):
+            return
+        max_profiles = app.config.get('PROFILER_MAX_PROFILES', 50)
+        redis_client = redis_connections.client('profiler')
+        self.store = (RedisProfileStore(redis_client, max_profiles) if redis_client is not None
+                      else LocalProfileStore(max_profiles))
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.interval = app.config.get('PROFILER_INTERVAL', 0.005)
+        app.dispatch_request = self._wrap(app.dispatch_request)
+
+    def should_profile(self) -> bool:
+        """
+        Checks if the current request is profiled.
+
+        :return: True if request should be profiled
+        """
+        if 'X-Profile' in request.headers or '_profile' in request.args:
+            from .auth.models import Permission  # pylint: disable=import-outside-toplevel
+            if current_user.is_authenticated and current_user.can(Permission.ADMINISTER):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _wrap(self, dispatch_request):
+        def profiled_dispatch_request():
+            if not self.should_profile():
+                return dispatch_request()
+            sampler = StackSampler(self.interval)
+            start = time.perf_counter()
+            sampler.start()
+            try:
+                return dispatch_request()
+            finally:
+                samples = sampler.stop()
+                self._save(time.perf_counter() - start, samples)
+        return profiled_dispatch_request
+
+    def _save(self, duration: float, samples: Counter) -> None:
+        profile_id = request.headers.get('X-Request-ID', '')
+        if not re.fullmatch(r'[\w.-]{1,64}', profile_id):
+            profile_id = uuid.uuid4().hex
+        try:
+            self.store.add({
+                'id': profile_id,
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'duration': round(duration, 6),
+                'samples': sum(samples.values()),
+                'created': time.time(),
+                'stacks': StackSampler.fold(samples),
+            })
+        except Exception:  # pylint: disable=broad-except
+            current_app.logger.exception('Profile of %s %s could not be saved.', request.method, request.path)
+            return
+        metrics.inc('profiled_requests_total')
+
+        @after_this_request
+        def add_header(response):
+            response.headers['X-Profile-Id'] = profile_id
+            return response
+
+
+request_profiler = RequestProfiler()
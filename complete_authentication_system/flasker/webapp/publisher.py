@@ -0,0 +1,188 @@
+"""Contains publisher of celery tasks used by request handlers."""
+
+import time
+import queue
+import atexit
+import threading
+from typing import TYPE_CHECKING
+from flask import Flask, current_app
+
+from .metrics import metrics
+from .tracing import tracer
+from .deadline import request_deadline, DeadlineExceeded
+from .utils import ProcessThread
+
+if TYPE_CHECKING:  # celery is imported with the first published task
+    from celery import Task
+
+
+class TaskPublisher:
+    """
+    Publishes celery tasks on behalf of request handlers.
+
+    In "direct" mode tasks are sent with `.delay()` in the request. In "buffered" mode they are put in
+    a bounded in-memory queue and published by a background thread of the worker over one persistent
+    producer connection, so broker round trips do not add to request latency. When the queue is full,
+    `TASK_PUBLISHER_OVERFLOW` decides what happens: "direct" (publish in the request), "block" (wait
+    for free slot up to `TASK_PUBLISHER_BLOCK_TIMEOUT` seconds) or "drop".
+    """
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.mode = 'direct'
+        self.overflow = 'direct'
+        self.block_timeout = 1.0
+        self.batch_size = 100
+        self.shutdown_timeout = 5.0
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._stopping = threading.Event()
+        self._worker = ProcessThread(self._run, 'task-publisher')
+        self._exit_handler_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Configures publisher for the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        self.app = app
+        self.mode = app.config.get('TASK_PUBLISHER', 'direct')
+        self.overflow = app.config.get('TASK_PUBLISHER_OVERFLOW', 'direct')
+        self.block_timeout = app.config.get('TASK_PUBLISHER_BLOCK_TIMEOUT', 1.0)
+        self.batch_size = app.config.get('TASK_PUBLISHER_BATCH_SIZE', 100)
+        self.shutdown_timeout = app.config.get('TASK_PUBLISHER_SHUTDOWN_TIMEOUT', 5.0)
+        max_size = app.config.get('TASK_PUBLISHER_QUEUE_SIZE', 1000)
+        if self._queue.maxsize != max_size and self._queue.empty():
+            self._queue = queue.Queue(maxsize=max_size)
+        app.extensions['task_publisher'] = self
+        metrics.register_callback('task_publisher_queue_size', _queue_size)
+        if not self._exit_handler_registered:
+            atexit.register(self.shutdown)
+            self._exit_handler_registered = True
+
+    def publish(self, task: 'Task', *args, **kwargs) -> None:
+        """
+        Publishes task according to configured mode.
+
+        :param task: celery task
+        :param args: task positional arguments
+        :param kwargs: task keyword arguments
+        :return: None
+        """
+        if self.mode != 'buffered':
+            self._publish_directly(task, args, kwargs)
+            return
+        self._ensure_worker()
+        item = (task, args, kwargs, tracer.traceparent())
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            metrics.inc('task_publisher_overflow_total', policy=self.overflow)
+        if self.overflow == 'block':
+            remaining = request_deadline.check('task publish')
+            try:
+                self._queue.put(item, timeout=min(self.block_timeout, remaining or self.block_timeout))
+                return
+            except queue.Full:
+                pass
+        elif self.overflow == 'drop':
+            self.app.logger.error('Task %s was dropped, publisher queue is full.', task.name)
+            return
+        self._publish_directly(task, args, kwargs)
+
+    @staticmethod
+    def _publish_directly(task: 'Task', args: tuple, kwargs: dict) -> None:
+        remaining = request_deadline.check('task publish')
+        start = time.perf_counter()
+        if remaining is None:
+            task.delay(*args, **kwargs)
+        else:
+            _publish_before_deadline(task, args, kwargs, remaining)
+        metrics.observe('task_publish_seconds', time.perf_counter() - start, mode='direct')
+
+    def queue_size(self) -> int:
+        """
+        Returns number of tasks waiting in the queue.
+
+        :return: number of tasks
+        """
+        return self._queue.qsize()
+
+    def shutdown(self) -> None:
+        """Publishes tasks left in the queue and stops background thread."""
+        if not self._worker.started:
+            return
+        self._stopping.set()
+        self._worker.thread.join(self.shutdown_timeout)
+
+    def _ensure_worker(self) -> None:
+        self._worker.ensure_started()
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        from .celery import celery_app  # pylint: disable=import-outside-toplevel
+
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            published = 0
+            try:
+                with celery_app.producer_pool.acquire(block=True) as producer:
+                    for task, args, kwargs, traceparent in batch:
+                        start = time.perf_counter()
+                        headers = {'traceparent': traceparent} if traceparent else None
+                        task.apply_async(args, kwargs, producer=producer, headers=headers)
+                        metrics.observe('task_publish_seconds', time.perf_counter() - start, mode='buffered')
+                        published += 1
+            except Exception:  # pylint: disable=broad-except
+                metrics.inc('task_publisher_failed_total', len(batch) - published)
+                self.app.logger.exception('%s tasks could not be published.', len(batch) - published)
+
+
+def _publish_before_deadline(task: 'Task', args: tuple, kwargs: dict, remaining: float) -> None:
+    # Pooled broker connections wait for the broker longer than the request may (kombu ignores publish
+    # timeout of Redis transport), so the task is sent over own connection with socket timeouts capped
+    # by the remaining time split between the attempts, one retry per second left at most.
+    from .celery import celery_app  # pylint: disable=import-outside-toplevel
+
+    max_retries = min(3, int(remaining))
+    attempt_timeout = remaining / (max_retries + 1)
+    transport_options = {
+        'socket_timeout': attempt_timeout,
+        'socket_connect_timeout': attempt_timeout,
+        'max_retries': max_retries,
+        'connect_retries_timeout': remaining,
+    }
+    retry_policy = {'max_retries': max_retries, 'interval_start': 0, 'interval_step': 0, 'interval_max': 0}
+    try:
+        with celery_app.connection_for_write(connect_timeout=attempt_timeout,
+                                             transport_options=transport_options) as connection:
+            task.apply_async(args, kwargs, connection=connection, retry=True, retry_policy=retry_policy)
+    except Exception as error:
+        if request_deadline.remaining() <= 0:
+            raise DeadlineExceeded('task publish') from error
+        raise
+
+
+def _queue_size() -> int:
+    # Gauge is registered by every publisher, it always reads the publisher of the scraped app.
+    return current_app.extensions['task_publisher'].queue_size()
+
+
+task_publisher = TaskPublisher()
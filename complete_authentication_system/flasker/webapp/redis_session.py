@@ -0,0 +1,148 @@
+"""Contains server-side session stored in Redis which avoids needless writes."""
+
+import time
+import hashlib
+import secrets
+from typing import Optional
+import msgspec
+from flask import Flask, Request, Response
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+from .metrics import metrics
+
+
+class RedisSession(CallbackDict, SessionMixin):  # pylint: disable=too-many-ancestors
+    """Session data loaded from Redis."""
+
+    def __init__(self, initial: Optional[dict] = None, sid: str = None, new: bool = False,
+                 payload_hash: bytes = None, refreshed_at: int = 0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.payload_hash = payload_hash
+        self.refreshed_at = refreshed_at
+        self.redis_commands = 0
+        self.default_permanent = False
+
+    @property
+    def permanent(self) -> bool:
+        """Returns True if session cookie outlives the browser (`SESSION_PERMANENT` unless set by the app)."""
+        return self.get('_permanent', self.default_permanent)
+
+    @permanent.setter
+    def permanent(self, value: bool) -> None:
+        self['_permanent'] = bool(value)
+
+
+class RedisSessionInterface(SessionInterface):
+    """
+    Stores session in Redis serialized with msgpack. The payload hash is kept at load, so the session is
+    written back only if its content has changed. Expiration time of unchanged session is refreshed at most
+    once per `refresh_interval` seconds. Session id in the cookie is signed if `use_signer` is set
+    (`SESSION_USE_SIGNER`) and sessions are permanent by default if `permanent` is set (`SESSION_PERMANENT`).
+    """
+
+    session_class = RedisSession
+
+    def __init__(self, redis_client, key_prefix: str = 'session:', refresh_interval: int = 60 * 60,
+                 use_signer: bool = True, permanent: bool = False):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.refresh_interval = refresh_interval
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder()
+
+    @staticmethod
+    def _hash(payload: bytes) -> bytes:
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    @staticmethod
+    def _signer(app: Flask) -> Signer:
+        return Signer(app.secret_key, salt='flask-session', key_derivation='hmac')
+
+    def _execute(self, session: RedisSession, command: str, *args, **kwargs):
+        session.redis_commands += 1
+        metrics.inc('session_redis_commands_total', command=command)
+        return getattr(self.redis, command)(*args, **kwargs)
+
+    def _load_sid(self, app: Flask, cookie: Optional[str]) -> Optional[str]:
+        if not cookie or not self.use_signer:
+            return cookie
+        try:
+            return self._signer(app).unsign(cookie).decode('utf-8')
+        except BadSignature:
+            return None
+
+    def _dump_sid(self, app: Flask, sid: str) -> str:
+        if not self.use_signer:
+            return sid
+        return self._signer(app).sign(sid.encode('utf-8')).decode('utf-8')
+
+    def open_session(self, app: Flask, request: Request) -> RedisSession:
+        sid = self._load_sid(app, request.cookies.get(self.get_cookie_name(app)))
+        new_session = self.session_class(sid=secrets.token_urlsafe(32), new=True)
+        new_session.default_permanent = self.permanent
+        if not sid:
+            return new_session
+
+        raw = self._execute(new_session, 'get', self.key_prefix + sid)
+        if raw is None:
+            return new_session
+        try:
+            refreshed_at, payload = self._decoder.decode(raw)
+            data = self._decoder.decode(payload)
+        except (msgspec.DecodeError, TypeError, ValueError):
+            return new_session
+        session = self.session_class(data, sid=sid, payload_hash=self._hash(payload), refreshed_at=refreshed_at)
+        session.redis_commands = new_session.redis_commands
+        session.default_permanent = self.permanent
+        return session
+
+    def save_session(self, app: Flask, session: RedisSession, response: Response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.key_prefix + session.sid
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if not session.new:
+                self._execute(session, 'delete', key)
+                response.delete_cookie(name, domain=domain, path=path)
+            self._observe(session)
+            return
+
+        payload = self._encoder.encode(dict(session))
+        payload_hash = self._hash(payload)
+        now = int(time.time())
+        changed = payload_hash != session.payload_hash
+        refresh_due = now - session.refreshed_at >= self.refresh_interval
+
+        if changed or refresh_due:
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            self._execute(session, 'set', key, self._encoder.encode([now, payload]), ex=ttl)
+        else:
+            metrics.inc('session_writes_skipped_total')
+
+        if session.new or (session.permanent and refresh_due):
+            response.set_cookie(
+                name, self._dump_sid(app, session.sid), expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+            )
+        self._observe(session)
+
+    @staticmethod
+    def _observe(session: RedisSession) -> None:
+        metrics.observe('session_redis_commands_per_request', session.redis_commands)
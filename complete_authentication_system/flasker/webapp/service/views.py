@@ -1,11 +1,14 @@
 """Contains views for service blueprint."""
 
-from flask import render_template
+from flask import render_template, current_app, abort, Response
 from flask.views import View
 from flask_login import login_required
 
 from ..utils import Blueprint
 from ..auth.utils import admin_required
+from ..auth.models import Role
+from ..auth.stats import UserStats
+from ..profiling import request_profiler
 
 
 service_blueprint = Blueprint('service',  __name__, template_folder='templates')
@@ -32,4 +35,36 @@ class Admin(View):
     decorators = [login_required, admin_required]
 
     def dispatch_request(self):
-        return render_template(self.template)
+        stats = UserStats.counts()
+        roles = [(role.name, stats.get(f'role:{role.id}', 0)) for role in Role.query.order_by(Role.id)]
+        return render_template(self.template, stats=stats, roles=roles)
+
+
+@service_blueprint.class_route('/admin/profiles', 'profiles')
+class Profiles(View):
+    """Lists recent profiles of requests."""
+    init_every_request = False
+    methods = ["GET"]
+    template = 'profiles.html'
+    decorators = [login_required, admin_required]
+
+    def dispatch_request(self):
+        enabled = current_app.config.get('PROFILER_ENABLED', False)
+        profiles = request_profiler.store.recent() if enabled else []
+        return render_template(self.template, profiles=profiles, enabled=enabled)
+
+
+@service_blueprint.class_route('/admin/profiles/<profile_id>', 'profile')
+class Profile(View):
+    """Returns profile in folded stacks format (input of flamegraph tools)."""
+    init_every_request = False
+    methods = ["GET"]
+    decorators = [login_required, admin_required]
+
+    def dispatch_request(self, profile_id):  # pylint: disable=arguments-differ
+        profile = request_profiler.store.get(profile_id)
+        if profile is None:
+            abort(404)
+        return Response(profile['stacks'], mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename=profile-{profile_id}.folded'
+        })
@@ -0,0 +1,19 @@
+"""Contains common functions executed by celery worker."""
+
+from flask import current_app
+from .celery import celery_app
+
+from . import outbox
+from .metrics import metrics
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def relay_outbox(_) -> None:
+    """
+    Publishes tasks waiting in the transactional outbox. Relay metrics are pushed to the shared store at once,
+    so the web app exposes them even if the worker process is recycled before its next push.
+
+    :return: None
+    """
+    outbox.relay(batch_size=current_app.config.get('OUTBOX_RELAY_BATCH_SIZE', 100))
+    metrics.push()
@@ -0,0 +1,309 @@
+"""Contains tracing of requests, SQL queries, Redis commands and celery tasks."""
+
+import os
+import json
+import time
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from flask import Flask, Response, request
+from werkzeug.utils import import_string
+
+
+class Span:  # pylint: disable=too-many-instance-attributes
+    """Timed operation, part of a trace."""
+
+    def __init__(self, name: str, trace_id: str = None, parent_id: str = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+        self.token = None
+
+    @property
+    def traceparent(self) -> str:
+        """Returns context of the span in W3C traceparent format."""
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def to_dict(self) -> dict:
+        """
+        Returns span as dictionary.
+
+        :return: span data
+        """
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round((self.end - self.start) * 1000, 3),
+            'pid': os.getpid(),
+            'attributes': self.attributes,
+        }
+
+
+class JsonLinesExporter:
+    """Appends finished spans to a file, one JSON document per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        """Writes span to the file."""
+        line = json.dumps(span.to_dict(), default=str) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> tuple:
+    """
+    Returns trace id and parent span id from W3C traceparent value.
+
+    :param value: traceparent header value
+    :return: (trace id, span id) or (None, None) if value is invalid
+    """
+    parts = (value or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+class Tracer:
+    """
+    Records spans of incoming requests, SQL queries, Redis commands, template rendering and celery tasks
+    (publish and execution) and passes finished spans to the exporter. Trace context is carried to celery
+    tasks in "traceparent" header, so a trace covers the request and all tasks started by it. The exporter
+    is set with `TRACING_EXPORTER` setting: "jsonl" (file `TRACING_FILE`) or import path of a class
+    created with the app. When `TRACING_ENABLED` is not set, nothing is instrumented.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.exporter = None
+        self._instrumented = False
+        self._local = threading.local()  # spans started and finished by pairs of signals
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Instruments the given app.
+
+        :param app: instance of Flask app
+        :return: None
+        """
+        app.extensions['tracer'] = self
+        if not app.config.get('TRACING_ENABLED', False):
+            self.exporter = None
+            return
+        exporter = app.config.get('TRACING_EXPORTER', 'jsonl')
+        if exporter == 'jsonl':
+            self.exporter = JsonLinesExporter(app.config.get('TRACING_FILE', 'traces.jsonl'))
+        else:
+            self.exporter = import_string(exporter)(app)
+        app.before_request(self._start_request_span)
+        app.after_request(self._record_response)
+        app.teardown_request(self._finish_request_span)
+        if not self._instrumented:
+            self._instrument_globally()
+            self._instrumented = True
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if spans are recorded."""
+        return self.exporter is not None
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """Returns active span."""
+        return _current_span.get()
+
+    def traceparent(self) -> Optional[str]:
+        """Returns context of active span to pass to other process, None if there is no active span."""
+        span = _current_span.get()
+        return span.traceparent if self.enabled and span is not None else None
+
+    def start_span(self, name: str, traceparent: str = None, **attributes) -> Optional[Span]:
+        """
+        Starts span as a child of active span (or of remote span given in traceparent) and activates it.
+
+        :param name: span name
+        :param traceparent: context of remote parent span
+        :param attributes: span attributes
+        :return: started span, None if tracing is disabled
+        """
+        if not self.enabled:
+            return None
+        parent = _current_span.get()
+        if traceparent:
+            trace_id, parent_id = parse_traceparent(traceparent)
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = None, None
+        span = Span(name, trace_id, parent_id, **attributes)
+        span.token = _current_span.set(span)
+        return span
+
+    def finish_span(self, span: Optional[Span], **attributes) -> None:
+        """
+        Finishes span, activates its parent and exports it.
+
+        :param span: span returned by `start_span`
+        :param attributes: additional span attributes
+        :return: None
+        """
+        if span is None or span.end is not None:
+            return
+        span.end = time.time()
+        span.attributes.update(attributes)
+        try:
+            _current_span.reset(span.token)
+        except ValueError:  # finished in other context (e.g. generator), parent is restored by its owner
+            pass
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, traceparent: str = None, **attributes) -> Iterator[Optional[Span]]:
+        """
+        Records block of code as a span.
+
+        :param name: span name
+        :param traceparent: context of remote parent span
+        :param attributes: span attributes
+        """
+        span = self.start_span(name, traceparent, **attributes)
+        try:
+            yield span
+        except Exception as error:
+            if span is not None:
+                span.attributes['error'] = repr(error)
+            raise
+        finally:
+            self.finish_span(span)
+
+    def instrument_redis(self, client) -> None:
+        """
+        Records commands and pipelines executed by the given Redis client.
+
+        :param client: Redis client
+        :return: None
+        """
+        if getattr(client, '_traced', False):
+            return
+        execute_command = client.execute_command
+        pipeline = client.pipeline
+
+        def traced_execute_command(*args, **options):
+            with self.span(f'redis {args[0]}'):
+                return execute_command(*args, **options)
+
+        def traced_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def traced_execute(*execute_args, **execute_kwargs):
+                with self.span('redis pipeline', commands=len(pipe.command_stack)):
+                    return execute(*execute_args, **execute_kwargs)
+            pipe.execute = traced_execute
+            return pipe
+
+        client.execute_command = traced_execute_command
+        client.pipeline = traced_pipeline
+        client._traced = True  # pylint: disable=protected-access
+
+    def _start_request_span(self) -> None:
+        span = self.start_span(f'{request.method} {request.path}', request.headers.get('traceparent'),
+                               endpoint=request.endpoint)
+        request.environ['flasker.trace_span'] = span
+
+    @staticmethod
+    def _record_response(response: Response) -> Response:
+        span = request.environ.get('flasker.trace_span')
+        if span is not None:
+            span.attributes['status'] = response.status_code
+        return response
+
+    def _finish_request_span(self, error: Optional[BaseException]) -> None:
+        span = request.environ.pop('flasker.trace_span', None)
+        if span is not None and error is not None:
+            span.attributes['error'] = repr(error)
+        self.finish_span(span)
+
+    def _instrument_globally(self) -> None:
+        # pylint: disable=import-outside-toplevel
+        from flask import before_render_template, template_rendered
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from celery.signals import before_task_publish, after_task_publish
+        # pylint: enable=import-outside-toplevel
+        # pylint: disable=unused-argument,too-many-arguments
+
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def start_query_span(conn, cursor, statement, parameters, context, executemany):
+            if self.enabled:
+                context.trace_span = self.start_span(f'SQL {statement.split(None, 1)[0].upper()}',
+                                                     statement=statement[:500], executemany=executemany)
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def finish_query_span(conn, cursor, statement, parameters, context, executemany):
+            self.finish_span(getattr(context, 'trace_span', None), rows=cursor.rowcount)
+
+        @event.listens_for(Engine, 'handle_error')
+        def finish_failed_query_span(exception_context):
+            # after_cursor_execute is not called when the statement fails
+            context = exception_context.execution_context
+            if context is not None:
+                self.finish_span(getattr(context, 'trace_span', None),
+                                 error=repr(exception_context.original_exception))
+
+        def start_render_span(_, template, **__):
+            span = self.start_span(f'render {template.name}')
+            if span is not None:
+                self._render_spans.append(span)
+
+        def finish_render_span(*_, **__):
+            if self.enabled and self._render_spans:
+                self.finish_span(self._render_spans.pop())
+
+        before_render_template.connect(start_render_span, weak=False)
+        template_rendered.connect(finish_render_span, weak=False)
+
+        @before_task_publish.connect(weak=False)
+        def start_publish_span(sender=None, headers=None, routing_key=None, **_):
+            # traceparent set by the publisher (e.g. outbox relay) points to span of the original request
+            span = self.start_span(f'celery publish {sender}', headers.get('traceparent'), queue=routing_key)
+            if span is not None:
+                headers['traceparent'] = span.traceparent
+                self._publish_spans.append(span)
+
+        @after_task_publish.connect(weak=False)
+        def finish_publish_span(*_, **__):
+            if self.enabled and self._publish_spans:
+                self.finish_span(self._publish_spans.pop())
+
+    @property
+    def _render_spans(self) -> list:
+        return self._local_stack('render_spans')
+
+    @property
+    def _publish_spans(self) -> list:
+        return self._local_stack('publish_spans')
+
+    def _local_stack(self, name: str) -> list:
+        if not hasattr(self._local, name):
+            setattr(self._local, name, [])
+        return getattr(self._local, name)
+
+
+tracer = Tracer()
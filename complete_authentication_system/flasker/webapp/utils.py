@@ -1,5 +1,8 @@
 """Contains common utils for flasker app."""
 
+import os
+import threading
+from typing import Callable, Optional
 from flask import Blueprint as BaseBlueprint
 
 
@@ -20,3 +23,37 @@ class Blueprint(BaseBlueprint):
             return cls
 
         return decorator
+
+
+class ProcessThread:
+    """
+    Daemon thread started lazily once in every process. Threads are not copied by fork, so a thread started
+    in gunicorn master (preloaded app) or celery parent process is started again in the worker.
+    """
+
+    def __init__(self, target: Callable[[], None], name: str):
+        self.target = target
+        self.name = name
+        self.thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        """
+        Starts the thread if it is not running in the current process.
+
+        :return: None
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self.thread.start()
+
+    @property
+    def started(self) -> bool:
+        """Returns True if the thread was started in the current process."""
+        return self.thread is not None and self._pid == os.getpid()